@@ -9,6 +9,7 @@ from .imports import (
     ImportSVGEmissionOperator,
     EmissionSVG_FH_import,
 )
+from .preferences import EnhancedSVGPreferences
 from . import z_offset
 
 
@@ -23,6 +24,7 @@ def menu_func_import(self, context):
 
 def register():
     # Register Blender classes
+    bpy.utils.register_class(EnhancedSVGPreferences)
     bpy.utils.register_class(ImportSimpleSVGOperator)
     bpy.utils.register_class(SimpleSVG_FH_import)
     bpy.utils.register_class(ImportSVGOperator)
@@ -47,6 +49,7 @@ def unregister():
     bpy.utils.unregister_class(ImportSVGOperator)
     bpy.utils.unregister_class(SimpleSVG_FH_import)
     bpy.utils.unregister_class(ImportSimpleSVGOperator)
+    bpy.utils.unregister_class(EnhancedSVGPreferences)
 
 
 if __name__ == "__main__":
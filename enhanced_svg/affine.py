@@ -0,0 +1,112 @@
+"""2D affine matrices shared by SVG preprocessing and image placement."""
+
+import math
+import re
+
+_FLOAT_RE = re.compile(r"[+-]?\d*\.?\d+(?:[eE][+-]?\d+)?")
+_TRANSFORM_RE = re.compile(r"\s*([A-Za-z]+)\s*\((.*?)\)")
+
+
+# --- 2D affine matrices, stored as (a, b, c, d, e, f) like SVG matrix():
+#     x' = a*x + c*y + e
+#     y' = b*x + d*y + f
+
+MAT_IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+
+def mat_mul(m, n):
+    """Return matrix product ``m @ n`` (``n`` is applied first)."""
+    a1, b1, c1, d1, e1, f1 = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a1 * a2 + c1 * b2,
+        b1 * a2 + d1 * b2,
+        a1 * c2 + c1 * d2,
+        b1 * c2 + d1 * d2,
+        a1 * e2 + c1 * f2 + e1,
+        b1 * e2 + d1 * f2 + f1,
+    )
+
+
+def mat_apply(m, point):
+    a, b, c, d, e, f = m
+    x, y = point
+    return (a * x + c * y + e, b * x + d * y + f)
+
+
+def mat_invert(m):
+    """Return the inverse affine matrix, or ``None`` if ``m`` is singular."""
+    a, b, c, d, e, f = m
+    det = a * d - b * c
+    if det == 0:
+        return None
+    return (
+        d / det,
+        -b / det,
+        -c / det,
+        a / det,
+        (c * f - d * e) / det,
+        (b * e - a * f) / det,
+    )
+
+
+def mat_translate(tx, ty):
+    return (1.0, 0.0, 0.0, 1.0, tx, ty)
+
+
+def mat_scale(sx, sy):
+    return (sx, 0.0, 0.0, sy, 0.0, 0.0)
+
+
+def parse_transform(transform):
+    """Parse an SVG transform list into a single affine matrix."""
+    m = MAT_IDENTITY
+    for match in _TRANSFORM_RE.finditer(transform):
+        func = match.group(1)
+        params = [float(p) for p in _FLOAT_RE.findall(match.group(2))]
+        if func == "matrix" and len(params) == 6:
+            t = tuple(params)
+        elif func == "translate" and params:
+            t = mat_translate(params[0], params[1] if len(params) > 1 else 0.0)
+        elif func == "scale" and params:
+            t = mat_scale(params[0], params[1] if len(params) > 1 else params[0])
+        elif func == "rotate" and params:
+            angle = math.radians(params[0])
+            rotation = (
+                math.cos(angle),
+                math.sin(angle),
+                -math.sin(angle),
+                math.cos(angle),
+                0.0,
+                0.0,
+            )
+            if len(params) >= 3:
+                cx, cy = params[1], params[2]
+                t = mat_mul(
+                    mat_mul(mat_translate(cx, cy), rotation),
+                    mat_translate(-cx, -cy),
+                )
+            else:
+                t = rotation
+        elif func == "skewX" and params:
+            t = (
+                1.0,
+                0.0,
+                math.tan(math.radians(params[0])),
+                1.0,
+                0.0,
+                0.0,
+            )
+        elif func == "skewY" and params:
+            t = (
+                1.0,
+                math.tan(math.radians(params[0])),
+                0.0,
+                1.0,
+                0.0,
+                0.0,
+            )
+        else:
+            continue
+        m = mat_mul(m, t)
+    return m
@@ -0,0 +1,288 @@
+"""
+Persistent cache of processed SVG imports.
+
+An entry is keyed by a hash of the raw SVG bytes, the add-on version, the
+source of the preprocessing modules and the import options that change
+preprocessing.  It stores everything the processed importer needs after
+preprocessing: the processed SVG, image marker ids, image placements and
+``<use>`` instance matrices.  The SVG handed to Blender is derived from the
+processed SVG by placing the markers again.  Image bytes are stored once per
+content hash beside the entries.  Entries whose external image files changed
+are treated as misses, and the cache is kept below a size limit by evicting
+the least recently used entries.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import tomllib
+from collections import Counter
+from pathlib import Path
+
+CACHE_FORMAT_VERSION = 4
+DEFAULT_CACHE_MAX_MB = 256
+# Modules whose code decides what preprocessing writes.  Editing any of them
+# changes every key, so a cache never serves output of older code.
+_PREPROCESSING_MODULES = (
+    "affine.py",
+    "image_import.py",
+    "path_data.py",
+    "pruning.py",
+    "stroke_engine.py",
+    "svg_preprocessing.py",
+)
+
+_ENTRIES = "entries"
+_BLOBS = "blobs"
+_TEMPORARY_PREFIX = ".tmp-"
+
+
+@functools.lru_cache(maxsize=1)
+def addon_version():
+    """Return the add-on version from the extension manifest."""
+    manifest = Path(__file__).with_name("blender_manifest.toml")
+    try:
+        with manifest.open("rb") as handle:
+            return str(tomllib.load(handle)["version"])
+    except (OSError, KeyError, tomllib.TOMLDecodeError):
+        return "unknown"
+
+
+@functools.lru_cache(maxsize=1)
+def preprocessing_fingerprint():
+    """Return a hash of the source of the preprocessing modules."""
+    digest = hashlib.sha256()
+    for name in _PREPROCESSING_MODULES:
+        try:
+            digest.update(Path(__file__).with_name(name).read_bytes())
+        except OSError:
+            digest.update(b"missing")
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+_READ_CHUNK_BYTES = 1 << 20
+
+
+def _key_digest(options):
+    header = json.dumps(
+        {
+            "format": CACHE_FORMAT_VERSION,
+            "version": addon_version(),
+            "preprocessing": preprocessing_fingerprint(),
+            "options": options,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    digest = hashlib.sha256(header.encode("utf-8"))
+    digest.update(b"\0")
+    return digest
+
+
+def cache_key(svg_bytes, options):
+    """Return the cache key for raw SVG bytes imported with ``options``."""
+    digest = _key_digest(options)
+    digest.update(svg_bytes)
+    return digest.hexdigest()
+
+
+def file_cache_key(path, options):
+    """Return :func:`cache_key` of a file's bytes, reading it in chunks."""
+    digest = _key_digest(options)
+    with open(path, "rb") as handle:
+        while chunk := handle.read(_READ_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _write_atomic(path, data):
+    """Write ``data`` so readers never observe a partially written file."""
+    handle, temporary = tempfile.mkstemp(dir=path.parent, prefix=_TEMPORARY_PREFIX)
+    try:
+        with os.fdopen(handle, "wb") as stream:
+            stream.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        _remove(temporary)
+        raise
+
+
+def _entry_path(cache_dir, key):
+    return Path(cache_dir) / _ENTRIES / f"{key}.json"
+
+
+def _decode_image(info, blob_dir):
+    image = dict(info)
+    image["data"] = (blob_dir / info["data"]).read_bytes()
+    image["rect"] = tuple(info["rect"])
+    image["matrix"] = tuple(info["matrix"])
+    if info["corners"] is not None:
+        image["corners"] = [tuple(corner) for corner in info["corners"]]
+    return image
+
+
+def load_cached_import(cache_dir, key):
+    """
+    Return the cached import result for ``key``, or None on a miss.
+
+    Unreadable or stale entries are removed and reported as misses.
+    """
+    path = _entry_path(cache_dir, key)
+    try:
+        with path.open("r", encoding="utf-8") as handle:
+            entry = json.load(handle)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        _remove(path)
+        return None
+
+    try:
+        if entry["format"] != CACHE_FORMAT_VERSION:
+            raise ValueError("cache entry format changed")
+        for dependency, signature in entry["dependencies"].items():
+            if _file_signature(dependency) != signature:
+                raise ValueError("external image changed")
+        blob_dir = Path(cache_dir) / _BLOBS
+        images = [_decode_image(info, blob_dir) for info in entry["images"]]
+        instances = [
+            {
+                **group,
+                "matrices": {
+                    marker_id: tuple(matrix)
+                    for marker_id, matrix in group["matrices"].items()
+                },
+            }
+            for group in entry["instances"]
+        ]
+        result = {
+            "processed_svg": entry["processed_svg"],
+            "images": images,
+            "warnings": list(entry["warnings"]),
+            "marker_ids": list(entry["marker_ids"]),
+            "instances": instances,
+            "native_strokes": entry["native_strokes"],
+        }
+    except (AttributeError, KeyError, TypeError, ValueError, OSError):
+        _remove(path)
+        return None
+
+    try:
+        # The entry's modification time is its last use for LRU eviction.
+        os.utime(path)
+    except OSError:
+        pass
+    return result
+
+
+def store_cached_import(
+    cache_dir, key, result, dependencies=(), max_bytes=DEFAULT_CACHE_MAX_MB << 20
+):
+    """
+    Store an import ``result`` under ``key`` and evict entries over the limit.
+
+    ``result`` has the keys returned by :func:`load_cached_import`;
+    ``dependencies`` are the external files its images were read from.
+    """
+    entry_dir = Path(cache_dir) / _ENTRIES
+    blob_dir = Path(cache_dir) / _BLOBS
+    entry_dir.mkdir(parents=True, exist_ok=True)
+    blob_dir.mkdir(parents=True, exist_ok=True)
+
+    images = []
+    for info in result["images"]:
+        digest = hashlib.sha256(info["data"]).hexdigest()
+        blob = blob_dir / digest
+        if not blob.is_file():
+            _write_atomic(blob, info["data"])
+        images.append({**info, "data": digest})
+
+    entry = {
+        "format": CACHE_FORMAT_VERSION,
+        "dependencies": {
+            path: _file_signature(path) for path in sorted(map(str, dependencies))
+        },
+        "processed_svg": result["processed_svg"],
+        "images": images,
+        "warnings": result["warnings"],
+        "marker_ids": result["marker_ids"],
+        "instances": result["instances"],
+        "native_strokes": result["native_strokes"],
+    }
+    _write_atomic(
+        _entry_path(cache_dir, key), json.dumps(entry).encode("utf-8")
+    )
+    prune_cache(cache_dir, max_bytes)
+
+
+def _referenced_blobs(path):
+    try:
+        with path.open("r", encoding="utf-8") as handle:
+            return {info["data"] for info in json.load(handle)["images"]}
+    except (OSError, ValueError, KeyError, TypeError):
+        return set()
+
+
+def prune_cache(cache_dir, max_bytes):
+    """Evict least recently used entries until the cache fits ``max_bytes``."""
+    entry_dir = Path(cache_dir) / _ENTRIES
+    blob_dir = Path(cache_dir) / _BLOBS
+    entries = []
+    for path in entry_dir.glob("*.json"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+    blobs = {}
+    if blob_dir.is_dir():
+        for path in blob_dir.iterdir():
+            if path.name.startswith(_TEMPORARY_PREFIX):
+                continue
+            try:
+                blobs[path.name] = path.stat().st_size
+            except OSError:
+                continue
+
+    total = sum(size for _mtime, size, _path in entries) + sum(blobs.values())
+    if total <= max_bytes:
+        return
+
+    references = {path: _referenced_blobs(path) for _mtime, _size, path in entries}
+    users = Counter(
+        digest for digests in references.values() for digest in digests
+    )
+    for digest, size in blobs.items():
+        if not users[digest]:
+            _remove(blob_dir / digest)
+            total -= size
+
+    entries.sort(key=lambda item: (item[0], item[2].name))
+    for _mtime, size, path in entries:
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+        for digest in references[path]:
+            users[digest] -= 1
+            if not users[digest] and digest in blobs:
+                _remove(blob_dir / digest)
+                total -= blobs[digest]
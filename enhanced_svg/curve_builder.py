@@ -0,0 +1,100 @@
+"""Build Blender curve objects directly from a preprocessed SVG tree.
+
+This replaces the temp-file round trip through ``bpy.ops.import_curve.svg``:
+the shapes from curve_geometry are written with bulk ``foreach_set`` calls,
+and their materials still come from io_curve_svg's own SVGGetMaterial, so
+colors and color management match the stock importer.
+"""
+
+import importlib
+
+import bpy
+import numpy as np
+
+from .curve_geometry import collect_curve_shapes
+from .ownership import claim
+
+
+def _material_getter(context, import_state):
+    """
+    Return a function mapping fill text to io_curve_svg's material, or None
+    when Blender's SVG module no longer provides SVGGetMaterial.
+    """
+    try:
+        svg_import_module = importlib.import_module("io_curve_svg.import_svg")
+        get_material = svg_import_module.SVGGetMaterial
+    except (AttributeError, ImportError):
+        return None
+    material_context = {
+        "materials": {},
+        "do_colormanage": context.scene.display_settings.display_device != "NONE",
+    }
+
+    def material_for(color):
+        material = get_material(color, material_context)
+        # The material cache is private to this import, so every material
+        # it returns was created here.
+        if material is not None:
+            material["enhanced_svg_blender_material"] = True
+            claim(import_state, material)
+        return material
+
+    return material_for
+
+
+def _add_spline(curve, spline):
+    count = len(spline["co"])
+    if spline["type"] == "POLY":
+        new_spline = curve.splines.new("POLY")
+        new_spline.points.add(count - 1)
+        co = np.zeros((count, 4), dtype=np.float32)
+        co[:, :2] = spline["co"]
+        co[:, 3] = 1.0
+        new_spline.points.foreach_set("co", co.ravel())
+    else:
+        new_spline = curve.splines.new("BEZIER")
+        points = new_spline.bezier_points
+        points.add(count - 1)
+        # Enum properties are written as their values; FREE is 0.
+        free = np.zeros(count, dtype=np.int32)
+        points.foreach_set("handle_left_type", free)
+        points.foreach_set("handle_right_type", free)
+        for name in ("co", "handle_left", "handle_right"):
+            values = np.zeros((count, 3), dtype=np.float32)
+            values[:, :2] = spline[name]
+            points.foreach_set(name, values.ravel())
+    new_spline.use_cyclic_u = spline["cyclic"]
+
+
+def build_curve_collection(context, root, name, import_state, scene_scale_length):
+    """
+    Create a collection with one curve object per shape of a preprocessed
+    SVG element tree, in paint order, like io_curve_svg does.
+
+    The collection is linked to the scene and recorded as import-owned in
+    ``import_state``, which claims every data-block created here.  Returns
+    None, before creating anything, when Blender's SVG module cannot provide
+    materials; the caller then imports through the operator instead.
+    """
+    material_for = _material_getter(context, import_state)
+    if material_for is None:
+        return None
+    shapes = collect_curve_shapes(root, scene_scale_length)
+
+    collection = claim(import_state, bpy.data.collections.new(name))
+    context.scene.collection.children.link(collection)
+    import_state["owned_collections"].add(collection)
+    for shape in shapes:
+        shape_name = shape["name"] or "Curve"
+        curve = claim(import_state, bpy.data.curves.new(shape_name, "CURVE"))
+        obj = claim(import_state, bpy.data.objects.new(shape_name, curve))
+        collection.objects.link(obj)
+        if shape["fill"] is not None:
+            curve.dimensions = "2D"
+            curve.fill_mode = "BOTH"
+            curve.materials.append(material_for(shape["fill"]))
+        else:
+            curve.dimensions = "3D"
+        for spline in shape["splines"]:
+            _add_spline(curve, spline)
+    return collection
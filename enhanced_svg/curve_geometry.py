@@ -0,0 +1,233 @@
+"""Blender curve geometry for preprocessed SVG element trees.
+
+Blender's io_curve_svg reads the processed SVG back from disk, tokenizes
+every path again and builds its splines one point at a time.  The tree
+handed to it has already been parsed here, so collect_curve_shapes measures
+each shape with the same viewport conventions and returns its splines as
+coordinate arrays in Blender space, ready for ``foreach_set``.
+
+Like io_curve_svg, every shape element becomes one curve named after its
+``id``, filled with its ``fill`` color or left unfilled; images, text and
+non-rendered containers are not curves.
+"""
+
+import numpy as np
+from lxml import etree
+
+from .affine import mat_mul, parse_transform
+from .image_import import (
+    BLENDER_SCALE,
+    _SKIP_TAGS,
+    _property,
+    _style_map,
+    _svg_viewport_matrix,
+    parse_coord,
+)
+from .path_data import parse_path_data
+from .stroke_engine import cubic_segments, pack_path
+from .svg_preprocessing import SVG_NS, _FLOAT_RE, _number
+
+SHAPE_TAGS = {"path", "rect", "circle", "ellipse", "line", "polyline", "polygon"}
+_CONTAINER_TAGS = {"svg", "g", "a"}
+
+
+def _ellipse_path_data(cx, cy, rx, ry):
+    if rx <= 0 or ry <= 0:
+        return None
+    start, end = _number(cx + rx), _number(cx - rx)
+    radii = f"{_number(rx)} {_number(ry)}"
+    return (
+        f"M{start} {_number(cy)} A{radii} 0 1 0 {end} {_number(cy)} "
+        f"A{radii} 0 1 0 {start} {_number(cy)} Z"
+    )
+
+
+def _rect_path_data(el, viewport):
+    width, height = viewport
+    x = parse_coord(el.get("x", "0"), width)
+    y = parse_coord(el.get("y", "0"), height)
+    w = parse_coord(el.get("width", "0"), width)
+    h = parse_coord(el.get("height", "0"), height)
+    if w <= 0 or h <= 0:
+        return None
+    rx_attr, ry_attr = el.get("rx"), el.get("ry")
+    rx = parse_coord(rx_attr, width) if rx_attr else None
+    ry = parse_coord(ry_attr, height) if ry_attr else None
+    rx = min(max(rx if rx is not None else ry or 0.0, 0.0), w / 2.0)
+    ry = min(max(ry if ry is not None else rx, 0.0), h / 2.0)
+    if not rx or not ry:
+        return (
+            f"M{_number(x)} {_number(y)} H{_number(x + w)} V{_number(y + h)} "
+            f"H{_number(x)} Z"
+        )
+    corner = f"A{_number(rx)} {_number(ry)} 0 0 1"
+    return (
+        f"M{_number(x + rx)} {_number(y)} H{_number(x + w - rx)} "
+        f"{corner} {_number(x + w)} {_number(y + ry)} V{_number(y + h - ry)} "
+        f"{corner} {_number(x + w - rx)} {_number(y + h)} H{_number(x + rx)} "
+        f"{corner} {_number(x)} {_number(y + h - ry)} V{_number(y + ry)} "
+        f"{corner} {_number(x + rx)} {_number(y)} Z"
+    )
+
+
+def shape_path_data(el, tag, viewport):
+    """Return the path data of a shape element, or None without geometry."""
+    width, height = viewport
+
+    def coord(name, size):
+        return parse_coord(el.get(name, "0"), size)
+
+    if tag == "path":
+        return el.get("d")
+    if tag == "rect":
+        return _rect_path_data(el, viewport)
+    if tag == "circle":
+        r = coord("r", np.hypot(width, height) / np.sqrt(2.0))
+        return _ellipse_path_data(coord("cx", width), coord("cy", height), r, r)
+    if tag == "ellipse":
+        return _ellipse_path_data(
+            coord("cx", width),
+            coord("cy", height),
+            coord("rx", width),
+            coord("ry", height),
+        )
+    if tag == "line":
+        return (
+            f"M{_number(coord('x1', width))} {_number(coord('y1', height))} "
+            f"L{_number(coord('x2', width))} {_number(coord('y2', height))}"
+        )
+    values = _FLOAT_RE.findall(el.get("points", ""))
+    if len(values) < 4:
+        return None
+    pairs = " ".join(
+        f"{x} {y}" for x, y in zip(values[0:-1:2], values[1::2])
+    )
+    return f"M{pairs}" + (" Z" if tag == "polygon" else "")
+
+
+def curve_splines(path_data, matrix):
+    """
+    Return the splines of parsed path data under ``matrix``, in Blender
+    space.
+
+    Each spline is a dict with its ``type`` (``"POLY"`` for subpaths of
+    straight segments, ``"BEZIER"`` otherwise), ``cyclic`` flag and
+    ``(n, 2)`` ``co``, ``handle_left`` and ``handle_right`` arrays.
+    """
+    packed = pack_path(path_data)
+    if not len(packed["subpath"]):
+        return []
+    cubics, segment_index = cubic_segments(packed)
+    a, b, c, d, e, f = matrix
+    points = cubics.reshape(-1, 2)
+    # io_curve_svg maps user units to metres with Y pointing up.
+    cubics = (
+        np.column_stack(
+            (
+                a * points[:, 0] + c * points[:, 1] + e,
+                -(b * points[:, 0] + d * points[:, 1] + f),
+            )
+        )
+        * BLENDER_SCALE
+    ).reshape(-1, 4, 2)
+    subpath = packed["subpath"][segment_index]
+    is_line = packed["is_line"][segment_index]
+    closed = set(packed["closed"].tolist())
+
+    splines = []
+    boundaries = np.flatnonzero(np.diff(subpath)) + 1
+    for segments, lines, number in zip(
+        np.split(cubics, boundaries),
+        np.split(is_line, boundaries),
+        subpath[np.concatenate(([0], boundaries))].tolist(),
+    ):
+        cyclic = number in closed
+        if (
+            cyclic
+            and len(segments) > 1
+            and lines[-1]
+            and np.array_equal(segments[-1, 0], segments[-1, 3])
+        ):
+            # The closepath of a subpath that already returned to its start.
+            segments = segments[:-1]
+        if cyclic:
+            co = segments[:, 0]
+            handle_right = segments[:, 1]
+            handle_left = np.roll(segments[:, 2], 1, axis=0)
+        else:
+            co = np.vstack((segments[:, 0], segments[-1:, 3]))
+            handle_right = np.vstack((segments[:, 1], segments[-1:, 3]))
+            handle_left = np.vstack((segments[:1, 0], segments[:, 2]))
+        splines.append(
+            {
+                "type": "POLY" if lines.all() else "BEZIER",
+                "cyclic": cyclic,
+                "co": co,
+                "handle_left": handle_left,
+                "handle_right": handle_right,
+            }
+        )
+    return splines
+
+
+def _fill(el, styles, inherited):
+    value = _property(el, styles, "fill")
+    if value is None or value.strip().lower() == "inherit":
+        return inherited
+    value = value.strip().lower()
+    return None if value == "none" else value
+
+
+def collect_curve_shapes(root, scene_scale_length=1.0):
+    """
+    Return the curve shapes of a preprocessed SVG element tree in paint
+    order.
+
+    Each shape is a dict with the element ``name`` (its id, or None), the
+    ``fill`` color text (None when unfilled) and its ``splines`` (see
+    curve_splines).  Shapes without geometry, such as paint-order marker
+    lines, are returned too, since their objects carry the paint order.
+    """
+    shapes = []
+    root_matrix, root_rect = _svg_viewport_matrix(
+        root,
+        (0.0, 0.0),
+        nested=False,
+        scene_scale_length=scene_scale_length,
+    )
+    root_fill = _fill(root, _style_map(root), "#000")
+    stack = [(child, root_matrix, root_rect, root_fill) for child in reversed(root)]
+    while stack:
+        el, ctm, viewport, inherited = stack.pop()
+        if not isinstance(el.tag, str):
+            continue
+        qname = etree.QName(el.tag)
+        tag = qname.localname
+        if qname.namespace not in (None, SVG_NS) or tag in _SKIP_TAGS:
+            continue
+        if tag not in SHAPE_TAGS and tag not in _CONTAINER_TAGS:
+            continue
+        transform = el.get("transform")
+        if transform:
+            ctm = mat_mul(ctm, parse_transform(transform))
+        if tag == "svg":
+            viewport_matrix, viewport = _svg_viewport_matrix(
+                el,
+                viewport,
+                nested=True,
+                scene_scale_length=scene_scale_length,
+            )
+            ctm = mat_mul(ctm, viewport_matrix)
+        fill = _fill(el, _style_map(el), inherited)
+        if tag in _CONTAINER_TAGS:
+            stack.extend((child, ctm, viewport, fill) for child in reversed(el))
+            continue
+        splines = []
+        d_attr = shape_path_data(el, tag, viewport)
+        if d_attr:
+            try:
+                splines = curve_splines(parse_path_data(d_attr), ctm)
+            except ValueError:
+                splines = []
+        shapes.append({"name": el.get("id"), "fill": fill, "splines": splines})
+    return shapes
@@ -0,0 +1,232 @@
+"""Turn imported SVG curve objects into mesh geometry.
+
+Blender tessellates and fills every 2D curve again whenever the depsgraph
+updates it, and overlapping splines inside one 2D curve cut holes into each
+other, so curves can neither stay cheap nor be joined directly.  Instead the
+evaluated mesh of each curve is read once with ``foreach_get`` and written
+into baked or joined meshes with ``foreach_set``.  Edges are copied along
+with the faces, so open curves without fill or bevel keep their geometry.
+"""
+
+import bmesh
+import bpy
+import numpy as np
+
+from .image_import import PAINT_ORDER_Z_STEP
+from .ownership import leave_unclaimed
+
+
+def _mesh_arrays(obj, depsgraph):
+    """
+    Return the local vertices, edge vertex pairs, loop vertex indices, loop
+    edge indices, face loop starts and face material indices of the
+    evaluated mesh of ``obj``.
+    """
+    evaluated = obj.evaluated_get(depsgraph)
+    mesh = evaluated.to_mesh()
+    try:
+        vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", vertices)
+        edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+        mesh.edges.foreach_get("vertices", edges)
+        loops = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", loops)
+        loop_edges = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get("edge_index", loop_edges)
+        starts = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get("loop_start", starts)
+        material_indices = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get("material_index", material_indices)
+    finally:
+        evaluated.to_mesh_clear()
+    return (
+        vertices.reshape(-1, 3),
+        edges.reshape(-1, 2),
+        loops,
+        loop_edges,
+        starts,
+        material_indices,
+    )
+
+
+def _world_arrays(obj, depsgraph, z):
+    """
+    Return ``_mesh_arrays`` with vertices in world space, with the
+    paint-order Z offset of ``obj`` replaced by ``z``.
+    """
+    vertices, *topology = _mesh_arrays(obj, depsgraph)
+    matrix = np.array(obj.matrix_world, dtype=np.float64)
+    matrix[2, 3] = z
+    return (vertices @ matrix[:3, :3].T + matrix[:3, 3], *topology)
+
+
+def _joined_mesh(name, parts):
+    """
+    Create one mesh from ``_mesh_arrays`` parts, keeping their edges and
+    face order.
+    """
+    vertex_offsets = np.cumsum([0] + [len(part[0]) for part in parts[:-1]])
+    edge_offsets = np.cumsum([0] + [len(part[1]) for part in parts[:-1]])
+    loop_offsets = np.cumsum([0] + [len(part[2]) for part in parts[:-1]])
+    vertices = np.concatenate([part[0] for part in parts])
+    edges = np.concatenate(
+        [part[1] + offset for part, offset in zip(parts, vertex_offsets)]
+    )
+    loops = np.concatenate(
+        [part[2] + offset for part, offset in zip(parts, vertex_offsets)]
+    )
+    loop_edges = np.concatenate(
+        [part[3] + offset for part, offset in zip(parts, edge_offsets)]
+    )
+    starts = np.concatenate(
+        [part[4] + offset for part, offset in zip(parts, loop_offsets)]
+    )
+    material_indices = np.concatenate([part[5] for part in parts])
+
+    mesh = bpy.data.meshes.new(name)
+    mesh["enhanced_svg_curve_mesh"] = True
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set("co", vertices.astype(np.float32).ravel())
+    mesh.edges.add(len(edges))
+    mesh.edges.foreach_set("vertices", edges.astype(np.int32).ravel())
+    mesh.loops.add(len(loops))
+    mesh.loops.foreach_set("vertex_index", loops.astype(np.int32))
+    mesh.loops.foreach_set("edge_index", loop_edges.astype(np.int32))
+    mesh.polygons.add(len(starts))
+    mesh.polygons.foreach_set("loop_start", starts.astype(np.int32))
+    mesh.polygons.foreach_set("material_index", material_indices.astype(np.int32))
+    mesh.update()
+    return mesh
+
+
+def _copy_opacity(source, target):
+    opacity = source.get("opacity")
+    if opacity is not None:
+        target["opacity"] = opacity
+        target.id_properties_ui("opacity").update(min=0.0, max=1.0, step=0.1)
+
+
+def _merge_key(obj):
+    """
+    Return what an object must share with its neighbours to be merged, or
+    None when it stays on its own.  Linked duplicates keep their shared data.
+    """
+    if obj.type != "CURVE" or obj.data.users > 1:
+        return None
+    materials = obj.data.materials
+    material = materials[0] if len(materials) else None
+    return material, obj.get("opacity")
+
+
+def _remove_source_object(obj):
+    curve = obj.data
+    bpy.data.objects.remove(obj, do_unlink=True)
+    if curve.users == 0:
+        bpy.data.curves.remove(curve)
+
+
+def merge_by_material(context, collection, ordered, claim=leave_unclaimed):
+    """
+    Join each run of consecutive curve objects in ``ordered`` that share
+    their material and opacity into one mesh object.
+
+    Runs break at images, linked duplicates and every change of material, so
+    the joined objects keep their place in paint order; inside one object the
+    faces follow the paint order of their shapes.  The shapes of a run are
+    spread over one paint-order step in Z, so overlapping faces stay apart
+    without reaching the next object.  Every created mesh and object is
+    passed to ``claim``.  Returns the objects in paint order.
+    """
+    depsgraph = context.evaluated_depsgraph_get()
+    runs = []
+    previous = None
+    for obj in ordered:
+        key = _merge_key(obj)
+        if key is not None and key == previous:
+            runs[-1].append(obj)
+        else:
+            runs.append([obj])
+        previous = key
+
+    merged = []
+    for run in runs:
+        if len(run) == 1:
+            merged.extend(run)
+            continue
+        material, _opacity = _merge_key(run[0])
+        name = f"Merged_{material.name}" if material is not None else "Merged"
+        step = PAINT_ORDER_Z_STEP / len(run)
+        parts = [
+            _world_arrays(obj, depsgraph, index * step)
+            for index, obj in enumerate(run)
+        ]
+        mesh = claim(_joined_mesh(name, parts))
+        # Every shape of the run has its one material in slot 0.
+        mesh.materials.append(material)
+        obj = claim(bpy.data.objects.new(name, mesh))
+        obj["svg_merged_shapes"] = len(run)
+        _copy_opacity(run[0], obj)
+        collection.objects.link(obj)
+        for source in run:
+            _remove_source_object(source)
+        merged.append(obj)
+    return merged
+
+
+def _merge_vertices(mesh, distance):
+    bm = bmesh.new()
+    try:
+        bm.from_mesh(mesh)
+        bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=distance)
+        bm.to_mesh(mesh)
+    finally:
+        bm.free()
+
+
+def bake_curves_to_meshes(
+    context, collection, ordered, merge_distance=0.0, claim=leave_unclaimed
+):
+    """
+    Replace every curve object in ``ordered`` with a mesh object holding its
+    evaluated, triangulated fill and its edges, so Blender no longer
+    tessellates the curves on every depsgraph update.
+
+    All curves are evaluated with one depsgraph.  Objects that share curve
+    data, such as linked <use> duplicates, share the baked mesh.  Names,
+    transforms, materials and custom properties (``opacity``,
+    ``svg_paint_index``, ...) carry over.  With a positive
+    ``merge_distance``, vertices closer than that many Blender units are
+    merged.  Every created mesh and object is passed to ``claim``.  Returns
+    the objects in paint order.
+    """
+    depsgraph = context.evaluated_depsgraph_get()
+    meshes = {}
+    baked = []
+    for obj in ordered:
+        if obj.type != "CURVE":
+            baked.append(obj)
+            continue
+        curve = obj.data
+        mesh = meshes.get(curve)
+        if mesh is None:
+            mesh = meshes[curve] = claim(
+                _joined_mesh(curve.name, [_mesh_arrays(obj, depsgraph)])
+            )
+            for material in curve.materials:
+                mesh.materials.append(material)
+            if merge_distance > 0.0:
+                _merge_vertices(mesh, merge_distance)
+        name = obj.name
+        obj.name = f"{name}.curve"
+        mesh_obj = bpy.data.objects.new(name, mesh)
+        mesh_obj.matrix_world = obj.matrix_world
+        for key in obj.keys():
+            mesh_obj[key] = obj[key]
+        claim(mesh_obj)
+        _copy_opacity(obj, mesh_obj)
+        collection.objects.link(mesh_obj)
+        baked.append(mesh_obj)
+    for obj in ordered:
+        if obj.type == "CURVE":
+            _remove_source_object(obj)
+    return baked
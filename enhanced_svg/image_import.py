@@ -21,7 +21,21 @@ from pathlib import Path
 
 from lxml import etree
 
-from .svg_preprocessing import NS_MAP, SVG_NS, parse_svg_string
+from .affine import (
+    mat_apply,
+    mat_invert,
+    mat_mul,
+    mat_scale,
+    mat_translate,
+    parse_transform,
+)
+from .ownership import leave_unclaimed
+from .svg_preprocessing import (
+    NS_MAP,
+    SVG_NS,
+    parse_svg_string,
+    serialize_svg_tree,
+)
 
 
 XLINK_HREF = f"{{{NS_MAP['xlink']}}}href"
@@ -52,8 +66,11 @@ MAX_TOTAL_IMAGE_BYTES = 512 * 1024 * 1024
 MAX_IMAGE_PLACEMENTS = 10_000
 MAX_SVG_TRAVERSAL_DEPTH = 256
 
+# Inline images decoded while the SVG file was read are referenced by this
+# prefix and a digest of their data URI (see streamed_image_sink).
+STREAMED_IMAGE_PREFIX = "enhanced-svg-stream:"
+
 _FLOAT_RE = re.compile(r"[+-]?\d*\.?\d+(?:[eE][+-]?\d+)?")
-_TRANSFORM_RE = re.compile(r"\s*([A-Za-z]+)\s*\((.*?)\)")
 _DATA_URI_RE = re.compile(
     r"data:(?P<mime>[^;,]*)(?P<params>(?:;[^;,]*)*),(?P<data>.*)",
     re.DOTALL | re.IGNORECASE,
@@ -73,95 +90,6 @@ _MIME_EXTENSIONS = {
 }
 
 
-# --- 2D affine matrices, stored as (a, b, c, d, e, f) like SVG matrix():
-#     x' = a*x + c*y + e
-#     y' = b*x + d*y + f
-
-MAT_IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
-
-
-def mat_mul(m, n):
-    """Return matrix product ``m @ n`` (``n`` is applied first)."""
-    a1, b1, c1, d1, e1, f1 = m
-    a2, b2, c2, d2, e2, f2 = n
-    return (
-        a1 * a2 + c1 * b2,
-        b1 * a2 + d1 * b2,
-        a1 * c2 + c1 * d2,
-        b1 * c2 + d1 * d2,
-        a1 * e2 + c1 * f2 + e1,
-        b1 * e2 + d1 * f2 + f1,
-    )
-
-
-def mat_apply(m, point):
-    a, b, c, d, e, f = m
-    x, y = point
-    return (a * x + c * y + e, b * x + d * y + f)
-
-
-def mat_translate(tx, ty):
-    return (1.0, 0.0, 0.0, 1.0, tx, ty)
-
-
-def mat_scale(sx, sy):
-    return (sx, 0.0, 0.0, sy, 0.0, 0.0)
-
-
-def parse_transform(transform):
-    """Parse an SVG transform list into a single affine matrix."""
-    m = MAT_IDENTITY
-    for match in _TRANSFORM_RE.finditer(transform):
-        func = match.group(1)
-        params = [float(p) for p in _FLOAT_RE.findall(match.group(2))]
-        if func == "matrix" and len(params) == 6:
-            t = tuple(params)
-        elif func == "translate" and params:
-            t = mat_translate(params[0], params[1] if len(params) > 1 else 0.0)
-        elif func == "scale" and params:
-            t = mat_scale(params[0], params[1] if len(params) > 1 else params[0])
-        elif func == "rotate" and params:
-            angle = math.radians(params[0])
-            rotation = (
-                math.cos(angle),
-                math.sin(angle),
-                -math.sin(angle),
-                math.cos(angle),
-                0.0,
-                0.0,
-            )
-            if len(params) >= 3:
-                cx, cy = params[1], params[2]
-                t = mat_mul(
-                    mat_mul(mat_translate(cx, cy), rotation),
-                    mat_translate(-cx, -cy),
-                )
-            else:
-                t = rotation
-        elif func == "skewX" and params:
-            t = (
-                1.0,
-                0.0,
-                math.tan(math.radians(params[0])),
-                1.0,
-                0.0,
-                0.0,
-            )
-        elif func == "skewY" and params:
-            t = (
-                1.0,
-                math.tan(math.radians(params[0])),
-                0.0,
-                1.0,
-                0.0,
-                0.0,
-            )
-        else:
-            continue
-        m = mat_mul(m, t)
-    return m
-
-
 def parse_coord(coord, size=0.0):
     """Parse an SVG coordinate or length against the active viewport size."""
     coord = coord.strip()
@@ -335,8 +263,15 @@ def _element_state(el, parent_state):
     }
 
 
-def _resource_state():
-    return {"items": {}, "total_bytes": 0, "placements": 0}
+def _resource_state(files=None, streamed=None, load_images=True):
+    return {
+        "items": {},
+        "total_bytes": 0,
+        "placements": 0,
+        "files": set() if files is None else files,
+        "streamed": {} if streamed is None else streamed,
+        "load_images": load_images,
+    }
 
 
 def _cache_resource(state, key, value):
@@ -391,6 +326,64 @@ def _external_path(href, svg_dir, warnings, allow_outside):
     return resolved
 
 
+def _decode_data_uri(href, warnings):
+    """Return ``(bytes, extension)`` of a data URI, or ``(None, None)``."""
+    match = _DATA_URI_RE.fullmatch(href)
+    if not match:
+        warnings.append("Skipped image with malformed data URI")
+        return None, None
+    mime = match.group("mime").strip().lower()
+    params = match.group("params").lower()
+    try:
+        if "base64" in params:
+            encoded = urllib.parse.unquote(match.group("data"))
+            encoded = re.sub(r"\s+", "", encoded)
+            if len(encoded) * 3 // 4 > MAX_IMAGE_BYTES:
+                raise ValueError("image exceeds the per-resource size limit")
+            data = base64.b64decode(encoded, validate=True)
+        else:
+            data = urllib.parse.unquote_to_bytes(match.group("data"))
+    except (ValueError, UnicodeError):
+        warnings.append("Skipped image with undecodable data URI")
+        return None, None
+    return data, _MIME_EXTENSIONS.get(mime, ".png")
+
+
+def streamed_image_sink(streamed, warnings):
+    """
+    Return an image sink for read_svg_file that decodes data URIs early.
+
+    Decoded ``(bytes, extension)`` pairs are stored in the ``streamed`` dict
+    under the reference that replaces the href; pass the same dict to
+    prepare_svg_image_tree.  Identical data URIs are decoded once, and data
+    beyond MAX_TOTAL_IMAGE_BYTES is dropped while reading.
+    """
+    total_bytes = sum(len(item) for item, _extension in streamed.values() if item)
+
+    def sink(href):
+        nonlocal total_bytes
+        href = href.strip()
+        reference = (
+            STREAMED_IMAGE_PREFIX
+            + hashlib.sha256(href.encode("utf-8")).hexdigest()
+        )
+        if reference in streamed:
+            return reference
+        data, extension = _decode_data_uri(href, warnings)
+        if data is not None and total_bytes + len(data) > MAX_TOTAL_IMAGE_BYTES:
+            _warn_once(
+                warnings,
+                "Skipped images after reaching the total image size limit",
+            )
+            data, extension = None, None
+        elif data is not None:
+            total_bytes += len(data)
+        streamed[reference] = (data, extension)
+        return reference
+
+    return sink
+
+
 def _decode_href(
     href,
     svg_dir,
@@ -404,32 +397,23 @@ def _decode_href(
     if href in resources["items"]:
         return resources["items"][href]
 
-    if href.lower().startswith("data:"):
-        match = _DATA_URI_RE.fullmatch(href)
-        if not match:
-            warnings.append("Skipped image with malformed data URI")
+    if href.startswith(STREAMED_IMAGE_PREFIX):
+        data, extension = resources["streamed"].get(href, (None, None))
+        if data is None:
             return _cache_resource(resources, href, (None, None))
-        mime = match.group("mime").strip().lower()
-        params = match.group("params").lower()
-        try:
-            if "base64" in params:
-                encoded = urllib.parse.unquote(match.group("data"))
-                encoded = re.sub(r"\s+", "", encoded)
-                if len(encoded) * 3 // 4 > MAX_IMAGE_BYTES:
-                    raise ValueError("image exceeds the per-resource size limit")
-                data = base64.b64decode(encoded, validate=True)
-            else:
-                data = urllib.parse.unquote_to_bytes(match.group("data"))
-        except (ValueError, UnicodeError):
-            warnings.append("Skipped image with undecodable data URI")
+    elif href.lower().startswith("data:"):
+        data, extension = _decode_data_uri(href, warnings)
+        if data is None:
             return _cache_resource(resources, href, (None, None))
-        extension = _MIME_EXTENSIONS.get(mime, ".png")
     else:
         path = _external_path(
             href, svg_dir, warnings, allow_external_outside_svg
         )
         if path is None:
             return _cache_resource(resources, href, (None, None))
+        # Missing files are recorded too: creating one later changes the
+        # result of a cached import.
+        resources["files"].add(path)
         if not path.is_file():
             warnings.append(f"Could not resolve image reference: {href[:80]}")
             return _cache_resource(resources, href, (None, None))
@@ -528,6 +512,17 @@ def _emit_image(
     return info
 
 
+# The state the root <svg> element inherits.
+_DOCUMENT_STATE = {
+    "displayed": True,
+    "display": "inline",
+    "visibility": "visible",
+    "opacity": 1.0,
+    "local_opacity": 1.0,
+    "effects": frozenset(),
+    "styles": {},
+}
+
 # Definition-only and otherwise non-rendered containers.
 _SKIP_TAGS = {
     "defs",
@@ -594,18 +589,19 @@ def _walk(
             return
         resources["placements"] += 1
         marker_id = marker_callback(el) if marker_callback else None
-        _emit_image(
-            el,
-            ctm,
-            viewport,
-            state,
-            images,
-            warnings,
-            svg_dir,
-            resources,
-            allow_external_outside_svg,
-            marker_id,
-        )
+        if resources["load_images"]:
+            _emit_image(
+                el,
+                ctm,
+                viewport,
+                state,
+                images,
+                warnings,
+                svg_dir,
+                resources,
+                allow_external_outside_svg,
+                marker_id,
+            )
         return
 
     if tag == "use":
@@ -677,14 +673,63 @@ def _walk(
         )
 
 
-def _extract_svg_images(
-    svg_content,
+def collect_element_matrices(root, element_ids, scene_scale_length=1.0):
+    """
+    Return the current transformation matrix of every element in
+    ``element_ids``, using the viewport conventions of Blender's importer.
+
+    ``root`` must already be flattened; unresolved <use> elements and
+    non-rendered containers are not entered.
+    """
+    element_ids = set(element_ids)
+    matrices = {}
+    if not element_ids:
+        return matrices
+    root_matrix, root_rect = _svg_viewport_matrix(
+        root,
+        (0.0, 0.0),
+        nested=False,
+        scene_scale_length=scene_scale_length,
+    )
+    stack = [(child, root_matrix, root_rect) for child in reversed(root)]
+    while stack:
+        el, ctm, viewport = stack.pop()
+        if not isinstance(el.tag, str):
+            continue
+        qname = etree.QName(el.tag)
+        if qname.namespace not in (None, SVG_NS) or qname.localname in _SKIP_TAGS:
+            continue
+        transform = el.get("transform")
+        if transform:
+            ctm = mat_mul(ctm, parse_transform(transform))
+        if qname.localname == "svg":
+            viewport_matrix, viewport = _svg_viewport_matrix(
+                el,
+                viewport,
+                nested=True,
+                scene_scale_length=scene_scale_length,
+            )
+            ctm = mat_mul(ctm, viewport_matrix)
+        element_id = el.get("id")
+        if element_id in element_ids:
+            matrices[element_id] = ctm
+            if len(matrices) == len(element_ids):
+                break
+        if qname.localname in {"svg", "g", "a"}:
+            stack.extend((child, ctm, viewport) for child in reversed(el))
+    return matrices
+
+
+def _extract_svg_image_tree(
+    root,
     svg_dir=None,
     scene_scale_length=1.0,
     allow_external_outside_svg=False,
     add_markers=False,
+    dependencies=None,
+    streamed_images=None,
+    marker_ids=None,
 ):
-    root = parse_svg_string(svg_content)
     ids = {}
     existing_ids = set()
     has_embedded_stylesheet = False
@@ -708,34 +753,33 @@ def _extract_svg_images(
             "Embedded CSS stylesheets are not evaluated for image visibility "
             "or opacity"
         )
-    resources = _resource_state()
+    # Given marker ids are placed again without loading the images.
+    resources = _resource_state(
+        dependencies, streamed_images, load_images=marker_ids is None
+    )
     root_matrix, root_rect = _svg_viewport_matrix(
         root,
         (0.0, 0.0),
         nested=False,
         scene_scale_length=scene_scale_length,
     )
-    root_state = _element_state(
-        root,
-        {
-            "displayed": True,
-            "display": "inline",
-            "visibility": "visible",
-            "opacity": 1.0,
-            "local_opacity": 1.0,
-            "effects": frozenset(),
-            "styles": {},
-        },
-    )
+    root_state = _element_state(root, _DOCUMENT_STATE)
 
-    marker_ids = []
+    placed_ids = []
+    given_ids = iter(marker_ids) if marker_ids is not None else None
     marker_prefix = f"__ESVG_IMG_{uuid.uuid4().hex[:12]}_"
     while any(value.startswith(marker_prefix) for value in existing_ids):
         marker_prefix = f"_{marker_prefix}"
 
     def add_marker(image_el):
-        marker_id = f"{marker_prefix}{len(marker_ids):06d}"
-        marker_ids.append(marker_id)
+        if given_ids is None:
+            marker_id = f"{marker_prefix}{len(placed_ids):06d}"
+        else:
+            marker_id = next(given_ids, None)
+        placed_ids.append(marker_id)
+        if marker_id is None:
+            # More images than given markers: the ids do not fit this tree.
+            return None
         namespace = etree.QName(image_el.tag).namespace
         marker_tag = f"{{{namespace}}}line" if namespace else "line"
         marker = etree.Element(marker_tag)
@@ -766,11 +810,25 @@ def _extract_svg_images(
                 add_marker if add_markers else None,
             )
 
-    marked_svg = (
-        etree.tostring(root, encoding="unicode", pretty_print=True)
-        if add_markers
-        else None
+    return images, warnings, placed_ids
+
+
+def _extract_svg_images(
+    svg_content,
+    svg_dir=None,
+    scene_scale_length=1.0,
+    allow_external_outside_svg=False,
+    add_markers=False,
+):
+    root = parse_svg_string(svg_content)
+    images, warnings, marker_ids = _extract_svg_image_tree(
+        root,
+        svg_dir,
+        scene_scale_length,
+        allow_external_outside_svg,
+        add_markers,
     )
+    marked_svg = serialize_svg_tree(root) if add_markers else None
     return images, warnings, marked_svg, marker_ids
 
 
@@ -791,6 +849,50 @@ def extract_svg_images(
     return images, warnings
 
 
+def prepare_svg_image_tree(
+    root,
+    svg_dir=None,
+    scene_scale_length=1.0,
+    allow_external_outside_svg=False,
+    dependencies=None,
+    streamed_images=None,
+):
+    """
+    Extract images and replace them in ``root`` with paint-order markers.
+
+    When ``dependencies`` is a set, every external file path the images were
+    resolved against is added to it.  ``streamed_images`` is the dict filled
+    by a streamed_image_sink while ``root`` was read.
+    """
+    return _extract_svg_image_tree(
+        root,
+        svg_dir,
+        scene_scale_length,
+        allow_external_outside_svg,
+        add_markers=True,
+        dependencies=dependencies,
+        streamed_images=streamed_images,
+    )
+
+
+def mark_svg_image_tree(root, marker_ids, scene_scale_length=1.0):
+    """
+    Replace the images of ``root`` with the paint-order markers
+    ``marker_ids``, without loading the images.
+
+    ``root`` is a processed tree that prepare_svg_image_tree marked with
+    these ids, parsed again from its text before marking, so the walk meets
+    its images in the same order.  Returns whether every id was placed.
+    """
+    _images, _warnings, placed_ids = _extract_svg_image_tree(
+        root,
+        scene_scale_length=scene_scale_length,
+        add_markers=True,
+        marker_ids=marker_ids,
+    )
+    return placed_ids == list(marker_ids)
+
+
 def prepare_svg_images(
     processed_svg,
     svg_dir=None,
@@ -979,8 +1081,14 @@ def _create_image_material(image, use_emission):
     return mat
 
 
-def create_image_planes(images, collection, use_emission=False, warnings=None):
-    """Create packed, UV-mapped image planes for extracted placements."""
+def create_image_planes(
+    images, collection, use_emission=False, warnings=None, claim=leave_unclaimed
+):
+    """
+    Create packed, UV-mapped image planes for extracted placements.
+
+    Every created image, material, mesh and object is passed to ``claim``.
+    """
     import bpy
 
     warnings = warnings if warnings is not None else []
@@ -991,6 +1099,7 @@ def create_image_planes(images, collection, use_emission=False, warnings=None):
         image = _load_packed_image(info, image_cache, warnings)
         if image is None:
             continue
+        claim(image)
         corners, corner_uvs = _placement_geometry(info, image.size)
         if not corners:
             warnings.append(f"Skipped image with invalid geometry: {info['name']}")
@@ -1007,7 +1116,7 @@ def create_image_planes(images, collection, use_emission=False, warnings=None):
             continue
         loop_order = (0, 1, 2, 3) if area > 0 else (0, 3, 2, 1)
 
-        mesh = bpy.data.meshes.new(f"Image_{info['name']}")
+        mesh = claim(bpy.data.meshes.new(f"Image_{info['name']}"))
         mesh["enhanced_svg_image_mesh"] = True
         mesh.from_pydata(verts, [], [loop_order])
         uv_layer = mesh.uv_layers.new(name="UVMap")
@@ -1017,11 +1126,11 @@ def create_image_planes(images, collection, use_emission=False, warnings=None):
         material_key = (image.as_pointer(), bool(use_emission))
         material = material_cache.get(material_key)
         if material is None:
-            material = _create_image_material(image, use_emission)
+            material = claim(_create_image_material(image, use_emission))
             material_cache[material_key] = material
         mesh.materials.append(material)
 
-        obj = bpy.data.objects.new(f"Image_{info['name']}", mesh)
+        obj = claim(bpy.data.objects.new(f"Image_{info['name']}", mesh))
         obj["enhanced_svg_image_object"] = True
         collection.objects.link(obj)
         obj["opacity"] = float(info.get("opacity", 1.0))
@@ -1037,7 +1146,8 @@ def create_image_planes(images, collection, use_emission=False, warnings=None):
     return created
 
 
-def _marker_id_for_object(obj_name, marker_ids):
+def marker_id_for_object(obj_name, marker_ids):
+    """Return the marker id an imported object was named after, if any."""
     if obj_name in marker_ids:
         return obj_name
     match = _BLENDER_SUFFIX_RE.match(obj_name)
@@ -1072,6 +1182,27 @@ def _remove_image_plane(obj):
             bpy.data.images.remove(image)
 
 
+def remove_marker_object(obj):
+    """Remove an imported marker curve and its now-unused generated data."""
+    import bpy
+
+    data = obj.data
+    materials = (
+        {material for material in data.materials if material is not None}
+        if data is not None and hasattr(data, "materials")
+        else set()
+    )
+    bpy.data.objects.remove(obj, do_unlink=True)
+    if data is not None and data.users == 0:
+        bpy.data.curves.remove(data)
+    for material in materials:
+        if material.users == 0 and (
+            material.get("enhanced_svg_blender_material")
+            or material.get("enhanced_svg_curve_material")
+        ):
+            bpy.data.materials.remove(material)
+
+
 def finalize_paint_order(
     collection,
     source_objects,
@@ -1081,8 +1212,6 @@ def finalize_paint_order(
     z_step=PAINT_ORDER_Z_STEP,
 ):
     """Replace marker curves with planes and restore logical collection order."""
-    import bpy
-
     warnings = warnings if warnings is not None else []
     marker_set = set(marker_ids)
     image_by_marker = {
@@ -1094,7 +1223,7 @@ def finalize_paint_order(
     found_markers = set()
 
     for obj in source_objects:
-        marker_id = _marker_id_for_object(obj.name, marker_set)
+        marker_id = marker_id_for_object(obj.name, marker_set)
         if marker_id is None:
             ordered.append(obj)
             continue
@@ -1102,21 +1231,7 @@ def finalize_paint_order(
         info = image_by_marker.get(marker_id)
         if info is not None and info.get("_created_object") is not None:
             ordered.append(info["_created_object"])
-        data = obj.data
-        materials = (
-            {material for material in data.materials if material is not None}
-            if data is not None and hasattr(data, "materials")
-            else set()
-        )
-        bpy.data.objects.remove(obj, do_unlink=True)
-        if data is not None and data.users == 0:
-            bpy.data.curves.remove(data)
-        for material in materials:
-            if material.users == 0 and (
-                material.get("enhanced_svg_blender_material")
-                or material.get("enhanced_svg_curve_material")
-            ):
-                bpy.data.materials.remove(material)
+        remove_marker_object(obj)
 
     for info in images:
         obj = info.get("_created_object")
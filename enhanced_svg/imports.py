@@ -1,21 +1,57 @@
 import bpy
 from bpy_extras.io_utils import ImportHelper
-from bpy.props import BoolProperty, StringProperty
+from bpy.props import BoolProperty, FloatProperty, IntProperty, StringProperty
+from collections import Counter
 from pathlib import Path
 import importlib
+import functools
+import io
+import math
 import os
 import tempfile
+import uuid
 from mathutils import Matrix
 
 import time
 
-from .svg_preprocessing import preprocess_svg
+from .svg_preprocessing import (
+    COMPACT_DECIMALS,
+    STROKE_TOLERANCE,
+    parse_svg_string,
+    preprocess_svg_tree,
+    read_svg_file,
+    serialize_svg_tree,
+)
+from .cache import file_cache_key, load_cached_import, store_cached_import
+from .preferences import cache_settings, parallel_stroke_threshold
 from .image_import import (
+    BLENDER_SCALE,
+    collect_element_matrices,
     create_image_planes,
     finalize_paint_order,
-    prepare_svg_images,
+    mark_svg_image_tree,
+    marker_id_for_object,
+    mat_invert,
+    mat_mul,
+    prepare_svg_image_tree,
+    remove_marker_object,
+    streamed_image_sink,
+)
+from .curve_builder import build_curve_collection
+from .curve_meshes import bake_curves_to_meshes, merge_by_material
+from .ownership import (
+    begin_import_state,
+    claim,
+    claimed_by,
+    is_removed,
+    unclaimed_or_claimed_by,
 )
 
+# Native stroke bevels are round tubes; flattening them keeps them in the
+# drawing plane, and a low resolution keeps the geometry light.
+NATIVE_STROKE_BEVEL_RESOLUTION = 2
+NATIVE_STROKE_Z_SCALE = 0.001
+
 
 def _select_import_collection(collections, source_name):
     """Return Blender's uniquely named collection for one temporary SVG."""
@@ -25,8 +61,96 @@ def _select_import_collection(collections, source_name):
     )
 
 
+class _InMemorySVGFile(io.BytesIO):
+    """SVG bytes that io_curve_svg reads like a file and names like a path."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+    def __fspath__(self):
+        return self.name
+
+
+def _tag_loader_materials(loader_context, import_state):
+    # The loader's material cache is private to this import, so every
+    # material in it was created here.
+    for material in loader_context.get("materials", {}).values():
+        if material is not None:
+            material["enhanced_svg_blender_material"] = True
+            claim(import_state, material)
+
+
+def _load_curve_svg_in_memory(context, svg_content, import_state):
+    """
+    Import SVG text with io_curve_svg's SVGLoader, without a temp file or
+    the operator.
+
+    The loader parses its ``filepath`` with ``xml.dom.minidom.parse``, which
+    reads file objects too, and names its collection after the path, so an
+    in-memory file that is also path-like passes through unchanged.  Returns
+    None, leaving no data behind, when Blender's SVG module does not have
+    that layout; errors in the document itself are raised.
+    """
+    try:
+        svg_import_module = importlib.import_module("io_curve_svg.import_svg")
+        loader_class = svg_import_module.SVGLoader
+    except (AttributeError, ImportError):
+        return None
+    source_name = f"{uuid.uuid4().hex}.svg"
+    collections_before = set(context.scene.collection.children)
+    do_colormanage = context.scene.display_settings.display_device != "NONE"
+    loader = None
+    try:
+        loader = loader_class(
+            context,
+            _InMemorySVGFile(svg_content.encode("utf-8"), source_name),
+            do_colormanage,
+        )
+        loader_context = loader._context
+    except (AttributeError, OSError, TypeError):
+        loader = None
+    finally:
+        # The loader parses the document in its constructor; a collection it
+        # created before a parse error must be rolled back with the import.
+        new_collections = [
+            collection
+            for collection in context.scene.collection.children
+            if collection not in collections_before
+        ]
+        imported_collection = _select_import_collection(
+            new_collections, source_name
+        )
+        if imported_collection is not None:
+            claim(import_state, imported_collection)
+            import_state["owned_collections"].add(imported_collection)
+    if loader is None or imported_collection is None:
+        for collection in new_collections:
+            if len(collection.all_objects) == 0 and not collection.children:
+                import_state["owned_collections"].discard(collection)
+                bpy.data.collections.remove(collection)
+        return None
+
+    if bpy.ops.object.mode_set.poll():
+        bpy.ops.object.mode_set(mode="OBJECT")
+    try:
+        loader.parse()
+        loader.createGeom(False)
+    finally:
+        _tag_loader_materials(loader_context, import_state)
+    return imported_collection
+
+
 def _import_curve_svg(context, svg_content, import_state):
-    """Import SVG text through Blender using a unique, always-cleaned temp file."""
+    """
+    Import SVG text through Blender's SVG loader, in memory when possible
+    and otherwise with a unique, always-cleaned temp file.
+    """
+    imported_collection = _load_curve_svg_in_memory(
+        context, svg_content, import_state
+    )
+    if imported_collection is not None:
+        return imported_collection
     temporary = tempfile.NamedTemporaryFile(
         mode="w", suffix=".svg", encoding="utf-8", delete=False
     )
@@ -40,12 +164,11 @@ def _import_curve_svg(context, svg_content, import_state):
             original_get_material = svg_import_module.SVGGetMaterial
 
             def tracked_get_material(color, import_context):
+                # The operator's material cache is private to this import.
                 material = original_get_material(color, import_context)
-                if (
-                    material is not None
-                    and material not in import_state["materials"]
-                ):
+                if material is not None:
                     material["enhanced_svg_blender_material"] = True
+                    claim(import_state, material)
                 return material
 
             svg_import_module.SVGGetMaterial = tracked_get_material
@@ -75,6 +198,7 @@ def _import_curve_svg(context, svg_content, import_state):
                 new_collections, source_name
             )
             if imported_collection is not None:
+                claim(import_state, imported_collection)
                 import_state["owned_collections"].add(imported_collection)
             if material_hook is not None:
                 module, original, tracked = material_hook
@@ -93,43 +217,308 @@ def _import_curve_svg(context, svg_content, import_state):
     return new_collections[0]
 
 
-def _prepare_processed_import(
-    context, raw_svg_file, allow_external_images, import_state
+def _preprocess_options(operator):
+    """Collect the processed-import operator settings in one plain dict."""
+    return {
+        "allow_external_images": operator.allow_external_images,
+        "stroke_tolerance": operator.stroke_tolerance,
+        "instance_uses": operator.instance_uses,
+        "bezier_outlines": operator.bezier_outlines,
+        "native_strokes": operator.native_strokes,
+        "prune_invisible": operator.prune_invisible,
+        "cull_viewport": operator.cull_viewport,
+        "simplify_tolerance": operator.simplify_tolerance,
+        "compact_decimals": (
+            operator.coordinate_decimals if operator.compact_svg else None
+        ),
+    }
+
+
+def _preprocess_svg_file(
+    raw_svg_file, scene_scale_length, options, parallel_threshold=None
 ):
-    raw_svg_content = raw_svg_file.read_text(encoding="utf-8")
-    processed_svg = preprocess_svg(raw_svg_content)
-    images, warnings, marked_svg, marker_ids = prepare_svg_images(
-        processed_svg,
+    """
+    Preprocess an SVG file into everything Blender's import step needs.
+
+    Returns the cacheable result dict, the set of external files that the
+    images were resolved against and the marked element tree.
+    """
+    # The file is streamed into a tree, and large inline images are decoded
+    # as they are read, so the source text is never held in memory.  One
+    # tree flows through every stage; text is only produced for the
+    # collection's processed_svg property and for Blender's importer.
+    instances = [] if options["instance_uses"] else None
+    native_strokes = {} if options["native_strokes"] else None
+    pruned = Counter() if options["prune_invisible"] else None
+    culled = Counter() if options["cull_viewport"] else None
+    simplified = Counter()
+    streamed_images = {}
+    stream_warnings = []
+    root = preprocess_svg_tree(
+        read_svg_file(
+            raw_svg_file,
+            image_sink=streamed_image_sink(streamed_images, stream_warnings),
+        ),
+        stroke_tolerance=options["stroke_tolerance"],
+        instances=instances,
+        parallel_threshold=parallel_threshold,
+        decimals=options["compact_decimals"],
+        bezier=options["bezier_outlines"],
+        native_strokes=native_strokes,
+        pruned=pruned,
+        culled=culled,
+        simplify_tolerance=options["simplify_tolerance"],
+        simplified=simplified,
+        scene_scale_length=scene_scale_length,
+    )
+    compact = options["compact_decimals"] is not None
+    processed_svg = serialize_svg_tree(root, compact)
+    dependencies = set()
+    images, warnings, marker_ids = prepare_svg_image_tree(
+        root,
         svg_dir=raw_svg_file.parent,
-        scene_scale_length=context.scene.unit_settings.scale_length,
-        allow_external_outside_svg=allow_external_images,
+        scene_scale_length=scene_scale_length,
+        allow_external_outside_svg=options["allow_external_images"],
+        dependencies=dependencies,
+        streamed_images=streamed_images,
     )
-    imported_collection = _import_curve_svg(context, marked_svg, import_state)
+    warnings = stream_warnings + warnings
+    if pruned:
+        warnings.append(
+            f"Pruned {sum(pruned.values())} elements that never render"
+        )
+    if culled:
+        warnings.append(
+            f"Culled {sum(culled.values())} elements outside the viewport "
+            f"({culled['image']} images)"
+        )
+    if simplified:
+        warnings.append(
+            f"Simplified {simplified['paths']} paths, removing "
+            f"{simplified['points']} points"
+        )
+    if instances:
+        # Placements are measured on the final tree, with the same viewport
+        # conventions Blender applies while baking curve points.
+        matrices = collect_element_matrices(
+            root,
+            [
+                marker_id
+                for group in instances
+                for marker_id in (group["start"], *group["instances"])
+            ],
+            scene_scale_length=scene_scale_length,
+        )
+        for group in instances:
+            group["matrices"] = {
+                marker_id: matrices[marker_id]
+                for marker_id in (group["start"], *group["instances"])
+                if marker_id in matrices
+            }
+    if native_strokes:
+        # Blender bakes transforms into curve points, so the bevel takes the
+        # stroke width scaled by each centerline's transform, in metres.
+        matrices = collect_element_matrices(
+            root, native_strokes, scene_scale_length=scene_scale_length
+        )
+        native_strokes = {
+            stroke_id: width
+            * math.sqrt(abs(matrix[0] * matrix[3] - matrix[1] * matrix[2]))
+            * BLENDER_SCALE
+            for stroke_id, width in native_strokes.items()
+            if (matrix := matrices.get(stroke_id)) is not None
+        }
+    result = {
+        "processed_svg": processed_svg,
+        "images": images,
+        "warnings": warnings,
+        "marker_ids": marker_ids,
+        "instances": instances or [],
+        "native_strokes": native_strokes or {},
+    }
+    return result, dependencies, root
+
+
+def _prepare_processed_import(
+    context, raw_svg_file, options, import_state, direct_curves=False
+):
+    scene_scale_length = context.scene.unit_settings.scale_length
+    settings = cache_settings(context)
+    result = None
+    root = None
+    if settings is not None:
+        cache_dir, max_bytes = settings
+        # Relative image references and the scene unit scale both change the
+        # stored placements, so they are part of the key.
+        key = file_cache_key(
+            raw_svg_file,
+            {
+                **options,
+                "svg_dir": str(raw_svg_file.parent.resolve()),
+                "scene_scale_length": scene_scale_length,
+            },
+        )
+        result = load_cached_import(cache_dir, key)
+        if result is not None:
+            # Entries keep only the processed SVG; the cached markers replace
+            # its images again without loading them.
+            root = parse_svg_string(result["processed_svg"])
+            if not mark_svg_image_tree(
+                root, result["marker_ids"], scene_scale_length
+            ):
+                result = root = None
+
+    if result is None:
+        # The pool only changes how outlines are computed, not their result,
+        # so it is not part of the cache key.
+        result, dependencies, root = _preprocess_svg_file(
+            raw_svg_file,
+            scene_scale_length,
+            options,
+            parallel_threshold=parallel_stroke_threshold(context),
+        )
+        if settings is not None:
+            try:
+                store_cached_import(
+                    cache_dir, key, result, dependencies, max_bytes
+                )
+            except OSError:
+                result["warnings"].append(
+                    "Could not write the processed import cache"
+                )
+
+    imported_collection = None
+    if direct_curves:
+        # The builder takes the marked tree as it is; only Blender's
+        # importer needs it as text.
+        imported_collection = build_curve_collection(
+            context,
+            root,
+            raw_svg_file.name,
+            import_state,
+            scene_scale_length,
+        )
+    if imported_collection is None:
+        imported_collection = _import_curve_svg(
+            context,
+            serialize_svg_tree(root, options["compact_decimals"] is not None),
+            import_state,
+        )
     return (
-        processed_svg,
+        result["processed_svg"],
         imported_collection,
         list(imported_collection.objects),
-        images,
-        warnings,
-        marker_ids,
+        result["images"],
+        result["warnings"],
+        result["marker_ids"],
+        result["instances"],
+        result["native_strokes"],
     )
 
 
-def _snapshot_import_state():
-    """Capture data-blocks that a processed import may create."""
-    return {
-        "collections": set(bpy.data.collections),
-        "objects": set(bpy.data.objects),
-        "curves": set(bpy.data.curves),
-        "meshes": set(bpy.data.meshes),
-        "materials": set(bpy.data.materials),
-        "images": set(bpy.data.images),
-        "owned_collections": set(),
-    }
+def _blender_matrix(matrix):
+    """Return an SVG affine matrix acting on Blender's imported coordinates."""
+    a, b, c, d, e, f = matrix
+    # Blender imports SVG points as (x * BLENDER_SCALE, -y * BLENDER_SCALE).
+    return Matrix(
+        (
+            (a, -c, 0.0, e * BLENDER_SCALE),
+            (-b, d, 0.0, -f * BLENDER_SCALE),
+            (0.0, 0.0, 1.0, 0.0),
+            (0.0, 0.0, 0.0, 1.0),
+        )
+    )
+
+
+def _link_use_instances(collection, source_objects, instances, warnings):
+    """
+    Replace instanced <use> markers with linked duplicates of the prototype.
+
+    The objects imported between a group's start and end markers form its
+    prototype.  Every instance marker is replaced by copies of those objects
+    that share their curve data and carry the placement as object transform.
+    Returns ``source_objects`` in paint order with the markers resolved.
+    """
+    marker_groups = {}
+    for group in instances:
+        marker_groups[group["start"]] = group
+        marker_groups[group["end"]] = group
+        for marker_id in group["instances"]:
+            marker_groups[marker_id] = group
+
+    prototypes = {}
+    open_prototype = None
+    entries = []
+    marker_objects = []
+    for obj in source_objects:
+        marker_id = marker_id_for_object(obj.name, marker_groups)
+        if marker_id is None:
+            entries.append((obj, None))
+            if open_prototype is not None:
+                open_prototype.append(obj)
+            continue
+        marker_objects.append(obj)
+        group = marker_groups[marker_id]
+        if marker_id == group["start"]:
+            open_prototype = prototypes[marker_id] = []
+        elif marker_id == group["end"]:
+            open_prototype = None
+        else:
+            entries.append((None, marker_id))
+
+    ordered = []
+    for obj, marker_id in entries:
+        if obj is not None:
+            ordered.append(obj)
+            continue
+        group = marker_groups[marker_id]
+        matrices = group["matrices"]
+        prototype_matrix = matrices.get(group["start"])
+        inverse = mat_invert(prototype_matrix) if prototype_matrix else None
+        if inverse is None or marker_id not in matrices:
+            warnings.append("Skipped a <use> instance with a degenerate placement")
+            continue
+        placement = _blender_matrix(mat_mul(matrices[marker_id], inverse))
+        for prototype in prototypes.get(group["start"], ()):
+            duplicate = prototype.copy()
+            collection.objects.link(duplicate)
+            duplicate.matrix_world = placement @ prototype.matrix_world
+            ordered.append(duplicate)
+
+    for obj in marker_objects:
+        remove_marker_object(obj)
+    return ordered
+
+
+def _configure_native_strokes(source_objects, native_strokes):
+    """
+    Render native stroke centerlines with a bevel instead of a fill.
+
+    ``native_strokes`` maps centerline ids to stroke widths in Blender units.
+    The bevel is flattened with the object's Z scale so strokes stay in the
+    drawing plane and keep the paint-order offsets meaningful.
+    """
+    for obj in source_objects:
+        stroke_id = marker_id_for_object(obj.name, native_strokes)
+        if stroke_id is None or obj.type != "CURVE":
+            continue
+        curve = obj.data
+        curve.fill_mode = "NONE"
+        curve.bevel_mode = "ROUND"
+        curve.bevel_depth = native_strokes[stroke_id] / 2.0
+        curve.bevel_resolution = NATIVE_STROKE_BEVEL_RESOLUTION
+        curve.use_fill_caps = True
+        obj.scale.z = NATIVE_STROKE_Z_SCALE
+        obj.name = "Stroke"
+
 
+def _rollback_import_state(import_state):
+    """
+    Remove only data-blocks owned by a failed processed import.
 
-def _rollback_import_state(before):
-    """Remove only data-blocks owned by a failed processed import."""
+    Only the claimed data-blocks and the contents of the owned collections
+    are visited, never the whole of ``bpy.data``.
+    """
     owned_collections = set()
 
     def collect_collection(collection):
@@ -141,95 +530,91 @@ def _rollback_import_state(before):
             # collection created by Blender's SVG importer.  Following that
             # link during rollback must not turn the pre-existing collection
             # (or any of its contents) into import-owned data.
-            if child not in before["collections"]:
+            if claimed_by(import_state, child):
                 collect_collection(child)
 
-    for collection in before["owned_collections"]:
-        if collection.name in bpy.data.collections:
+    for collection in import_state["owned_collections"]:
+        if not is_removed(collection):
             collect_collection(collection)
 
-    new_objects = set(bpy.data.objects) - before["objects"]
+    created = [
+        datablock
+        for datablock in import_state["created"]
+        if not is_removed(datablock)
+    ]
     owned_objects = {
-        obj
-        for collection in owned_collections
-        for obj in collection.objects
-        if obj in new_objects
+        obj for obj in created if isinstance(obj, bpy.types.Object)
+    }
+    for collection in owned_collections:
+        for obj in collection.objects:
+            # Blender's importer does not tag its objects, but they are only
+            # linked to its collection; an existing object a handler linked
+            # there too is still linked elsewhere.
+            if claimed_by(import_state, obj) or all(
+                users_collection in owned_collections
+                for users_collection in obj.users_collection
+            ):
+                owned_objects.add(obj)
+
+    owned_data = {
+        data
+        for data in created
+        if isinstance(data, (bpy.types.Mesh, bpy.types.Curve))
+    }
+    owned_materials = {
+        material for material in created if isinstance(material, bpy.types.Material)
+    }
+    owned_images = {
+        image for image in created if isinstance(image, bpy.types.Image)
     }
-    owned_objects.update(
-        obj
-        for obj in new_objects
-        if obj.get("enhanced_svg_image_object")
-    )
-
-    owned_meshes = set()
-    owned_curves = set()
-    owned_materials = set()
-    owned_images = set()
     for obj in owned_objects:
         data = obj.data
-        if isinstance(data, bpy.types.Mesh):
-            owned_meshes.add(data)
-        elif isinstance(data, bpy.types.Curve):
-            owned_curves.add(data)
+        if isinstance(data, (bpy.types.Mesh, bpy.types.Curve)):
+            owned_data.add(data)
         if data is not None and hasattr(data, "materials"):
             owned_materials.update(
-                material for material in data.materials if material is not None
+                material
+                for material in data.materials
+                if material is not None
+                and unclaimed_or_claimed_by(import_state, material)
             )
 
-    for material in owned_materials:
+    for material in tuple(owned_materials):
         if not material.use_nodes or material.node_tree is None:
             continue
         for node in material.node_tree.nodes:
             image = getattr(node, "image", None)
-            if image is not None:
+            if image is not None and unclaimed_or_claimed_by(import_state, image):
                 owned_images.add(image)
 
     for obj in owned_objects:
         bpy.data.objects.remove(obj, do_unlink=True)
-    for collection in tuple(owned_collections):
-        if collection in bpy.data.collections.values():
+    for collection in owned_collections:
+        if not is_removed(collection):
             bpy.data.collections.remove(collection)
 
-    # Also catch importer-owned data created immediately before a later API
-    # call failed, when it may not yet be reachable from a linked object.
-    owned_meshes.update(
-        mesh
-        for mesh in set(bpy.data.meshes) - before["meshes"]
-        if mesh.get("enhanced_svg_image_mesh")
-    )
-    owned_materials.update(
-        material
-        for material in set(bpy.data.materials) - before["materials"]
-        if material.get("enhanced_svg_image_material")
-        or material.get("enhanced_svg_curve_material")
-        or material.get("enhanced_svg_blender_material")
-    )
-    owned_images.update(
-        image
-        for image in set(bpy.data.images) - before["images"]
-        if image.get("enhanced_svg_source_hash")
-    )
-
-    for mesh in owned_meshes:
-        if mesh not in before["meshes"] and mesh.users == 0:
-            bpy.data.meshes.remove(mesh)
-    for curve in owned_curves:
-        if curve not in before["curves"] and curve.users == 0:
-            bpy.data.curves.remove(curve)
+    for data in owned_data:
+        if is_removed(data) or data.users:
+            continue
+        if isinstance(data, bpy.types.Mesh):
+            bpy.data.meshes.remove(data)
+        else:
+            bpy.data.curves.remove(data)
     for material in owned_materials:
-        if material not in before["materials"] and material.users == 0:
+        if not is_removed(material) and material.users == 0:
             bpy.data.materials.remove(material)
     for image in owned_images:
-        if image not in before["images"] and image.users == 0:
+        if not is_removed(image) and image.users == 0:
             bpy.data.images.remove(image)
 
 
 def _remove_unused_import_materials(import_state):
-    """Remove tagged materials made obsolete by successful marker deletion."""
-    for material in tuple(set(bpy.data.materials) - import_state["materials"]):
-        if material.users == 0 and (
-            material.get("enhanced_svg_blender_material")
-            or material.get("enhanced_svg_curve_material")
+    """Remove claimed materials made obsolete by successful marker deletion."""
+    for material in tuple(import_state["created"]):
+        if (
+            isinstance(material, bpy.types.Material)
+            and not is_removed(material)
+            and material.users == 0
         ):
             bpy.data.materials.remove(material)
 
@@ -239,7 +624,8 @@ def _execute_processed_import(operator, context, use_emission):
     raw_svg_file = Path(operator.filepath)
     file_name_without_ext = raw_svg_file.stem
     start_time = time.perf_counter()
-    before = _snapshot_import_state()
+    import_state = begin_import_state()
+    claim_datablock = functools.partial(claim, import_state)
 
     try:
         (
@@ -249,11 +635,14 @@ def _execute_processed_import(operator, context, use_emission):
             images,
             image_warnings,
             marker_ids,
+            instances,
+            native_strokes,
         ) = _prepare_processed_import(
             context,
             raw_svg_file,
-            operator.allow_external_images,
-            before,
+            _preprocess_options(operator),
+            import_state,
+            direct_curves=operator.direct_curves,
         )
 
         mode_name = "Emission" if use_emission else "Processed"
@@ -265,15 +654,27 @@ def _execute_processed_import(operator, context, use_emission):
                 if obj.name.startswith("Curve"):
                     obj.name = "n" + obj.name[5:]
                 setup_object(obj, scale_factor=1)
-            deduplicate_materials(imported_collection)
+            deduplicate_materials(imported_collection, claim=claim_datablock)
+
+        if native_strokes:
+            _configure_native_strokes(source_objects, native_strokes)
+
+        if instances:
+            source_objects = _link_use_instances(
+                imported_collection, source_objects, instances, image_warnings
+            )
 
         image_objects = create_image_planes(
             images,
             imported_collection,
             use_emission=use_emission,
             warnings=image_warnings,
+            claim=claim_datablock,
         )
-        if marker_ids:
+        ordered = source_objects
+        if marker_ids or instances:
+            # Linked duplicates are appended to the collection, so paint
+            # order must be restored even without image markers.
             ordered = finalize_paint_order(
                 imported_collection,
                 source_objects,
@@ -284,7 +685,24 @@ def _execute_processed_import(operator, context, use_emission):
             image_objects = [
                 obj for obj in ordered if obj.get("svg_marker_id") is not None
             ]
-        _remove_unused_import_materials(before)
+        if operator.merge_materials:
+            ordered = merge_by_material(
+                context, imported_collection, ordered, claim=claim_datablock
+            )
+        if operator.bake_meshes:
+            ordered = bake_curves_to_meshes(
+                context,
+                imported_collection,
+                ordered,
+                operator.merge_distance,
+                claim=claim_datablock,
+            )
+        if operator.merge_materials or operator.bake_meshes:
+            # New objects are linked last; relinking restores paint order.
+            finalize_paint_order(
+                imported_collection, ordered, [], [], image_warnings
+            )
+        _remove_unused_import_materials(import_state)
 
         for warning in image_warnings:
             operator.report({"WARNING"}, warning)
@@ -298,16 +716,17 @@ def _execute_processed_import(operator, context, use_emission):
         )
         return {"FINISHED"}
     except Exception:
-        _rollback_import_state(before)
+        _rollback_import_state(import_state)
         raise
 
 
-def deduplicate_materials(collection: bpy.types.Collection) -> None:
+def deduplicate_materials(collection: bpy.types.Collection, claim=None) -> None:
     """
     Deduplicate materials in a collection by reusing identical materials and giving them descriptive names.
 
     Args:
         collection: The collection containing objects whose materials need deduplication
+        claim: Optional callable that receives every material created here
     """
 
     materials_dict = {}
@@ -330,6 +749,8 @@ def deduplicate_materials(collection: bpy.types.Collection) -> None:
             materials_dict[mat_key] = create_material(
                 current_mat.diffuse_color, mat_name
             )
+            if claim is not None:
+                claim(materials_dict[mat_key])
 
         new_mat = materials_dict[mat_key]
         if current_mat != new_mat:
@@ -397,8 +818,139 @@ def create_material(color, name: str = "") -> bpy.types.Material:
     return mat
 
 
+class _ProcessedImportOptions:
+    """Import options shared by the operators that preprocess the SVG."""
+
+    allow_external_images: BoolProperty(
+        name="Allow Images Outside SVG Folder",
+        description=(
+            "Allow absolute paths and parent-directory image references; "
+            "leave disabled for untrusted SVG files"
+        ),
+        default=False,
+    )
+    stroke_tolerance: FloatProperty(
+        name="Stroke Tolerance",
+        description=(
+            "Largest distance, in SVG user units, between a converted stroke "
+            "outline and the exact stroke edge; smaller values add vertices"
+        ),
+        default=STROKE_TOLERANCE,
+        min=0.0001,
+        soft_max=1.0,
+        precision=4,
+    )
+    instance_uses: BoolProperty(
+        name="Instance Repeated Uses",
+        description=(
+            "Import each repeated <use> target once and place the other "
+            "copies as linked duplicates that share its curve data"
+        ),
+        default=False,
+    )
+    bezier_outlines: BoolProperty(
+        name="Curved Stroke Outlines",
+        description=(
+            "Outline strokes with offset Bézier curves and their line joins, "
+            "giving far fewer control points than a polygon outline"
+        ),
+        default=False,
+    )
+    native_strokes: BoolProperty(
+        name="Native Strokes",
+        description=(
+            "Keep stroked paths as centerline curves that Blender bevels to "
+            "the stroke width, instead of converting them to outlines"
+        ),
+        default=False,
+    )
+    prune_invisible: BoolProperty(
+        name="Prune Invisible Elements",
+        description=(
+            "Skip elements that never render: display none, zero opacity "
+            "and hidden shapes"
+        ),
+        default=False,
+    )
+    cull_viewport: BoolProperty(
+        name="Cull Outside Viewport",
+        description=(
+            "Skip shapes and images that lie entirely outside the SVG "
+            "viewBox, such as off-canvas artboards"
+        ),
+        default=False,
+    )
+    simplify_tolerance: FloatProperty(
+        name="Simplify Tolerance",
+        description=(
+            "Drop path vertices that stay within this distance of the "
+            "simplified outline in the imported curves; 0 keeps every vertex"
+        ),
+        default=0.0,
+        min=0.0,
+        soft_max=0.01,
+        precision=5,
+        subtype="DISTANCE",
+    )
+    direct_curves: BoolProperty(
+        name="Direct Curve Builder",
+        description=(
+            "Create the curves from the processed SVG directly instead of "
+            "running Blender's SVG importer on a temporary file"
+        ),
+        default=False,
+    )
+    merge_materials: BoolProperty(
+        name="Merge by Material",
+        description=(
+            "Join consecutive shapes that share a material into one mesh "
+            "object, keeping paint order; far fewer objects, but the shapes "
+            "are no longer editable curves"
+        ),
+        default=False,
+    )
+    bake_meshes: BoolProperty(
+        name="Bake to Meshes",
+        description=(
+            "Convert the imported curves to triangulated meshes, so Blender "
+            "does not fill them again on every update"
+        ),
+        default=False,
+    )
+    merge_distance: FloatProperty(
+        name="Merge Distance",
+        description=(
+            "Merge baked mesh vertices closer than this distance; 0 keeps "
+            "every vertex"
+        ),
+        default=0.0,
+        min=0.0,
+        soft_max=0.001,
+        precision=6,
+        subtype="DISTANCE",
+    )
+    compact_svg: BoolProperty(
+        name="Compact Output",
+        description=(
+            "Write the processed SVG without indentation and with rounded, "
+            "relative stroke outline coordinates, so Blender parses less text"
+        ),
+        default=False,
+    )
+    coordinate_decimals: IntProperty(
+        name="Coordinate Decimals",
+        description=(
+            "Decimal places of compact stroke outline coordinates, in SVG "
+            "user units"
+        ),
+        default=COMPACT_DECIMALS,
+        min=0,
+        max=10,
+    )
+
+
 # Operator for the button and drag-and-drop with post-processing
-class ImportSVGOperator(bpy.types.Operator, ImportHelper):
+class ImportSVGOperator(bpy.types.Operator, ImportHelper, _ProcessedImportOptions):
     """Operator to import a .svg file with post-processing (flattening and stroke conversion)."""
 
     bl_idname = "import_scene.import_svg"
@@ -412,14 +964,6 @@ class ImportSVGOperator(bpy.types.Operator, ImportHelper):
     # Set a default extension (the user can change it in the file browser)
     filename_ext = ".svg"
     filter_glob: StringProperty(default="*.svg", options={"HIDDEN"}, maxlen=255)
-    allow_external_images: BoolProperty(
-        name="Allow Images Outside SVG Folder",
-        description=(
-            "Allow absolute paths and parent-directory image references; "
-            "leave disabled for untrusted SVG files"
-        ),
-        default=False,
-    )
 
     def execute(self, context):
         # Verify that the selected file is a .svg file.
@@ -439,7 +983,9 @@ class ImportSVGOperator(bpy.types.Operator, ImportHelper):
 
 
 # Operator for the button and drag-and-drop with post-processing and emission
-class ImportSVGEmissionOperator(bpy.types.Operator, ImportHelper):
+class ImportSVGEmissionOperator(
+    bpy.types.Operator, ImportHelper, _ProcessedImportOptions
+):
     """Operator to import a .svg file with post-processing (flattening, stroke conversion) and emission materials."""
 
     bl_idname = "import_scene.import_svg_emission"
@@ -453,14 +999,6 @@ class ImportSVGEmissionOperator(bpy.types.Operator, ImportHelper):
     # Set a default extension (the user can change it in the file browser)
     filename_ext = ".svg"
     filter_glob: StringProperty(default="*.svg", options={"HIDDEN"}, maxlen=255)
-    allow_external_images: BoolProperty(
-        name="Allow Images Outside SVG Folder",
-        description=(
-            "Allow absolute paths and parent-directory image references; "
-            "leave disabled for untrusted SVG files"
-        ),
-        default=False,
-    )
 
     def execute(self, context):
         # Verify that the selected file is a .svg file.
@@ -0,0 +1,57 @@
+"""Track the data-blocks one processed import creates.
+
+Every data-block an import creates is claimed: it gets the import's
+transaction id in its ``enhanced_svg_import`` ID property and is recorded in
+the import state.  Rollback and cleanup then only visit what the import
+created, instead of diffing snapshots of the whole ``bpy.data``.
+"""
+
+import uuid
+
+IMPORT_TRANSACTION_KEY = "enhanced_svg_import"
+
+
+def begin_import_state():
+    """Return the ownership state of a new processed import."""
+    return {
+        "transaction": uuid.uuid4().hex,
+        "owned_collections": set(),
+        "created": set(),
+    }
+
+
+def claim(import_state, datablock):
+    """Tag ``datablock`` as created by the import and return it."""
+    datablock[IMPORT_TRANSACTION_KEY] = import_state["transaction"]
+    import_state["created"].add(datablock)
+    return datablock
+
+
+def leave_unclaimed(datablock):
+    """
+    Return ``datablock`` untagged: the ``claim`` callable of data-block
+    creators that run outside a processed import.
+    """
+    return datablock
+
+
+def claimed_by(import_state, datablock):
+    """Return whether ``datablock`` was claimed by the import."""
+    return datablock.get(IMPORT_TRANSACTION_KEY) == import_state["transaction"]
+
+
+def unclaimed_or_claimed_by(import_state, datablock):
+    """Return whether ``datablock`` belongs to no other import."""
+    return datablock.get(IMPORT_TRANSACTION_KEY) in (
+        None,
+        import_state["transaction"],
+    )
+
+
+def is_removed(datablock):
+    """Return whether ``datablock`` was already removed from ``bpy.data``."""
+    try:
+        datablock.name
+    except ReferenceError:
+        return True
+    return False
@@ -0,0 +1,330 @@
+"""Parse SVG path data into flat command and coordinate arrays.
+
+``svg.path`` builds one Python object per segment, and for paths with tens
+of thousands of commands that object construction dominates.  Here a path
+is tokenized with a few regular expressions and normalized to absolute
+``M``, ``L``, ``C``, ``Q``, ``A`` and ``Z`` commands: ``H``/``V`` become
+lines, ``S``/``T`` get their reflected control point spelled out, and
+relative coordinates are resolved.  The result is a dict with:
+
+  * ``commands``: ``bytes`` with one command letter per command,
+  * ``coords``: a flat float64 array with the arguments of every command in
+    order: two for ``M`` and ``L``, six for ``C``, four for ``Q``, none for
+    ``Z`` and ``rx ry rotation large-arc sweep x y`` for ``A``.
+
+Code that needs ``svg.path`` objects converts with to_svg_path, and
+path_data_string writes path data back as text.
+"""
+
+import itertools
+import re
+
+import numpy as np
+from svg.path import Arc, Close, CubicBezier, Line, Move, Path, QuadraticBezier
+
+_COMMAND_RE = re.compile(r"([MmZzLlHhVvCcSsQqTtAa])")
+_NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_NUMBER_RE = re.compile(_NUMBER)
+# Arc flags are single digits that need no separator ("a1 1 0 0110 10").
+_ARC_RE = re.compile(
+    r"[\s,]*".join(
+        [f"({_NUMBER})"] * 3 + ["([01])", "([01])"] + [f"({_NUMBER})"] * 2
+    )
+    + r"[\s,]*"
+)
+_INVALID_RE = re.compile(r"[^\d.eE+\-\s,]")
+_ARGUMENT_COUNTS = {
+    "M": 2,
+    "L": 2,
+    "H": 1,
+    "V": 1,
+    "C": 6,
+    "S": 4,
+    "Q": 4,
+    "T": 2,
+    "A": 7,
+}
+
+
+def _arc_arguments(command, args):
+    values = []
+    position = len(args) - len(args.lstrip(" \t\r\n,"))
+    while position < len(args):
+        match = _ARC_RE.match(args, position)
+        if match is None:
+            raise ValueError(f"Invalid path element {command} {args}")
+        values.extend(float(value) for value in match.groups())
+        position = match.end()
+    return values
+
+
+def parse_path_data(d_attr):
+    """
+    Parse SVG path data into normalized ``commands`` and ``coords`` arrays.
+
+    Like ``svg.path``, parsing stops at a character that cannot appear in
+    path data, and an incomplete set of arguments raises ValueError.
+    """
+    parts = _COMMAND_RE.split(d_attr)
+    if parts[0].strip():
+        raise ValueError(f"Path does not start with a command: {d_attr}")
+    commands = []
+    coords = []
+    x = y = start_x = start_y = 0.0
+    # Control points that a following S or T command reflects.
+    cubic_control = quadratic_control = None
+    for command, args in zip(parts[1::2], parts[2::2]):
+        invalid = _INVALID_RE.search(args)
+        if invalid is not None:
+            args = args[: invalid.start()]
+        kind = command.upper()
+        relative = command != kind
+        if kind == "Z":
+            commands.append("Z")
+            x, y = start_x, start_y
+            cubic_control = quadratic_control = None
+        else:
+            if kind == "A":
+                values = _arc_arguments(command, args)
+            else:
+                values = [float(value) for value in _NUMBER_RE.findall(args)]
+            count = _ARGUMENT_COUNTS[kind]
+            if len(values) % count:
+                raise ValueError(f"Invalid path element {command} {args}")
+            for offset in range(0, len(values), count):
+                dx, dy = (x, y) if relative else (0.0, 0.0)
+                if kind == "M":
+                    x, y = values[offset] + dx, values[offset + 1] + dy
+                    commands.append("M")
+                    coords += (x, y)
+                    start_x, start_y = x, y
+                    # Further coordinate pairs are implicit line commands.
+                    kind = "L"
+                    cubic_control = quadratic_control = None
+                    continue
+                if kind in ("L", "H", "V"):
+                    if kind == "H":
+                        x = values[offset] + dx
+                    elif kind == "V":
+                        y = values[offset] + dy
+                    else:
+                        x, y = values[offset] + dx, values[offset + 1] + dy
+                    commands.append("L")
+                    coords += (x, y)
+                    cubic_control = quadratic_control = None
+                elif kind in ("C", "S"):
+                    if kind == "C":
+                        first = (values[offset] + dx, values[offset + 1] + dy)
+                        offset += 2
+                    elif cubic_control is not None:
+                        first = (x + x - cubic_control[0], y + y - cubic_control[1])
+                    else:
+                        first = (x, y)
+                    cubic_control = (values[offset] + dx, values[offset + 1] + dy)
+                    x, y = values[offset + 2] + dx, values[offset + 3] + dy
+                    commands.append("C")
+                    coords += (*first, *cubic_control, x, y)
+                    quadratic_control = None
+                elif kind in ("Q", "T"):
+                    if kind == "Q":
+                        quadratic_control = (
+                            values[offset] + dx,
+                            values[offset + 1] + dy,
+                        )
+                        offset += 2
+                    elif quadratic_control is not None:
+                        quadratic_control = (
+                            x + x - quadratic_control[0],
+                            y + y - quadratic_control[1],
+                        )
+                    else:
+                        quadratic_control = (x, y)
+                    x, y = values[offset] + dx, values[offset + 1] + dy
+                    commands.append("Q")
+                    coords += (*quadratic_control, x, y)
+                    cubic_control = None
+                else:
+                    rx, ry, rotation, large_arc, sweep = values[offset : offset + 5]
+                    x, y = values[offset + 5] + dx, values[offset + 6] + dy
+                    commands.append("A")
+                    coords += (abs(rx), abs(ry), rotation, large_arc, sweep, x, y)
+                    cubic_control = quadratic_control = None
+        if invalid is not None:
+            break
+    return {
+        "commands": "".join(commands).encode("ascii"),
+        "coords": np.array(coords, dtype=np.float64),
+    }
+
+
+def to_svg_path(path_data):
+    """Return the ``svg.path`` Path of parsed path data."""
+    path = Path()
+    coords = path_data["coords"].tolist()
+    cursor = 0
+    current = start = 0j
+    for code in path_data["commands"].decode("ascii"):
+        if code == "Z":
+            path.append(Close(current, start))
+            current = start
+            continue
+        if code == "M":
+            current = start = complex(coords[cursor], coords[cursor + 1])
+            path.append(Move(current))
+            cursor += 2
+            continue
+        if code == "L":
+            end = complex(coords[cursor], coords[cursor + 1])
+            path.append(Line(current, end))
+            cursor += 2
+        elif code == "C":
+            first, second, end = (
+                complex(coords[index], coords[index + 1])
+                for index in range(cursor, cursor + 6, 2)
+            )
+            path.append(CubicBezier(current, first, second, end))
+            cursor += 6
+        elif code == "Q":
+            control, end = (
+                complex(coords[index], coords[index + 1])
+                for index in range(cursor, cursor + 4, 2)
+            )
+            path.append(QuadraticBezier(current, control, end))
+            cursor += 4
+        else:
+            rx, ry, rotation, large_arc, sweep, end_x, end_y = coords[
+                cursor : cursor + 7
+            ]
+            end = complex(end_x, end_y)
+            path.append(
+                Arc(
+                    current,
+                    complex(rx, ry),
+                    rotation,
+                    bool(large_arc),
+                    bool(sweep),
+                    end,
+                )
+            )
+            cursor += 7
+        current = end
+    return path
+
+
+def _format_coords(coords, decimals):
+    if decimals is None:
+        return [format(value, ".15g") for value in coords.tolist()]
+    text = np.char.mod(f"%.{decimals}f", np.round(coords, decimals))
+    if decimals:
+        text = np.char.rstrip(np.char.rstrip(text, "0"), ".")
+    return np.where(text == "-0", "0", text).tolist()
+
+
+def path_data_string(path_data, decimals=None):
+    """
+    Format parsed path data as SVG path data with absolute commands.
+
+    By default coordinates keep 15 significant digits; with ``decimals`` they
+    are rounded to that many decimal places.
+    """
+    values = iter(_format_coords(path_data["coords"], decimals))
+    parts = []
+    for code in path_data["commands"].decode("ascii"):
+        if code == "Z":
+            parts.append("Z")
+            continue
+        if code == "A":
+            parts.append("A " + " ".join(itertools.islice(values, 7)))
+            continue
+        args = list(itertools.islice(values, _ARGUMENT_COUNTS[code]))
+        parts.append(
+            " ".join([code] + [f"{x},{y}" for x, y in zip(args[0::2], args[1::2])])
+        )
+    return " ".join(parts)
+
+
+def _douglas_peucker_mask(points, tolerance):
+    """
+    Return which points of a polyline Ramer–Douglas–Peucker keeps: every
+    dropped point lies within ``tolerance`` of the kept polyline.
+
+    All spans of one subdivision level are measured together, so the Python
+    loop runs once per level instead of once per span.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    firsts = np.array([0])
+    lasts = np.array([len(points) - 1])
+    while True:
+        wide = lasts - firsts > 1
+        firsts, lasts = firsts[wide], lasts[wide]
+        if not len(firsts):
+            return keep
+        sizes = lasts - firsts - 1
+        span_starts = np.cumsum(sizes) - sizes
+        span = np.repeat(np.arange(len(firsts)), sizes)
+        interior = np.arange(len(span)) - span_starts[span] + firsts[span] + 1
+        start = points[firsts][span]
+        chord = (points[lasts] - points[firsts])[span]
+        offsets = points[interior] - start
+        length_sq = np.einsum("ij,ij->i", chord, chord)
+        t = np.divide(
+            np.einsum("ij,ij->i", offsets, chord),
+            length_sq,
+            out=np.zeros(len(span)),
+            where=length_sq > 0.0,
+        )
+        offsets -= np.clip(t, 0.0, 1.0)[:, None] * chord
+        distances = np.einsum("ij,ij->i", offsets, offsets)
+        maxima = np.maximum.reduceat(distances, span_starts)
+        # The first point at each span's maximum distance splits the span.
+        hits = np.flatnonzero(distances == maxima[span])
+        _spans, first_hits = np.unique(span[hits], return_index=True)
+        splits = interior[hits[first_hits]]
+        split = maxima > tolerance * tolerance
+        splits = splits[split]
+        keep[splits] = True
+        firsts = np.concatenate((firsts[split], splits))
+        lasts = np.concatenate((splits, lasts[split]))
+
+
+def simplify_path_data(path_data, tolerance):
+    """
+    Simplify the runs of line commands in parsed path data.
+
+    Each run of ``L`` commands, with the point it starts from, is reduced
+    with Ramer–Douglas–Peucker so that no dropped vertex lies further than
+    ``tolerance`` from the result.  Curves, arcs and the end points of every
+    run are kept.  Returns the new path data and the number of dropped
+    vertices.
+    """
+    commands = path_data["commands"]
+    coords = path_data["coords"]
+    counts = np.array(
+        [_ARGUMENT_COUNTS.get(chr(code), 0) for code in commands], dtype=np.int64
+    )
+    offsets = np.cumsum(counts) - counts
+    keep = np.ones(len(commands), dtype=bool)
+    for run in re.finditer(rb"L{2,}", commands):
+        first, last = run.span()
+        points = coords[offsets[first] : offsets[first] + 2 * (last - first)]
+        # A run starts from the end point of the command before it, or from
+        # the subpath start after Z.  Without a current point, the first
+        # line end point starts the run and is kept.
+        start = first - 1
+        if commands[start : first] == b"Z":
+            start = commands.rfind(b"M", 0, start)
+        if start < 0:
+            keep[first:last] = _douglas_peucker_mask(points.reshape(-1, 2), tolerance)
+            continue
+        end = offsets[start] + counts[start]
+        points = np.concatenate((coords[end - 2 : end], points)).reshape(-1, 2)
+        keep[first:last] = _douglas_peucker_mask(points, tolerance)[1:]
+    removed = int(len(keep) - np.count_nonzero(keep))
+    if not removed:
+        return path_data, 0
+    command_array = np.frombuffer(commands, dtype=np.uint8)[keep]
+    return {
+        "commands": command_array.tobytes(),
+        "coords": coords[np.repeat(keep, counts)],
+    }, removed
@@ -0,0 +1,98 @@
+import tempfile
+from pathlib import Path
+
+import bpy
+from bpy.props import BoolProperty, IntProperty, StringProperty
+
+from .cache import DEFAULT_CACHE_MAX_MB
+from .svg_preprocessing import PARALLEL_STROKE_MIN_OUTLINES
+
+
+def _default_cache_directory():
+    try:
+        return Path(
+            bpy.utils.extension_path_user(__package__, path="cache", create=True)
+        )
+    except ValueError:
+        # Running from a plain script path rather than an installed extension.
+        return Path(tempfile.gettempdir()) / "enhanced_svg_cache"
+
+
+def cache_settings(context):
+    """Return ``(directory, max_bytes)`` for the import cache, or None if off."""
+    addon = context.preferences.addons.get(__package__)
+    if addon is None or not addon.preferences.use_cache:
+        return None
+    preferences = addon.preferences
+    directory = (
+        Path(bpy.path.abspath(preferences.cache_directory))
+        if preferences.cache_directory
+        else _default_cache_directory()
+    )
+    return directory, preferences.cache_max_mb << 20
+
+
+def parallel_stroke_threshold(context):
+    """Return the outline count that enables parallel strokes, or None."""
+    addon = context.preferences.addons.get(__package__)
+    if addon is None or not addon.preferences.parallel_strokes:
+        return None
+    preferences = addon.preferences
+    return preferences.parallel_stroke_min_outlines
+
+
+class EnhancedSVGPreferences(bpy.types.AddonPreferences):
+    bl_idname = __package__
+
+    use_cache: BoolProperty(
+        name="Cache Processed Imports",
+        description=(
+            "Store preprocessing results on disk so importing an unchanged "
+            "SVG again with the same options skips preprocessing"
+        ),
+        default=False,
+    )
+    cache_directory: StringProperty(
+        name="Cache Directory",
+        description=(
+            "Folder for cached imports; leave empty to use the extension's "
+            "user directory"
+        ),
+        subtype="DIR_PATH",
+    )
+    cache_max_mb: IntProperty(
+        name="Cache Size Limit (MB)",
+        description="Least recently used imports are evicted above this size",
+        default=DEFAULT_CACHE_MAX_MB,
+        min=1,
+    )
+    parallel_strokes: BoolProperty(
+        name="Parallel Stroke Conversion",
+        description=(
+            "Convert the strokes of large documents to outlines on all CPU "
+            "cores, in separate Python processes that only load the add-on's "
+            "stroke code"
+        ),
+        default=False,
+    )
+    parallel_stroke_min_outlines: IntProperty(
+        name="Minimum Distinct Strokes",
+        description=(
+            "Documents with fewer distinct stroked paths are converted on "
+            "one core, avoiding the worker startup cost"
+        ),
+        default=PARALLEL_STROKE_MIN_OUTLINES,
+        min=1,
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "use_cache")
+        column = layout.column()
+        column.active = self.use_cache
+        column.prop(self, "cache_directory")
+        column.prop(self, "cache_max_mb")
+        layout.prop(self, "parallel_strokes")
+        column = layout.column()
+        column.active = self.parallel_strokes
+        column.prop(self, "parallel_stroke_min_outlines")
@@ -0,0 +1,346 @@
+"""Remove flattened SVG content that can never show up in the import.
+
+These passes run on the flattened tree, before strokes are converted, so
+pruned elements cost neither outline work nor Blender objects.  They measure
+elements with the same viewport conventions and computed style logic that
+image placement uses (see image_import), so both agree on what is shown.
+"""
+
+import math
+from collections import Counter
+
+from lxml import etree
+
+from .affine import mat_apply, mat_mul, parse_transform
+from .image_import import (
+    _DOCUMENT_STATE,
+    _SKIP_TAGS,
+    _element_state,
+    _parse_image_length,
+    _property,
+    _style_map,
+    _svg_viewport_matrix,
+    parse_coord,
+)
+from .path_data import parse_path_data
+from .svg_preprocessing import SVG_NS, _FLOAT_RE
+
+_CONTAINER_TAGS = {"svg", "g", "a"}
+
+
+def _instance_markers(instances):
+    """Return the start, end and all marker ids of instanced <use> groups."""
+    starts = {group["start"] for group in instances}
+    ends = {group["end"] for group in instances}
+    markers = starts | ends
+    for group in instances:
+        markers.update(group["instances"])
+    return starts, ends, markers
+
+
+def _rendered_children(container, markers, starts=(), ends=()):
+    """
+    Yield the rendered SVG children of ``container`` with their tag names.
+    Marker lines, and everything between a start and an end marker, are
+    skipped.
+    """
+    prototype = False
+    for el in container:
+        element_id = el.get("id")
+        if element_id in starts:
+            prototype = True
+        if prototype or element_id in markers or not isinstance(el.tag, str):
+            if element_id in ends:
+                prototype = False
+            continue
+        qname = etree.QName(el.tag)
+        if qname.namespace in (None, SVG_NS) and qname.localname not in _SKIP_TAGS:
+            yield el, qname.localname
+
+
+def _remove_elements(root, removed):
+    """Remove ``removed`` elements, and the groups they leave empty."""
+    for el in removed:
+        parent = el.getparent()
+        parent.remove(el)
+        while parent is not root and len(parent) == 0 and not parent.get("id"):
+            grandparent = parent.getparent()
+            grandparent.remove(parent)
+            parent = grandparent
+
+
+def _path_bounds(d_attr):
+    """Return the control point bounds of path data, arcs included."""
+    path_data = parse_path_data(d_attr)
+    coords = path_data["coords"].tolist()
+    xs = []
+    ys = []
+    cursor = 0
+    x = y = start_x = start_y = 0.0
+    for code in path_data["commands"].decode("ascii"):
+        if code == "Z":
+            x, y = start_x, start_y
+            continue
+        if code == "A":
+            rx, ry, rotation, _large, _sweep, end_x, end_y = coords[
+                cursor : cursor + 7
+            ]
+            cursor += 7
+            if rx and ry:
+                # Radii too small to reach the end point are scaled up; every
+                # point of the ellipse is then within its diameter of the start.
+                angle = math.radians(rotation)
+                half_x, half_y = (x - end_x) / 2.0, (y - end_y) / 2.0
+                prime_x = math.cos(angle) * half_x + math.sin(angle) * half_y
+                prime_y = -math.sin(angle) * half_x + math.cos(angle) * half_y
+                scale = math.sqrt(
+                    max(1.0, (prime_x / rx) ** 2 + (prime_y / ry) ** 2)
+                )
+                reach = 2.0 * max(rx, ry) * scale
+                xs += (x - reach, x + reach)
+                ys += (y - reach, y + reach)
+            xs.append(end_x)
+            ys.append(end_y)
+            x, y = end_x, end_y
+            continue
+        count = {"M": 2, "L": 2, "C": 6, "Q": 4}[code]
+        xs += coords[cursor : cursor + count : 2]
+        ys += coords[cursor + 1 : cursor + count : 2]
+        cursor += count
+        x, y = xs[-1], ys[-1]
+        if code == "M":
+            start_x, start_y = x, y
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _element_bounds(el, tag, viewport):
+    """
+    Return the local ``(min_x, min_y, max_x, max_y)`` of a shape or image, or
+    None when its extent is unknown.
+    """
+    width, height = viewport
+
+    def coord(name, size=0.0):
+        return parse_coord(el.get(name, "0"), size)
+
+    if tag == "path":
+        try:
+            return _path_bounds(el.get("d", ""))
+        except ValueError:
+            return None
+    if tag == "rect":
+        x, y = coord("x", width), coord("y", height)
+        return x, y, x + coord("width", width), y + coord("height", height)
+    if tag in ("circle", "ellipse"):
+        if tag == "circle":
+            rx = ry = coord("r", math.hypot(width, height) / math.sqrt(2.0))
+        else:
+            rx, ry = coord("rx", width), coord("ry", height)
+        cx, cy = coord("cx", width), coord("cy", height)
+        return cx - rx, cy - ry, cx + rx, cy + ry
+    if tag == "line":
+        xs = (coord("x1", width), coord("x2", width))
+        ys = (coord("y1", height), coord("y2", height))
+        return min(xs), min(ys), max(xs), max(ys)
+    if tag in ("polyline", "polygon"):
+        values = [float(value) for value in _FLOAT_RE.findall(el.get("points", ""))]
+        if len(values) < 2:
+            return None
+        xs, ys = values[0::2], values[1::2]
+        return min(xs), min(ys), max(xs), max(ys)
+    if tag == "image":
+        styles = _style_map(el)
+        image_width = _parse_image_length(_property(el, styles, "width"), width)
+        image_height = _parse_image_length(_property(el, styles, "height"), height)
+        if image_width is None or image_height is None:
+            return None
+        x = parse_coord(_property(el, styles, "x") or "0", width)
+        y = parse_coord(_property(el, styles, "y") or "0", height)
+        return x, y, x + image_width, y + image_height
+    return None
+
+
+_DOCUMENT_STROKE = {
+    "stroke": "none",
+    "stroke-width": "1",
+    "stroke-miterlimit": "4",
+}
+
+
+def _stroke_style(el, parent_style):
+    """
+    Return the stroke properties of ``el`` that matter for its extent,
+    inherited from ``parent_style``.  Inline ``style`` declarations win over
+    attributes; values that do not parse are ignored, as in CSS.
+    """
+    styles = _style_map(el)
+    style = dict(parent_style)
+    for name, initial in _DOCUMENT_STROKE.items():
+        value = _property(el, styles, name)
+        if value is None:
+            continue
+        value = value.strip()
+        keyword = value.lower()
+        if keyword in {"inherit", "unset"}:
+            continue
+        if keyword in {"initial", "revert", "revert-layer"}:
+            style[name] = initial
+        elif name == "stroke" or _FLOAT_RE.match(value):
+            style[name] = value
+    return style
+
+
+def _stroke_reach(style, viewport):
+    """
+    Return how far a converted stroke with the computed ``style`` can
+    extend beyond the geometry.  Percentage widths resolve against the
+    normalized diagonal of ``viewport``.
+    """
+    if style["stroke"].lower() == "none":
+        return 0.0
+    width = parse_coord(style["stroke-width"], math.hypot(*viewport) / math.sqrt(2))
+    miter_limit = float(_FLOAT_RE.match(style["stroke-miterlimit"]).group(0))
+    return abs(width) / 2.0 * max(miter_limit, 1.0)
+
+
+def _transformed_bounds(matrix, bounds):
+    min_x, min_y, max_x, max_y = bounds
+    corners = ((min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y))
+    points = [mat_apply(matrix, corner) for corner in corners]
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _root_visible_bounds(root):
+    """
+    Return the bounds of the root viewport in the space of Blender's
+    importer, or None when the document has no definite size.
+    """
+    matrix, rect = _svg_viewport_matrix(root, (0.0, 0.0), nested=False)
+    viewbox = root.get("viewBox")
+    width = parse_coord(root.get("width") or "0")
+    height = parse_coord(root.get("height") or "0")
+    if viewbox:
+        values = [float(value) for value in _FLOAT_RE.findall(viewbox)]
+        if len(values) != 4 or values[2] <= 0 or values[3] <= 0:
+            return None
+        vx, vy, vw, vh = values
+        if width > 0 and height > 0:
+            # Blender centers the viewBox in the viewport; the letterbox
+            # margins around it are visible too.
+            scale = min(width / vw, height / vh)
+            margin_x = (width / scale - vw) / 2.0
+            margin_y = (height / scale - vh) / 2.0
+            bounds = (
+                vx - margin_x,
+                vy - margin_y,
+                vx + vw + margin_x,
+                vy + vh + margin_y,
+            )
+        else:
+            bounds = (vx, vy, vx + vw, vy + vh)
+    elif rect[0] > 0 and rect[1] > 0:
+        bounds = (0.0, 0.0, rect[0], rect[1])
+    else:
+        return None
+    return _transformed_bounds(matrix, bounds)
+
+
+def cull_outside_viewport(root, instances=()):
+    """
+    Remove shapes and images of a flattened SVG element tree that lie
+    entirely outside the root viewport.  The tree is modified in place.
+
+    Bounds are conservative: Bézier control points, whole arc ellipses and
+    the miter reach of strokes, with their inherited or inline-styled widths
+    in any unit, are included, and elements with an unknown extent (text,
+    images with an intrinsic size) are kept.  Groups left empty are removed
+    too.  The prototype and marker lines of every instanced <use> group in
+    ``instances`` (see flatten_svg_tree) are kept whole, since their objects
+    are linked into other placements.  Returns a Counter of the removed
+    shapes by tag name.
+    """
+    culled = Counter()
+    visible = _root_visible_bounds(root)
+    if visible is None:
+        return culled
+    starts, ends, markers = _instance_markers(instances)
+
+    root_matrix, root_rect = _svg_viewport_matrix(root, (0.0, 0.0), nested=False)
+    removed = []
+    stack = [(root, root_matrix, root_rect, _stroke_style(root, _DOCUMENT_STROKE))]
+    while stack:
+        container, ctm, viewport, stroke_style = stack.pop()
+        for el, tag in _rendered_children(container, markers, starts, ends):
+            transform = el.get("transform")
+            matrix = mat_mul(ctm, parse_transform(transform)) if transform else ctm
+            el_stroke_style = _stroke_style(el, stroke_style)
+            if tag in _CONTAINER_TAGS:
+                child_viewport = viewport
+                if tag == "svg":
+                    viewport_matrix, child_viewport = _svg_viewport_matrix(
+                        el, viewport, nested=True
+                    )
+                    matrix = mat_mul(matrix, viewport_matrix)
+                stack.append((el, matrix, child_viewport, el_stroke_style))
+                continue
+            bounds = _element_bounds(el, tag, viewport)
+            if bounds is None:
+                continue
+            reach = _stroke_reach(el_stroke_style, viewport)
+            min_x, min_y, max_x, max_y = _transformed_bounds(
+                matrix,
+                (
+                    bounds[0] - reach,
+                    bounds[1] - reach,
+                    bounds[2] + reach,
+                    bounds[3] + reach,
+                ),
+            )
+            if (
+                max_x < visible[0]
+                or min_x > visible[2]
+                or max_y < visible[1]
+                or min_y > visible[3]
+            ):
+                removed.append(el)
+                culled[tag] += 1
+
+    _remove_elements(root, removed)
+    return culled
+
+
+def prune_invisible(root, instances=()):
+    """
+    Remove the elements of a flattened SVG element tree that never render:
+    elements with ``display: none`` or a cascaded opacity of zero, with all
+    their content, and shapes with ``visibility: hidden``.  The tree is
+    modified in place.
+
+    Styles are resolved from attributes and inline ``style`` declarations,
+    exactly as for image placements.  Marker lines of instanced <use>
+    groups (see flatten_svg_tree) are kept; a prototype and its placements
+    share their presentation context, so they are hidden alike.  Returns a
+    Counter of the removed elements by tag name.
+    """
+    pruned = Counter()
+    _starts, _ends, markers = _instance_markers(instances)
+    removed = []
+    stack = [(root, _element_state(root, _DOCUMENT_STATE))]
+    while stack:
+        container, state = stack.pop()
+        for el, tag in _rendered_children(container, markers):
+            child_state = _element_state(el, state) if state is not None else None
+            if child_state is not None and child_state["opacity"] > 0:
+                if tag in _CONTAINER_TAGS:
+                    stack.append((el, child_state))
+                    continue
+                if child_state["visibility"] not in {"hidden", "collapse"}:
+                    continue
+            removed.append(el)
+            pruned[tag] += 1
+    _remove_elements(root, removed)
+    return pruned
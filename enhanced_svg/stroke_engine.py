@@ -0,0 +1,777 @@
+"""Vectorized path evaluation for converting SVG strokes into outlines.
+
+``svg.path`` evaluates one point per call, so sampling a stroke one
+``point(t)`` at a time dominates the import of stroke-heavy drawings.  Here
+each path, parsed into flat arrays by path_data, is packed once into
+per-segment coefficient arrays.  Positions and analytic tangents for every
+sample are then evaluated with a handful of NumPy operations, and the outline
+polygons are assembled from whole arrays instead of per-point Python loops.
+
+Lines and quadratic Béziers are stored exactly as cubic Béziers.  Elliptical
+arcs keep their center parameterization so they are evaluated exactly too.
+
+Each segment gets its own sample count from a geometric tolerance: straight
+segments only need their endpoints, Béziers are bounded with Wang's formula
+and arcs with their chord sagitta.  Both bounds also account for the offset
+of the outline from the centerline, which grows with the turning angle.
+
+The process pool of svg_preprocessing imports this module on its own, by
+its top-level name, so it must not import bpy or other modules of this
+package.
+"""
+
+import math
+
+import numpy as np
+from svg.path import Arc
+
+
+def _arc_parameters(segment):
+    """Return ``(cx, cy, rx, ry, rotation, theta, delta)`` in radians."""
+    radius = segment.radius * segment.radius_scale
+    return (
+        segment.center.real,
+        segment.center.imag,
+        radius.real,
+        radius.imag,
+        np.radians(segment.rotation),
+        np.radians(segment.theta),
+        np.radians(segment.delta),
+    )
+
+
+def pack_path(path_data):
+    """
+    Pack the drawing segments of parsed path data (see path_data) into
+    coefficient arrays.
+
+    Returns a dict with:
+      * ``bezier``: ``(n, 4, 2)`` cubic control points (unused rows for arcs),
+      * ``arc``: ``(n, 7)`` arc parameters (unused rows for Béziers),
+      * ``is_arc``: ``(n,)`` boolean segment kind,
+      * ``is_line``: ``(n,)`` True for straight segments,
+      * ``subpath``: ``(n,)`` subpath number of every segment,
+      * ``closed``: numbers of the subpaths that end with a closepath.
+
+    A Move, or drawing on after a closepath, starts a new subpath.  Move
+    commands, and arcs that start and end at the same point, have no extent
+    and are left out.  Only arcs are built as ``svg.path`` objects, for
+    their center parameterization.
+    """
+    bezier = []
+    arc = []
+    is_arc = []
+    is_line = []
+    subpath = []
+    closed = []
+    current_subpath = 0
+    subpath_started = False
+    coords = path_data["coords"].tolist()
+    cursor = 0
+    x = y = start_x = start_y = 0.0
+    for code in path_data["commands"].decode("ascii"):
+        if code == "M":
+            if subpath_started:
+                current_subpath += 1
+                subpath_started = False
+            x, y = start_x, start_y = coords[cursor : cursor + 2]
+            cursor += 2
+            continue
+        straight = False
+        if code == "Z":
+            end_x, end_y = start_x, start_y
+            straight = True
+        elif code == "L":
+            end_x, end_y = coords[cursor : cursor + 2]
+            cursor += 2
+            straight = True
+        elif code == "Q":
+            control_x, control_y, end_x, end_y = coords[cursor : cursor + 4]
+            cursor += 4
+            controls = (
+                (x, y),
+                (x + (control_x - x) * 2.0 / 3.0, y + (control_y - y) * 2.0 / 3.0),
+                (
+                    end_x + (control_x - end_x) * 2.0 / 3.0,
+                    end_y + (control_y - end_y) * 2.0 / 3.0,
+                ),
+                (end_x, end_y),
+            )
+        elif code == "C":
+            first_x, first_y, second_x, second_y, end_x, end_y = coords[
+                cursor : cursor + 6
+            ]
+            cursor += 6
+            controls = (
+                (x, y),
+                (first_x, first_y),
+                (second_x, second_y),
+                (end_x, end_y),
+            )
+        else:
+            rx, ry, rotation, large_arc, sweep, end_x, end_y = coords[
+                cursor : cursor + 7
+            ]
+            cursor += 7
+            if (x, y) == (end_x, end_y):
+                continue
+            if rx == 0 or ry == 0:
+                # svg.path treats zero-radius arcs as straight lines.
+                straight = True
+            else:
+                segment = Arc(
+                    complex(x, y),
+                    complex(rx, ry),
+                    rotation,
+                    bool(large_arc),
+                    bool(sweep),
+                    complex(end_x, end_y),
+                )
+                bezier.append(((0.0, 0.0),) * 4)
+                arc.append(_arc_parameters(segment))
+                is_arc.append(True)
+                is_line.append(False)
+                subpath.append(current_subpath)
+                subpath_started = True
+                x, y = end_x, end_y
+                continue
+        if straight:
+            third_x, third_y = (end_x - x) / 3.0, (end_y - y) / 3.0
+            controls = (
+                (x, y),
+                (x + third_x, y + third_y),
+                (end_x - third_x, end_y - third_y),
+                (end_x, end_y),
+            )
+        bezier.append(controls)
+        arc.append((0.0,) * 7)
+        is_arc.append(False)
+        is_line.append(straight)
+        subpath.append(current_subpath)
+        subpath_started = True
+        x, y = end_x, end_y
+        if code == "Z":
+            closed.append(current_subpath)
+            current_subpath += 1
+            subpath_started = False
+
+    return {
+        "bezier": np.array(bezier, dtype=np.float64).reshape(-1, 4, 2),
+        "arc": np.array(arc, dtype=np.float64).reshape(-1, 7),
+        "is_arc": np.array(is_arc, dtype=bool),
+        "is_line": np.array(is_line, dtype=bool),
+        "subpath": np.array(subpath, dtype=np.int64),
+        "closed": np.array(closed, dtype=np.int64),
+    }
+
+
+def _evaluate_segments(packed, segment_index, local_t):
+    """Evaluate positions and derivatives at per-sample segment parameters."""
+    points = np.empty((len(local_t), 2))
+    tangents = np.empty((len(local_t), 2))
+    arc_mask = packed["is_arc"][segment_index]
+
+    bezier_mask = ~arc_mask
+    if bezier_mask.any():
+        p0, p1, p2, p3 = np.moveaxis(packed["bezier"][segment_index[bezier_mask]], 1, 0)
+        t = local_t[bezier_mask, None]
+        mt = 1.0 - t
+        points[bezier_mask] = (
+            mt * mt * mt * p0
+            + 3.0 * mt * mt * t * p1
+            + 3.0 * mt * t * t * p2
+            + t * t * t * p3
+        )
+        tangents[bezier_mask] = 3.0 * (
+            mt * mt * (p1 - p0) + 2.0 * mt * t * (p2 - p1) + t * t * (p3 - p2)
+        )
+
+    if arc_mask.any():
+        cx, cy, rx, ry, rotation, theta, delta = packed["arc"][
+            segment_index[arc_mask]
+        ].T
+        angle = theta + delta * local_t[arc_mask]
+        cos_r, sin_r = np.cos(rotation), np.sin(rotation)
+        cos_a, sin_a = np.cos(angle), np.sin(angle)
+        points[arc_mask, 0] = cx + cos_r * cos_a * rx - sin_r * sin_a * ry
+        points[arc_mask, 1] = cy + sin_r * cos_a * rx + cos_r * sin_a * ry
+        tangents[arc_mask, 0] = delta * (-cos_r * sin_a * rx - sin_r * cos_a * ry)
+        tangents[arc_mask, 1] = delta * (-sin_r * sin_a * rx + cos_r * cos_a * ry)
+
+    return points, tangents
+
+
+def cubic_segments(packed):
+    """
+    Return every packed segment as cubic Béziers.
+
+    Returns ``(m, 4, 2)`` control points and the ``(m,)`` packed segment
+    index of each cubic.  Béziers and lines are returned as packed; arcs are
+    split into pieces of at most a quarter turn, whose handles have the
+    ``4/3 tan(angle / 4)`` length that keeps an ellipse within 0.03% of its
+    radius.
+    """
+    is_arc = packed["is_arc"]
+    delta = packed["arc"][:, 6]
+    pieces = np.ones(len(is_arc), dtype=np.int64)
+    pieces[is_arc] = np.maximum(
+        np.ceil(np.abs(delta[is_arc]) / (np.pi / 2.0) - 1e-9), 1
+    )
+    segment_index, local_t = _sample_parameters(pieces)
+    # Drop the last parameter of every segment; each piece starts at one.
+    starts = local_t < 1.0
+    segment_index = segment_index[starts]
+    start = local_t[starts]
+    end = start + 1.0 / pieces[segment_index]
+
+    cubics = packed["bezier"][segment_index]
+    arc_mask = is_arc[segment_index]
+    if arc_mask.any():
+        index = segment_index[arc_mask]
+        first, first_derivative = _evaluate_segments(packed, index, start[arc_mask])
+        last, last_derivative = _evaluate_segments(packed, index, end[arc_mask])
+        # Derivatives are taken along the whole arc, whose angle is delta.
+        angle = delta[index] / pieces[index]
+        scale = (4.0 / 3.0 * np.tan(angle / 4.0) / delta[index])[:, None]
+        cubics[arc_mask] = np.stack(
+            (
+                first,
+                first + first_derivative * scale,
+                last - last_derivative * scale,
+                last,
+            ),
+            axis=1,
+        )
+    return cubics, segment_index
+
+
+def _turning_angle(first, second):
+    """Unsigned angle between row vectors; zero when either has no length."""
+    cross = first[:, 0] * second[:, 1] - first[:, 1] * second[:, 0]
+    dot = (first * second).sum(axis=1)
+    return np.abs(np.arctan2(cross, dot))
+
+
+def segment_sample_counts(packed, offset, tolerance):
+    """
+    Return the number of sample intervals needed for every packed segment.
+
+    The count keeps both the centerline chords and the chords of outlines
+    ``offset`` away from it within ``tolerance`` of the exact curve.  Half of
+    the tolerance goes to each source of error.
+    """
+    if not tolerance > 0:
+        raise ValueError("Stroke tolerance must be positive")
+    half = tolerance / 2.0
+    offset = abs(offset)
+    counts = np.ones(len(packed["is_arc"]))
+
+    curve_mask = ~packed["is_arc"] & ~packed["is_line"]
+    if curve_mask.any():
+        p0, p1, p2, p3 = np.moveaxis(packed["bezier"][curve_mask], 1, 0)
+        # Wang's formula for a cubic: n >= sqrt(3 * 2 / 8 * M / tolerance),
+        # with M the largest second difference of the control points.
+        second = np.maximum(
+            np.hypot(*(p0 - 2.0 * p1 + p2).T), np.hypot(*(p1 - 2.0 * p2 + p3).T)
+        )
+        curve_counts = np.sqrt(0.75 * second / half)
+        # The control polygon turns at least as far as the curve does, and an
+        # offset chord spanning a turn of phi sags by offset * phi**2 / 8.
+        legs = (p1 - p0, p2 - p1, p3 - p2)
+        turning = _turning_angle(legs[0], legs[1]) + _turning_angle(legs[1], legs[2])
+        middle_missing = ~np.any(legs[1], axis=1)
+        turning[middle_missing] = _turning_angle(legs[0], legs[2])[middle_missing]
+        if offset > 0:
+            curve_counts = np.maximum(
+                curve_counts, turning * math.sqrt(offset / (8.0 * half))
+            )
+        counts[curve_mask] = curve_counts
+
+    arc_mask = packed["is_arc"]
+    if arc_mask.any():
+        _cx, _cy, rx, ry, _rotation, _theta, delta = packed["arc"][arc_mask].T
+        rx = np.abs(rx)
+        ry = np.abs(ry)
+        major = np.maximum(rx, ry)
+        # An angle step h sags by at most major * h**2 / 8 on the ellipse,
+        # and the tangent turns at most major / minor times as fast as h.
+        arc_counts = np.abs(delta) * np.sqrt(major / (8.0 * half))
+        if offset > 0:
+            ratio = major / np.minimum(rx, ry)
+            arc_counts = np.maximum(
+                arc_counts,
+                np.abs(delta) * ratio * math.sqrt(offset / (8.0 * half)),
+            )
+        counts[arc_mask] = arc_counts
+
+    return np.maximum(np.ceil(counts), 1).astype(np.int64)
+
+
+def _sample_parameters(counts):
+    """Return segment indices and local parameters for per-segment counts."""
+    sizes = counts + 1
+    segment_index = np.repeat(np.arange(len(counts)), sizes)
+    first = np.repeat(np.cumsum(sizes) - sizes, sizes)
+    local_t = (np.arange(len(segment_index)) - first) / np.repeat(counts, sizes)
+    return segment_index, local_t
+
+
+def outline_polygons(packed, stroke_width, counts):
+    """
+    Return the closed outline polygon of every stroked subpath.
+
+    ``counts`` are the per-segment sample intervals from
+    ``segment_sample_counts``.  Each polygon is an ``(m, 2)`` array that
+    follows the left offset forward and the right offset backward.  Samples
+    without a tangent (cusps, zero-length segments) and samples repeated at
+    smooth segment joins are dropped.
+    """
+    segment_index, local_t = _sample_parameters(counts)
+    points, tangents = _evaluate_segments(packed, segment_index, local_t)
+    lengths = np.hypot(tangents[:, 0], tangents[:, 1])
+    keep = lengths > 0
+    points = points[keep]
+    normals = np.column_stack((-tangents[keep, 1], tangents[keep, 0]))
+    normals /= lengths[keep, None]
+    subpath = packed["subpath"][segment_index[keep]]
+
+    repeated = np.zeros(len(points), dtype=bool)
+    repeated[1:] = (
+        (subpath[1:] == subpath[:-1])
+        & np.all(points[1:] == points[:-1], axis=1)
+        & np.all(np.abs(normals[1:] - normals[:-1]) <= 1e-9, axis=1)
+    )
+    points = points[~repeated]
+    normals = normals[~repeated] * (stroke_width / 2.0)
+    subpath = subpath[~repeated]
+
+    boundaries = np.flatnonzero(np.diff(subpath)) + 1
+    return [
+        np.concatenate((sub_points + sub_normals, (sub_points - sub_normals)[::-1]))
+        for sub_points, sub_normals in zip(
+            np.split(points, boundaries), np.split(normals, boundaries)
+        )
+        if len(sub_points)
+    ]
+
+
+def _fixed_point(values, decimals):
+    """Format integer multiples of ``10 ** -decimals`` without trailing zeros."""
+    text = np.char.mod(f"%.{decimals}f", values / 10.0**decimals)
+    if decimals:
+        text = np.char.rstrip(np.char.rstrip(text, "0"), ".")
+    return np.where(text == "-0", "0", text)
+
+
+def polygon_path_data(polygon, decimals=None):
+    """
+    Format a closed polygon array as SVG path data.
+
+    By default every vertex is written as an absolute ``L`` command with the
+    full float repr.  With ``decimals``, vertices are rounded to that many
+    decimal places and written as one relative ``l`` command.  The offsets
+    are differences of the rounded vertices, so rounding errors do not
+    accumulate along the polygon.
+    """
+    if decimals is None:
+        coordinates = polygon.astype(str)
+        vertices = np.char.add(
+            np.char.add(coordinates[:, 0], " "), coordinates[:, 1]
+        )
+        vertices = vertices.tolist()
+        return f"M {vertices[0]} L " + " L ".join(vertices[1:]) + " Z"
+
+    rounded = np.round(polygon * 10.0**decimals).astype(np.int64)
+    offsets = np.concatenate((rounded[:1], np.diff(rounded, axis=0)))
+    coordinates = _fixed_point(offsets, decimals).ravel().tolist()
+    if len(coordinates) == 2:
+        return f"M{coordinates[0]} {coordinates[1]}z"
+    return (
+        f"M{coordinates[0]} {coordinates[1]}l" + " ".join(coordinates[2:]) + "z"
+    )
+
+
+def outline_path_data(polygons, decimals=None):
+    """Format the closed polygons of a stroke outline as SVG path data."""
+    separator = "" if decimals is not None else " "
+    return separator.join(
+        polygon_path_data(polygon, decimals) for polygon in polygons
+    )
+
+
+# --- Offset Bézier outlines ---
+#
+# Instead of a dense polygon, each side of a stroke can be approximated by a
+# few cubic Béziers.  A piece of the exact offset curve O(t) = P(t) + d N(t)
+# is replaced by the Hermite cubic with the same end points and end
+# derivatives, O'(t) = P'(t) (1 - d k(t)) with k the signed curvature.  Pieces
+# whose cubic strays further than the tolerance from O(t) are halved.
+
+MAX_OFFSET_SUBDIVISIONS = 8
+_FIT_SAMPLES = np.array([1.0, 2.0, 3.0, 4.0, 5.0]) / 6.0
+_TANGENT_NUDGE = 1e-7
+
+
+def _second_derivatives(packed, segment_index, local_t):
+    """Evaluate second derivatives at per-sample segment parameters."""
+    second = np.empty((len(local_t), 2))
+    arc_mask = packed["is_arc"][segment_index]
+
+    bezier_mask = ~arc_mask
+    if bezier_mask.any():
+        p0, p1, p2, p3 = np.moveaxis(packed["bezier"][segment_index[bezier_mask]], 1, 0)
+        t = local_t[bezier_mask, None]
+        second[bezier_mask] = 6.0 * (
+            (1.0 - t) * (p2 - 2.0 * p1 + p0) + t * (p3 - 2.0 * p2 + p1)
+        )
+
+    if arc_mask.any():
+        points, _tangents = _evaluate_segments(
+            packed, segment_index[arc_mask], local_t[arc_mask]
+        )
+        arcs = packed["arc"][segment_index[arc_mask]]
+        delta = arcs[:, 6, None]
+        second[arc_mask] = -delta * delta * (points - arcs[:, :2])
+
+    return second
+
+
+def _tangents(packed, segment_index, local_t):
+    """
+    Return points and first derivatives, where a vanishing derivative is
+    replaced by the one just inside the segment (so it still has a direction).
+    """
+    points, tangents = _evaluate_segments(packed, segment_index, local_t)
+    flat = np.hypot(tangents[:, 0], tangents[:, 1]) < 1e-12
+    if flat.any():
+        nudged = local_t[flat] + np.where(
+            local_t[flat] < 0.5, _TANGENT_NUDGE, -_TANGENT_NUDGE
+        )
+        _points, tangents[flat] = _evaluate_segments(
+            packed, segment_index[flat], nudged
+        )
+    return points, tangents, flat
+
+
+def _offset_points(packed, segment_index, local_t, offset):
+    """Return points and derivatives of the centerline offset to its left."""
+    points, tangents, flat = _tangents(packed, segment_index, local_t)
+    lengths = np.hypot(tangents[:, 0], tangents[:, 1])
+    safe = np.where(lengths > 0, lengths, 1.0)
+    normals = np.column_stack((-tangents[:, 1], tangents[:, 0])) / safe[:, None]
+    second = _second_derivatives(packed, segment_index, local_t)
+    curvature = (
+        tangents[:, 0] * second[:, 1] - tangents[:, 1] * second[:, 0]
+    ) / safe**3
+    derivatives = tangents * (1.0 - offset * curvature)[:, None]
+    derivatives[flat] = 0.0
+    return points + offset * normals, derivatives
+
+
+def _hermite_pieces(packed, segment_index, start, end, offset):
+    """Return ``(n, 4, 2)`` cubic approximations of offset curve pieces."""
+    span = (end - start)[:, None]
+    first, first_derivative = _offset_points(packed, segment_index, start, offset)
+    last, last_derivative = _offset_points(packed, segment_index, end, offset)
+    return np.stack(
+        (
+            first,
+            first + first_derivative * span / 3.0,
+            last - last_derivative * span / 3.0,
+            last,
+        ),
+        axis=1,
+    )
+
+
+def _fit_errors(packed, segment_index, start, end, offset, cubics):
+    """Return the largest sampled distance between pieces and offset curves."""
+    samples = len(_FIT_SAMPLES)
+    local_t = (start[:, None] + (end - start)[:, None] * _FIT_SAMPLES).ravel()
+    exact, _derivatives = _offset_points(
+        packed, np.repeat(segment_index, samples), local_t, offset
+    )
+    u = _FIT_SAMPLES[None, :, None]
+    mu = 1.0 - u
+    p0, p1, p2, p3 = (cubics[:, index, None, :] for index in range(4))
+    fitted = (
+        mu * mu * mu * p0
+        + 3.0 * mu * mu * u * p1
+        + 3.0 * mu * u * u * p2
+        + u * u * u * p3
+    )
+    distance = np.hypot(*(fitted.reshape(-1, 2) - exact).T)
+    return distance.reshape(-1, samples).max(axis=1)
+
+
+def _fit_offset_curves(packed, segments, half_width, tolerance):
+    """
+    Fit both offsets of the given segments with cubic pieces.
+
+    Returns the segment of every piece and the ``(n, 4, 2)`` left and right
+    pieces, ordered by segment and then along it.
+    """
+    segment_index = np.asarray(segments, dtype=np.int64)
+    start = np.zeros(len(segment_index))
+    end = np.ones(len(segment_index))
+    accepted = []
+    for depth in range(MAX_OFFSET_SUBDIVISIONS + 1):
+        if not len(segment_index):
+            break
+        sides = []
+        fits = np.ones(len(segment_index), dtype=bool)
+        for offset in (half_width, -half_width):
+            cubics = _hermite_pieces(packed, segment_index, start, end, offset)
+            errors = _fit_errors(packed, segment_index, start, end, offset, cubics)
+            fits &= errors <= tolerance
+            sides.append(cubics)
+        if depth == MAX_OFFSET_SUBDIVISIONS:
+            fits[:] = True
+        accepted.append(
+            (segment_index[fits], start[fits], sides[0][fits], sides[1][fits])
+        )
+        middle = (start + end) / 2.0
+        split = ~fits
+        segment_index = np.repeat(segment_index[split], 2)
+        start, end = (
+            np.column_stack((start[split], middle[split])).ravel(),
+            np.column_stack((middle[split], end[split])).ravel(),
+        )
+
+    piece_segments, piece_starts, left, right = (
+        np.concatenate(parts) for parts in zip(*accepted)
+    )
+    order = np.lexsort((piece_starts, piece_segments))
+    return piece_segments[order], left[order], right[order]
+
+
+def _unit(vector):
+    length = math.hypot(vector[0], vector[1])
+    return vector / length if length > 0 else vector
+
+
+def _append_join(
+    commands, vertex, incoming, outgoing, half_width, linejoin, miterlimit
+):
+    """
+    Append the join on the left side of a turn at ``vertex``.
+
+    ``incoming`` and ``outgoing`` are unit tangents in the direction of
+    travel.  The current point is the end of the incoming offset; the join
+    ends at the start of the outgoing offset.
+    """
+    cross = incoming[0] * outgoing[1] - incoming[1] * outgoing[0]
+    dot = float(incoming @ outgoing)
+    in_normal = np.array((-incoming[1], incoming[0]))
+    out_normal = np.array((-outgoing[1], outgoing[0]))
+    end = vertex + half_width * out_normal
+    if abs(cross) <= 1e-9 and dot > 0:
+        return
+    if cross > 0:
+        # Inner side of the turn: pass through the centerline so the fill
+        # never leaves the stroke.
+        commands.append(("L", (vertex,)))
+    elif linejoin == "round":
+        start_angle = math.atan2(in_normal[1], in_normal[0])
+        # Clockwise around the vertex, also for a full reversal.
+        sweep = -math.atan2(abs(cross), dot)
+        steps = max(1, math.ceil(abs(sweep) / (math.pi / 2.0) - 1e-9))
+        step = sweep / steps
+        handle = 4.0 / 3.0 * math.tan(step / 4.0) * half_width
+        for index in range(steps):
+            first = start_angle + step * index
+            second = first + step
+            p0 = vertex + half_width * np.array((math.cos(first), math.sin(first)))
+            p3 = vertex + half_width * np.array((math.cos(second), math.sin(second)))
+            commands.append(
+                (
+                    "C",
+                    (
+                        p0 + handle * np.array((-math.sin(first), math.cos(first))),
+                        p3 - handle * np.array((-math.sin(second), math.cos(second))),
+                        p3,
+                    ),
+                )
+            )
+        return
+    elif linejoin in ("miter", "miter-clip", "arcs") and 1.0 + dot > 1e-12:
+        # The miter length relative to the stroke width is 1 / cos(a / 2),
+        # with a the turning angle.
+        if math.sqrt(2.0 / (1.0 + dot)) <= miterlimit:
+            miter = vertex + half_width * (in_normal + out_normal) / (1.0 + dot)
+            commands.append(("L", (miter,)))
+    commands.append(("L", (end,)))
+
+
+def _side_commands(pieces, lines, tangents, vertices, closed, join):
+    """
+    Return the commands of one outline side: its offset pieces with joins.
+
+    ``pieces`` holds the cubic pieces of each segment in the direction of
+    travel, ``lines`` whether each segment is straight, ``tangents`` the unit
+    ``(start, end)`` tangents of each segment and ``vertices`` the centerline
+    point at the start of each segment.
+    """
+    commands = []
+    count = len(pieces)
+    for index, segment_pieces in enumerate(pieces):
+        if index:
+            _append_join(
+                commands,
+                vertices[index],
+                tangents[index - 1][1],
+                tangents[index][0],
+                *join,
+            )
+        if lines[index]:
+            commands.append(("L", (segment_pieces[-1][3],)))
+        else:
+            commands.extend(("C", tuple(piece[1:])) for piece in segment_pieces)
+    if closed:
+        _append_join(
+            commands, vertices[0], tangents[count - 1][1], tangents[0][0], *join
+        )
+    return commands
+
+
+def _command_path_data(start, commands, decimals):
+    """Format a closed contour of ``L``/``C`` commands as SVG path data."""
+    if decimals is None:
+        parts = [f"M {start[0]} {start[1]}"]
+        for kind, points in commands:
+            parts.append(
+                kind + " " + " ".join(f"{point[0]} {point[1]}" for point in points)
+            )
+        return " ".join(parts) + " Z"
+
+    scale = 10.0**decimals
+    current = np.round(np.asarray(start) * scale).astype(np.int64)
+    offsets = [current]
+    kinds = []
+    for kind, points in commands:
+        rounded = np.round(np.asarray(points) * scale).astype(np.int64)
+        offsets.extend(rounded - current)
+        kinds.append((kind.lower(), len(points)))
+        current = rounded[-1]
+    text = _fixed_point(np.array(offsets), decimals).tolist()
+    path_data = f"M{text[0][0]} {text[0][1]}"
+    index = 1
+    previous = None
+    for kind, size in kinds:
+        coordinates = " ".join(f"{x} {y}" for x, y in text[index : index + size])
+        # Repeated commands of the same kind may omit the letter.
+        path_data += (" " if kind == previous else kind) + coordinates
+        previous = kind
+        index += size
+    return path_data + "z"
+
+
+def offset_outline_path_data(
+    packed,
+    stroke_width,
+    tolerance,
+    linejoin="miter",
+    miterlimit=4.0,
+    decimals=None,
+):
+    """
+    Return the stroke outline of a packed path as cubic Bézier path data.
+
+    Each segment's offsets are fitted with as few cubic pieces as keep them
+    within ``tolerance`` of the exact offset curves.  Consecutive segments
+    are connected with ``linejoin`` ("miter", "round" or "bevel") on the
+    outside of each turn.  Open subpaths get butt caps and become one closed
+    contour; closed subpaths become an outer and an inner contour with
+    opposite winding.  ``decimals`` selects the compact relative format of
+    polygon_path_data.  Returns an empty string when nothing is stroked.
+    """
+    if not tolerance > 0:
+        raise ValueError("Stroke tolerance must be positive")
+    half_width = stroke_width / 2.0
+    bezier = packed["bezier"]
+    extent = np.any(bezier != bezier[:, :1], axis=(1, 2)) | packed["is_arc"]
+    segments = np.flatnonzero(extent)
+    if not len(segments):
+        return ""
+
+    piece_segments, left, right = _fit_offset_curves(
+        packed, segments, half_width, tolerance
+    )
+    boundaries = np.searchsorted(piece_segments, segments, side="right")
+    left_pieces = np.split(left, boundaries[:-1])
+    right_pieces = np.split(right, boundaries[:-1])
+
+    repeated = np.repeat(segments, 2)
+    ends = np.tile([0.0, 1.0], len(segments))
+    points, tangents, _flat = _tangents(packed, repeated, ends)
+    tangents = [_unit(tangent) for tangent in tangents]
+    starts = points[0::2]
+    stops = points[1::2]
+    join = (half_width, linejoin, miterlimit)
+    closed = set(packed["closed"].tolist())
+
+    contours = []
+    subpaths = packed["subpath"][segments]
+    for number in np.unique(subpaths):
+        members = np.flatnonzero(subpaths == number)
+        forward_tangents = [
+            (tangents[2 * index], tangents[2 * index + 1]) for index in members
+        ]
+        backward_tangents = [
+            (-tangents[2 * index + 1], -tangents[2 * index])
+            for index in members[::-1]
+        ]
+        lines = packed["is_line"][segments[members]]
+        forward = _side_commands(
+            [left_pieces[index] for index in members],
+            lines,
+            forward_tangents,
+            [starts[index] for index in members],
+            number in closed,
+            join,
+        )
+        backward = _side_commands(
+            [right_pieces[index][::-1, ::-1] for index in members[::-1]],
+            lines[::-1],
+            backward_tangents,
+            [stops[index] for index in members[::-1]],
+            number in closed,
+            join,
+        )
+        left_start = left_pieces[members[0]][0][0]
+        right_start = right_pieces[members[-1]][-1][3]
+        if number in closed:
+            contours.append((left_start, forward))
+            contours.append((right_start, backward))
+        else:
+            # Butt caps: straight across the last end and back to the start.
+            contours.append(
+                (left_start, forward + [("L", (right_start,))] + backward)
+            )
+
+    separator = "" if decimals is not None else " "
+    return separator.join(
+        _command_path_data(start, commands, decimals)
+        for start, commands in contours
+    )
+
+
+def outline_job(job):
+    """
+    Return the outline path data of a ``(packed, stroke_width, counts,
+    decimals, curves)`` job, or None when the stroke has no outline.
+
+    ``curves`` is None for polygon outlines, or the ``(tolerance, linejoin,
+    miterlimit)`` of an offset Bézier outline.
+    """
+    packed, stroke_width, counts, decimals, curves = job
+    if curves is not None:
+        tolerance, linejoin, miterlimit = curves
+        return (
+            offset_outline_path_data(
+                packed, stroke_width, tolerance, linejoin, miterlimit, decimals
+            )
+            or None
+        )
+    polygons = outline_polygons(packed, stroke_width, counts)
+    return outline_path_data(polygons, decimals) if polygons else None
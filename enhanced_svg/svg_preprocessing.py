@@ -1,8 +1,29 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from lxml import etree
 import copy
+import importlib
+import itertools
 import math
+import multiprocessing
+import os
+import pickle
 import re
-from svg.path import parse_path
+import site
+import uuid
+from pathlib import Path
+import numpy as np
+
+from .affine import MAT_IDENTITY, mat_mul, parse_transform
+from .path_data import parse_path_data, path_data_string, simplify_path_data
+from .stroke_engine import (
+    outline_job,
+    outline_path_data,
+    outline_polygons,
+    pack_path,
+    segment_sample_counts,
+)
 
 # SVG namespace used throughout.
 SVG_NS = "http://www.w3.org/2000/svg"
@@ -20,8 +41,25 @@ _LENGTH_UNITS = {
     "ex": 1.0,
 }
 MAX_FLATTENED_SVG_NODES = 50_000
-STROKE_OUTLINE_SAMPLES = 1000
+# Instanced <use> placements are not cloned, but each one still becomes
+# Blender objects; this bounds the nodes they stand in for.
+MAX_INSTANCED_SVG_NODES = 500_000
+# Largest allowed distance, in SVG user units, between a converted stroke
+# outline and the exact stroke edge.
+STROKE_TOLERANCE = 0.05
 MAX_STROKE_SAMPLE_POINTS = 250_000
+# Distinct outlines are sampled once, but every clone still gets its own copy
+# of the outline text; this bounds the path data spliced into the tree.
+MAX_STROKE_OUTLINE_CHARS = 16_000_000
+# Decimal places of compact outline coordinates.  One SVG user unit is about
+# 0.28 mm in Blender, so 0.001 units keeps vertices within a micron.
+COMPACT_DECIMALS = 3
+# Inline image data URIs at least this long are handed to an image sink
+# while a file is read, so their text does not stay in the tree.
+STREAMED_IMAGE_MIN_CHARS = 64 * 1024
+# Distinct stroke outlines needed before conversion is spread over a process
+# pool; smaller documents would not win back the pool startup cost.
+PARALLEL_STROKE_MIN_OUTLINES = 2_000
 
 
 def _viewbox(value):
@@ -117,41 +155,61 @@ def _viewport_alignment_correction(width, height, viewbox_value, value):
     return correction
 
 
-def _parse_length(value, reference, default):
+def _length_spec(value):
+    """
+    Parse a length once into ``(number, is_percentage)``; None stands for
+    ``auto`` and unparsable values.
+    """
     if value is None or value.strip().lower() == "auto":
-        return default
+        return None
     match = _FLOAT_RE.match(value.strip())
     if match is None:
-        return default
+        return None
     parsed = float(match.group(0))
     unit = value.strip()[match.end() :].strip()
     if unit == "%":
-        return reference * parsed / 100.0
-    return parsed * _LENGTH_UNITS.get(unit, 1.0)
+        return parsed, True
+    return parsed * _LENGTH_UNITS.get(unit, 1.0), False
 
 
-def _active_viewport(element):
-    """Return the nearest SVG user-coordinate viewport dimensions."""
-    viewport = (0.0, 0.0)
-    ancestors = list(element.iterancestors())
-    ancestors.reverse()
-    for ancestor in ancestors:
-        if not isinstance(ancestor.tag, str):
-            continue
-        qname = etree.QName(ancestor.tag)
-        if qname.namespace not in (None, SVG_NS) or qname.localname != "svg":
-            continue
-        viewbox = _viewbox(ancestor.get("viewBox"))
-        if viewbox is not None:
-            viewport = (viewbox[2], viewbox[3])
+def _resolve_length(spec, reference, default):
+    if spec is None:
+        return default
+    number, percentage = spec
+    return reference * number / 100.0 if percentage else number
+
+
+def _parse_length(value, reference, default):
+    return _resolve_length(_length_spec(value), reference, default)
+
+
+def _viewport_step(element):
+    """
+    Return how an <svg> element sets the viewport of its content, parsed
+    once: the size of its viewBox, or the specs of its width and height.
+    """
+    viewbox = _viewbox(element.get("viewBox"))
+    if viewbox is not None:
+        return (viewbox[2], viewbox[3]), None, None
+    return (
+        None,
+        _length_spec(element.get("width")),
+        _length_spec(element.get("height")),
+    )
+
+
+def _resolve_viewport(steps, viewport=(0.0, 0.0)):
+    """
+    Return the SVG user-coordinate viewport in effect below the <svg>
+    viewport ``steps`` of _expandable_uses, starting from ``viewport``.
+    """
+    for size, width, height in steps:
+        if size is not None:
+            viewport = size
         else:
             viewport = (
-                _parse_length(
-                    ancestor.get("width"), viewport[0], viewport[0]
-                ),
-                _parse_length(
-                    ancestor.get("height"), viewport[1], viewport[1]
-                ),
+                _resolve_length(width, viewport[0], viewport[0]),
+                _resolve_length(height, viewport[1], viewport[1]),
             )
     return viewport
 
@@ -160,53 +218,385 @@ def _number(value):
     return format(value, ".15g")
 
 
-def _ensure_unicode(xml_string):
+# Reusable parsers: libxml2 decodes the document itself, recovers from
+# malformed markup in the same pass, and never loads entity definitions.
+# Text input is handed over as UTF-8, which overrides any declared encoding.
+_PARSER_OPTIONS = {"recover": True, "huge_tree": True, "resolve_entities": False}
+_BYTES_PARSER = etree.XMLParser(**_PARSER_OPTIONS)
+_TEXT_PARSER = etree.XMLParser(encoding="utf-8", **_PARSER_OPTIONS)
+
+
+def parse_svg_string(svg_content):
     """
-    Ensures the input XML string is a Unicode string without an XML encoding declaration.
-    If the input is bytes, decodes as UTF-8.
-    If the input is str, strips any XML encoding declaration.
+    Parses SVG content, given as bytes or str, into an lxml root element,
+    handling XML declarations, doctypes and other preamble if present.
+
+    Bytes are parsed as they are, so libxml2 honours the declared encoding.
+    Only when recovery finds no <svg> root is the document parsed once more
+    from its first ``<svg`` tag.
     """
-    if isinstance(xml_string, bytes):
-        xml_string = xml_string.decode("utf-8")
-    # Remove XML encoding declaration if present
-    import re
-    xml_string = re.sub(r'<\?xml[^>]*encoding=[\'"].*?[\'"][^>]*\?>', '', xml_string, flags=re.IGNORECASE)
-    return xml_string
+    if isinstance(svg_content, str):
+        svg_content = svg_content.encode("utf-8")
+        parser = _TEXT_PARSER
+    else:
+        parser = _BYTES_PARSER
+    root = etree.fromstring(svg_content, parser)
+    if root is None or etree.QName(root).localname != "svg":
+        start = svg_content.find(b"<svg")
+        if start > 0:
+            root = etree.fromstring(svg_content[start:], parser)
+    if root is None:
+        raise ValueError("Could not parse the SVG document")
+    return root
+
+
+def _hand_off_image(image_el, image_sink):
+    for name in ("href", f"{{{NS_MAP['xlink']}}}href"):
+        href = image_el.get(name)
+        if (
+            href is not None
+            and len(href) >= STREAMED_IMAGE_MIN_CHARS
+            and href.lstrip()[:5].lower() == "data:"
+        ):
+            image_el.set(name, image_sink(href))
 
 
-def parse_svg_string(svg_content):
+def read_svg_file(path, image_sink=None):
     """
-    Parses SVG content into an lxml root element, handling XML declarations,
-    doctypes and other preamble if present.
+    Parse an SVG file into an lxml root element without reading it into a
+    Python string first.
+
+    The file is fed to ``etree.iterparse`` so libxml2 reads it in chunks and
+    handles its encoding.  When ``image_sink`` is given, every inline image
+    data URI of at least STREAMED_IMAGE_MIN_CHARS characters is passed to it
+    as soon as its <image> element has been read, and the href is replaced by
+    the short string the sink returns.  Malformed files are parsed by the
+    recovering parser of parse_svg_string instead.
     """
-    svg_content = _ensure_unicode(svg_content)
     try:
-        # First try parsing as a direct XML fragment
-        return etree.fromstring(svg_content)
+        context = etree.iterparse(
+            str(path),
+            events=("end",),
+            tag=f"{{{SVG_NS}}}image",
+            huge_tree=True,
+            resolve_entities=False,
+        )
+        for _event, image_el in context:
+            if image_sink is not None:
+                _hand_off_image(image_el, image_sink)
+        return context.root
     except etree.XMLSyntaxError:
-        try:
-            # Try parsing as an XML document with potential XML declaration
-            parser = etree.XMLParser(remove_blank_text=True)
-            return etree.fromstring(svg_content, parser)
-        except:
-            # If still failing, try to handle SVG with doctype or other preamble
-            # by extracting just the SVG element
-            import re
-            svg_match = re.search(r'<svg[^>]*>.*</svg>', svg_content, re.DOTALL)
-            if svg_match:
-                parser = etree.XMLParser(remove_blank_text=True)
-                return etree.fromstring(svg_match.group(0), parser)
-            else:
-                raise
+        pass
+    with open(path, "rb") as handle:
+        root = parse_svg_string(handle.read())
+    if image_sink is not None:
+        for image_el in root.iter(f"{{{SVG_NS}}}image"):
+            _hand_off_image(image_el, image_sink)
+    return root
 
 
-def flatten_svg(svg_content):
+def serialize_svg_tree(root, compact=False):
     """
-    Replaces all <use xlink:href="#..."> references with the actual symbol contents,
-    preserving transforms and styles so the final visual layout is unchanged.
+    Serialize a (pre)processed SVG element tree back to a string.
+
+    The output is pretty printed unless ``compact`` is set.
+    """
+    return etree.tostring(root, encoding="unicode", pretty_print=not compact)
+
+
+_USE_TAG = f"{{{SVG_NS}}}use"
+_DEFS_TAG = f"{{{SVG_NS}}}defs"
+_IMAGE_TAG = f"{{{SVG_NS}}}image"
+_SVG_TAGS = {f"{{{SVG_NS}}}svg", "svg"}
+# Attributes that only place a <use> instance or one of its ancestors;
+# everything else can style it.
+_PLACEMENT_ATTRIBUTES = {
+    "id",
+    "x",
+    "y",
+    "width",
+    "height",
+    "transform",
+    "viewBox",
+    "preserveAspectRatio",
+    "href",
+    f"{{{NS_MAP['xlink']}}}href",
+}
+
+
+def _use_reference(use_el, elements_by_id):
+    """Return the id a <use> element points at, or None if it is unresolved."""
+    # SVG 1.1 uses xlink:href, SVG 2 uses plain href.
+    # SVG 2 plain href takes precedence when both forms are present.
+    href = use_el.get("href")
+    if href is None:
+        href = use_el.get(f"{{{NS_MAP['xlink']}}}href")
+    if not (href and href.startswith("#")):
+        return None
+    reference = href[1:]
+    return reference if reference in elements_by_id else None
+
+
+def _expandable_uses(roots):
+    """
+    Yield, in document order, the <use> elements in ``roots`` and their
+    descendants that are rendered: anything inside <defs> is skipped, and the
+    children of a <use> are replaced together with it.
+
+    Each <use> comes with the viewport steps of its <svg> ancestors from
+    ``roots`` down (see _resolve_viewport).  They are collected on the way
+    down, so every <svg> is parsed once however many uses it contains.
+    """
+    stack = [(root, ()) for root in reversed(roots)]
+    while stack:
+        element, steps = stack.pop()
+        if element.tag == _USE_TAG:
+            yield element, steps
+        elif element.tag != _DEFS_TAG:
+            if element.tag in _SVG_TAGS:
+                steps = steps + (_viewport_step(element),)
+            stack.extend((child, steps) for child in reversed(element))
+
+
+def _is_viewport_target(target):
+    return etree.QName(target).localname in ("symbol", "svg")
+
+
+def _template_roots(target):
+    """
+    Return the elements cloned for one instance of ``target``.  Symbols and
+    SVG viewports contribute their children; other elements are cloned whole.
     """
-    tree = parse_svg_string(svg_content)
-    node_count = sum(1 for _ in tree.iter())
+    if _is_viewport_target(target):
+        return list(target)
+    return [target]
+
+
+def _use_size(use_el, target, parent_viewport):
+    """Return the width and height of a symbol or SVG instance."""
+    parent_width, parent_height = parent_viewport
+    width_value = use_el.get("width")
+    if width_value is None or width_value.strip().lower() == "auto":
+        width_value = target.get("width")
+    height_value = use_el.get("height")
+    if height_value is None or height_value.strip().lower() == "auto":
+        height_value = target.get("height")
+    width = _parse_length(width_value, parent_width, parent_width)
+    height = _parse_length(height_value, parent_height, parent_height)
+    return width, height
+
+
+def _use_content_viewport(use_el, target, parent_viewport):
+    """Return the viewport in effect for the cloned content of one instance."""
+    if not _is_viewport_target(target):
+        return parent_viewport
+    viewbox = _viewbox(target.get("viewBox"))
+    if viewbox is not None:
+        return (viewbox[2], viewbox[3])
+    width, height = _use_size(use_el, target, parent_viewport)
+    return (float(_number(width)), float(_number(height)))
+
+
+def _use_instance(use_el, target, parent_viewport):
+    """
+    Build the wrapper groups that place one instance of ``target`` for
+    ``use_el``.  Returns the outermost group and the element that receives
+    the cloned content.
+    """
+    # Keep the use transform and presentation properties on an outer
+    # group.  A nested SVG carries x/y as real length properties, so
+    # valid percentages and units remain viewport-aware instead of
+    # being forced through float() or an invalid transform length.
+    new_g = etree.Element(f"{{{SVG_NS}}}g")
+    transform = use_el.get("transform", "")
+    if transform:
+        new_g.set("transform", transform)
+
+    # Copy over any additional attributes (such as fill, etc.).
+    for attr_name, attr_value in use_el.items():
+        if attr_name not in (
+            "x",
+            "y",
+            "width",
+            "height",
+            "transform",
+            "href",
+            f"{{{NS_MAP['xlink']}}}href",
+        ):
+            new_g.set(attr_name, attr_value)
+
+    if not _is_viewport_target(target):
+        use_viewport = etree.Element(f"{{{SVG_NS}}}svg")
+        use_viewport.set("x", use_el.get("x", "0"))
+        use_viewport.set("y", use_el.get("y", "0"))
+        new_g.append(use_viewport)
+        return new_g, use_viewport
+
+    # Keep the referenced element's transform outside its node/viewport
+    # matrix, matching Blender's native use instancing order.
+    parent_width, parent_height = parent_viewport
+    use_x = _parse_length(use_el.get("x"), parent_width, 0.0)
+    use_y = _parse_length(use_el.get("y"), parent_height, 0.0)
+    width, height = _use_size(use_el, target, parent_viewport)
+
+    placement = etree.Element(f"{{{SVG_NS}}}g")
+    if use_x != 0 or use_y != 0:
+        placement.set(
+            "transform",
+            f"translate({_number(use_x)},{_number(use_y)})",
+        )
+    target_group = etree.Element(f"{{{SVG_NS}}}g")
+    for attr_name, attr_value in target.items():
+        if attr_name not in {
+            "id",
+            "x",
+            "y",
+            "width",
+            "height",
+            "viewBox",
+            "preserveAspectRatio",
+        }:
+            target_group.set(attr_name, attr_value)
+
+    # The referenced element's x/y percentages stay in the
+    # coordinate system where the instance is placed; changing
+    # the instance width/height must not change their basis.
+    target_x = _parse_length(target.get("x"), parent_width, 0.0)
+    target_y = _parse_length(target.get("y"), parent_height, 0.0)
+    target_position = etree.Element(f"{{{SVG_NS}}}g")
+    if target_x != 0 or target_y != 0:
+        target_position.set(
+            "transform",
+            f"translate({_number(target_x)},{_number(target_y)})",
+        )
+
+    viewport_compensation = etree.Element(f"{{{SVG_NS}}}g")
+    scale_x = parent_width / width if width != 0 else 1.0
+    scale_y = parent_height / height if height != 0 else 1.0
+    if scale_x != 1.0 or scale_y != 1.0:
+        viewport_compensation.set(
+            "transform",
+            f"scale({_number(scale_x)},{_number(scale_y)})",
+        )
+
+    target_viewport = etree.Element(f"{{{SVG_NS}}}svg")
+    target_viewport.set("width", _number(width))
+    target_viewport.set("height", _number(height))
+    viewbox_value = target.get("viewBox")
+    if viewbox_value is not None:
+        target_viewport.set("viewBox", viewbox_value)
+
+    # Blender adds a document-origin shift to nested SVG nodes that is not
+    # part of native <use> instancing.  Cancel it for both cloned symbols and
+    # cloned SVG viewports; authored nested SVG elements elsewhere in the
+    # document are left untouched.
+    content_parent = target_viewport
+    y_end = _viewbox_y_end(viewbox_value)
+    if y_end is not None:
+        compensation = etree.Element(f"{{{SVG_NS}}}g")
+        compensation.set("transform", f"translate(0,{y_end})")
+        target_viewport.append(compensation)
+        content_parent = compensation
+    alignment_correction = _viewport_alignment_correction(
+        width,
+        height,
+        viewbox_value,
+        target.get("preserveAspectRatio"),
+    )
+    if alignment_correction is not None:
+        scale_x, scale_y, translate_x, translate_y = alignment_correction
+        correction = etree.Element(f"{{{SVG_NS}}}g")
+        correction.set(
+            "transform",
+            "matrix("
+            f"{_number(scale_x)} 0 0 {_number(scale_y)} "
+            f"{_number(translate_x)} {_number(translate_y)})",
+        )
+        content_parent.append(correction)
+        content_parent = correction
+    viewport_compensation.append(target_viewport)
+    target_position.append(viewport_compensation)
+    target_group.append(target_position)
+    placement.append(target_group)
+    new_g.append(placement)
+    return new_g, content_parent
+
+
+def _instantiate_use(use_el, target, parent_viewport, template, template_size):
+    """
+    Return the flattened replacement of ``use_el`` built from a template, the
+    element holding the cloned content, and the replacement's node count.
+    """
+    new_g, content_parent = _use_instance(use_el, target, parent_viewport)
+    # Only the few synthetic wrappers are counted; the template size is known.
+    size = sum(1 for _ in new_g.iter()) + template_size
+    # One deepcopy of the whole template; its children then move over.
+    content_parent.extend(copy.deepcopy(template))
+    return new_g, content_parent, size
+
+
+def _presentation_context(use_el):
+    """
+    Return the attributes of a <use> and its ancestors that can style its
+    clone.  Placements that share a template and this context render alike
+    up to their transform.
+    """
+    context = []
+    for element in itertools.chain((use_el,), use_el.iterancestors()):
+        styling = sorted(
+            (name, value)
+            for name, value in element.items()
+            if name not in _PLACEMENT_ATTRIBUTES
+        )
+        if styling:
+            context.append(tuple(styling))
+    return tuple(context)
+
+
+def _marker_line(marker_id):
+    """Return a zero-length line that Blender imports as an object named id."""
+    marker = etree.Element(f"{{{SVG_NS}}}line")
+    marker.set("id", marker_id)
+    marker.set("x1", "0")
+    marker.set("y1", "0")
+    marker.set("x2", "0")
+    marker.set("y2", "0")
+    return marker
+
+
+def _subtree_sizes(tree):
+    """Return the node count of every subtree, computed in one post-order pass."""
+    sizes = {}
+    # Reversed document order visits every node after all of its descendants.
+    for node in reversed(list(tree.iter())):
+        sizes[node] = 1 + sum(sizes[child] for child in node)
+    return sizes
+
+
+def flatten_svg_tree(tree, instances=None):
+    """
+    Replaces all <use xlink:href="#..."> references in an SVG element tree with
+    the actual symbol contents, preserving transforms and styles so the final
+    visual layout is unchanged.  The tree is modified in place and returned.
+
+    The references are resolved as a graph in two phases.  The first phase
+    collects the <use> edges between referenced elements once, rejects
+    circular references, and records which (target, viewport) templates the
+    document needs.  The second phase builds each template exactly once,
+    bottom-up, by cloning the original target and replacing its nested <use>
+    elements with copies of already finished templates; every <use> in the
+    document is then replaced with a copy of its template.
+
+    When a list is passed as ``instances``, document <use> elements that
+    share a template and presentation context are instanced instead of
+    cloned.  The first placement is expanded between a start and an end
+    marker line (the prototype); every later placement keeps its wrapper
+    groups but holds a single marker line where the content would be.  One
+    ``{"start", "end", "instances"}`` dict of marker ids is appended per
+    instanced group.  Templates that contain images are always cloned.
+    """
+    subtree_sizes = _subtree_sizes(tree)
+    node_count = subtree_sizes[tree]
     if node_count > MAX_FLATTENED_SVG_NODES:
         raise ValueError("SVG exceeds the preprocessing expansion limit")
 
@@ -224,182 +614,225 @@ def flatten_svg(svg_content):
     for el in tree.xpath("//*[@id]"):
         elements_by_id[el.get("id")] = el
 
-    # Replace each <use> element with a group containing a clone of its
-    # referenced element. Repeat to resolve <use> references nested inside
-    # cloned content (bounded to guard against reference cycles).
-    for _ in range(10):
-        use_elements = tree.xpath(
-            "//svg:use[not(ancestor::svg:defs)]", namespaces=NS_MAP
+    # Phase 1: the reference graph.  Nested <use> edges, with the viewport
+    # steps between the referenced element and each nested <use>, are
+    # collected once per referenced element.
+    nested_uses = {}
+
+    def references_of(reference):
+        if reference not in nested_uses:
+            nested_uses[reference] = [
+                (use_el, _use_reference(use_el, elements_by_id), steps)
+                for use_el, steps in _expandable_uses(
+                    _template_roots(elements_by_id[reference])
+                )
+            ]
+        return nested_uses[reference]
+
+    document_uses = []
+    for use_el, steps in _expandable_uses([tree]):
+        reference = _use_reference(use_el, elements_by_id)
+        if reference is not None:
+            document_uses.append((use_el, reference, _resolve_viewport(steps)))
+
+    # Depth-first search with three states finds any cycle in time linear in
+    # the number of references.
+    active, finished = 1, 2
+    state = {}
+    for _use_el, start, _viewport in document_uses:
+        if state.get(start) == finished:
+            continue
+        state[start] = active
+        stack = [(start, iter(references_of(start)))]
+        while stack:
+            reference, edges = stack[-1]
+            for _nested, child, _steps in edges:
+                if child is None:
+                    continue
+                child_state = state.get(child)
+                if child_state == active:
+                    raise ValueError("SVG contains circular <use> references")
+                if child_state is None:
+                    state[child] = active
+                    stack.append((child, iter(references_of(child))))
+                    break
+            else:
+                state[reference] = finished
+                stack.pop()
+
+    # Record the templates the document needs.  Percentages inside a clone
+    # resolve against the viewport of the instance, so a template is keyed by
+    # its target and that viewport.  The post-order lists every template
+    # after all templates nested inside it.
+    template_children = {}
+    build_order = []
+    document_keys = []
+    for use_el, reference, parent_viewport in document_uses:
+        key = (
+            reference,
+            _use_content_viewport(
+                use_el, elements_by_id[reference], parent_viewport
+            ),
         )
-        if not use_elements:
-            break
-        for use_el in use_elements:
-            # SVG 1.1 uses xlink:href, SVG 2 uses plain href.
-            # SVG 2 plain href takes precedence when both forms are present.
-            href = use_el.get("href")
-            if href is None:
-                href = use_el.get(f"{{{NS_MAP['xlink']}}}href")
-            if not (href and href.startswith("#")):
+        document_keys.append(key)
+        stack = [(key, False)]
+        while stack:
+            key, expanded = stack.pop()
+            if expanded:
+                build_order.append(key)
                 continue
-            target = elements_by_id.get(href[1:])
-            if target is None:
+            if key in template_children:
                 continue
-
-            # Check before deepcopying: recursive or heavily branching <use>
-            # graphs can otherwise grow exponentially before image resource
-            # limits get a chance to run.  Eight is the maximum synthetic
-            # wrapper overhead used below.
-            target_node_count = sum(1 for _ in target.iter())
-            if (
-                node_count - 1 + target_node_count + 8
-                > MAX_FLATTENED_SVG_NODES
-            ):
-                raise ValueError("SVG exceeds the preprocessing expansion limit")
-
-            # Keep the use transform and presentation properties on an outer
-            # group.  A nested SVG carries x/y as real length properties, so
-            # valid percentages and units remain viewport-aware instead of
-            # being forced through float() or an invalid transform length.
-            new_g = etree.Element(f"{{{SVG_NS}}}g")
-            transform = use_el.get("transform", "")
-            if transform:
-                new_g.set("transform", transform)
-
-            # Copy over any additional attributes (such as fill, etc.).
-            for attr_name, attr_value in use_el.items():
-                if attr_name not in (
-                    "x",
-                    "y",
-                    "width",
-                    "height",
-                    "transform",
-                    "href",
-                    f"{{{NS_MAP['xlink']}}}href",
-                ):
-                    new_g.set(attr_name, attr_value)
-
-            # Keep the referenced element's transform outside its node/viewport
-            # matrix, matching Blender's native use instancing order.
-            local_name = etree.QName(target).localname
-            if local_name in ("symbol", "svg"):
-                parent_width, parent_height = _active_viewport(use_el)
-                use_x = _parse_length(use_el.get("x"), parent_width, 0.0)
-                use_y = _parse_length(use_el.get("y"), parent_height, 0.0)
-
-                width_value = use_el.get("width")
-                if width_value is None or width_value.strip().lower() == "auto":
-                    width_value = target.get("width")
-                height_value = use_el.get("height")
-                if height_value is None or height_value.strip().lower() == "auto":
-                    height_value = target.get("height")
-                width = _parse_length(
-                    width_value, parent_width, parent_width
-                )
-                height = _parse_length(
-                    height_value, parent_height, parent_height
+            reference, viewport = key
+            children = []
+            for nested, child, steps in references_of(reference):
+                if child is None:
+                    children.append(None)
+                    continue
+                nested_viewport = _resolve_viewport(steps, viewport)
+                child_key = (
+                    child,
+                    _use_content_viewport(
+                        nested, elements_by_id[child], nested_viewport
+                    ),
                 )
+                children.append((child_key, nested_viewport))
+            template_children[key] = children
+            stack.append((key, True))
+            stack.extend(
+                (child[0], False)
+                for child in reversed(children)
+                if child is not None and child[0] not in template_children
+            )
 
-                placement = etree.Element(f"{{{SVG_NS}}}g")
-                if use_x != 0 or use_y != 0:
-                    placement.set(
-                        "transform",
-                        f"translate({_number(use_x)},{_number(use_y)})",
-                    )
-                target_group = etree.Element(f"{{{SVG_NS}}}g")
-                for attr_name, attr_value in target.items():
-                    if attr_name not in {
-                        "id",
-                        "x",
-                        "y",
-                        "width",
-                        "height",
-                        "viewBox",
-                        "preserveAspectRatio",
-                    }:
-                        target_group.set(attr_name, attr_value)
-
-                # The referenced element's x/y percentages stay in the
-                # coordinate system where the instance is placed; changing
-                # the instance width/height must not change their basis.
-                target_x = _parse_length(target.get("x"), parent_width, 0.0)
-                target_y = _parse_length(target.get("y"), parent_height, 0.0)
-                target_position = etree.Element(f"{{{SVG_NS}}}g")
-                if target_x != 0 or target_y != 0:
-                    target_position.set(
-                        "transform",
-                        f"translate({_number(target_x)},{_number(target_y)})",
-                    )
-
-                viewport_compensation = etree.Element(f"{{{SVG_NS}}}g")
-                scale_x = parent_width / width if width != 0 else 1.0
-                scale_y = parent_height / height if height != 0 else 1.0
-                if scale_x != 1.0 or scale_y != 1.0:
-                    viewport_compensation.set(
-                        "transform",
-                        f"scale({_number(scale_x)},{_number(scale_y)})",
-                    )
-
-                target_viewport = etree.Element(f"{{{SVG_NS}}}svg")
-                target_viewport.set("width", _number(width))
-                target_viewport.set("height", _number(height))
-                viewbox_value = target.get("viewBox")
-                if viewbox_value is not None:
-                    target_viewport.set("viewBox", viewbox_value)
-
-                content_parent = target_viewport
-                if local_name in ("symbol", "svg"):
-                    # Blender adds a document-origin shift to nested SVG nodes
-                    # that is not part of native <use> instancing.  Cancel it
-                    # for both cloned symbols and cloned SVG viewports; authored
-                    # nested SVG elements elsewhere in the document are left
-                    # untouched.
-                    y_end = _viewbox_y_end(target.get("viewBox"))
-                    if y_end is not None:
-                        compensation = etree.Element(f"{{{SVG_NS}}}g")
-                        compensation.set("transform", f"translate(0,{y_end})")
-                        target_viewport.append(compensation)
-                        content_parent = compensation
-                alignment_correction = _viewport_alignment_correction(
-                    width,
-                    height,
-                    viewbox_value,
-                    target.get("preserveAspectRatio"),
-                )
-                if alignment_correction is not None:
-                    scale_x, scale_y, translate_x, translate_y = (
-                        alignment_correction
-                    )
-                    correction = etree.Element(f"{{{SVG_NS}}}g")
-                    correction.set(
-                        "transform",
-                        "matrix("
-                        f"{_number(scale_x)} 0 0 {_number(scale_y)} "
-                        f"{_number(translate_x)} {_number(translate_y)})",
-                    )
-                    content_parent.append(correction)
-                    content_parent = correction
-                for child in target:
-                    content_parent.append(copy.deepcopy(child))
-                viewport_compensation.append(target_viewport)
-                target_position.append(viewport_compensation)
-                target_group.append(target_position)
-                placement.append(target_group)
-                new_g.append(placement)
-            else:
-                use_viewport = etree.Element(f"{{{SVG_NS}}}svg")
-                use_viewport.set("x", use_el.get("x", "0"))
-                use_viewport.set("y", use_el.get("y", "0"))
-                clone = copy.deepcopy(target)
-                # Drop the id so the flattened output has no duplicate ids.
-                clone.attrib.pop("id", None)
-                use_viewport.append(clone)
-                new_g.append(use_viewport)
-
-            # Replace the <use> element with the new group.
+    # Phase 2: build every template once from the original target, reusing
+    # finished templates for its nested <use> elements.  Sizes are checked
+    # before deepcopying: heavily branching <use> graphs can otherwise grow
+    # exponentially before image resource limits get a chance to run.  Eight
+    # is the maximum synthetic wrapper overhead of one instance.  Sizes come
+    # from the subtree index and finished templates, so every check is
+    # arithmetic instead of a walk over the copied nodes.
+    templates = {}
+    template_sizes = {}
+    template_has_image = {}
+    for key in build_order:
+        reference, _viewport = key
+        target = elements_by_id[reference]
+        roots = _template_roots(target)
+        template_has_image[key] = any(
+            next(root.iter(_IMAGE_TAG), None) is not None for root in roots
+        ) or any(
+            template_has_image[child[0]]
+            for child in template_children[key]
+            if child is not None
+        )
+        holder = etree.Element(f"{{{SVG_NS}}}g")
+        for root in roots:
+            holder.append(copy.deepcopy(root))
+        if not _is_viewport_target(target):
+            # Drop the id so the flattened output has no duplicate ids.
+            holder[0].attrib.pop("id", None)
+        size = sum(subtree_sizes[root] for root in roots)
+        for (nested, _nested_steps), (original, _child, _steps), child in zip(
+            list(_expandable_uses(list(holder))),
+            references_of(reference),
+            template_children[key],
+        ):
+            if child is None:
+                continue
+            child_key, nested_viewport = child
+            size -= subtree_sizes[original]
+            if size + template_sizes[child_key] + 8 > MAX_FLATTENED_SVG_NODES:
+                raise ValueError("SVG exceeds the preprocessing expansion limit")
+            instance, _content_parent, instance_size = _instantiate_use(
+                nested,
+                elements_by_id[child_key[0]],
+                nested_viewport,
+                templates[child_key],
+                template_sizes[child_key],
+            )
+            nested.getparent().replace(nested, instance)
+            size += instance_size
+        templates[key] = holder
+        template_sizes[key] = size
+
+    # Instancing only pays off for groups with more than one placement.
+    group_keys = [None] * len(document_uses)
+    if instances is not None:
+        group_keys = [
+            None
+            if template_has_image[key]
+            else (key, _presentation_context(use_el))
+            for (use_el, _reference, _viewport), key in zip(
+                document_uses, document_keys
+            )
+        ]
+        placements = Counter(group_keys)
+        group_keys = [
+            group_key if placements[group_key] > 1 else None
+            for group_key in group_keys
+        ]
+        marker_prefix = f"__ESVG_USE_{uuid.uuid4().hex[:12]}_"
+        while any(value.startswith(marker_prefix) for value in elements_by_id):
+            marker_prefix = f"_{marker_prefix}"
+        marker_count = itertools.count()
+
+        def next_marker_id():
+            return f"{marker_prefix}{next(marker_count):06d}"
+
+    groups = {}
+    instanced_count = 0
+
+    # Replace each <use> element in the document with a copy of its template.
+    for (use_el, reference, parent_viewport), key, group_key in zip(
+        document_uses, document_keys, group_keys
+    ):
+        use_size = subtree_sizes[use_el]
+        group = groups.get(group_key) if group_key is not None else None
+        if group is not None:
+            # A later placement of an instanced template: Blender links the
+            # prototype's objects here, so only a marker is needed.
+            new_g, content_parent = _use_instance(
+                use_el, elements_by_id[reference], parent_viewport
+            )
+            marker_id = next_marker_id()
+            content_parent.append(_marker_line(marker_id))
+            group["instances"].append(marker_id)
+            instanced_count += sum(1 for _ in new_g.iter()) + template_sizes[key]
+            if instanced_count > MAX_INSTANCED_SVG_NODES:
+                raise ValueError("SVG exceeds the instanced expansion limit")
             parent = use_el.getparent()
             if parent is not None:
                 parent.replace(use_el, new_g)
-                node_count += sum(1 for _ in new_g.iter()) - 1
+            continue
+
+        if (
+            node_count - use_size + template_sizes[key] + 8
+            > MAX_FLATTENED_SVG_NODES
+        ):
+            raise ValueError("SVG exceeds the preprocessing expansion limit")
+        new_g, content_parent, instance_size = _instantiate_use(
+            use_el,
+            elements_by_id[reference],
+            parent_viewport,
+            templates[key],
+            template_sizes[key],
+        )
+        if group_key is not None:
+            group = {
+                "start": next_marker_id(),
+                "end": next_marker_id(),
+                "instances": [],
+            }
+            content_parent.insert(0, _marker_line(group["start"]))
+            content_parent.append(_marker_line(group["end"]))
+            instance_size += 2
+            groups[group_key] = group
+            instances.append(group)
+        parent = use_el.getparent()
+        if parent is not None:
+            parent.replace(use_el, new_g)
+            node_count += instance_size - use_size
 
     # Remove the entire <defs> section (no longer needed).
     for defs in tree.xpath("//svg:defs", namespaces=NS_MAP):
@@ -424,147 +857,472 @@ def flatten_svg(svg_content):
         if attr not in allowed_attribs:
             del tree.attrib[attr]
 
-    return etree.tostring(tree, encoding="unicode", pretty_print=True)
+    return tree
 
 
-def get_derivative(path_obj, t, dt=1e-6):
+def flatten_svg(svg_content):
     """
-    Compute the derivative of the path at parameter t using a finite difference.
-    t is clamped between 0 and 1.
+    Replaces all <use xlink:href="#..."> references with the actual symbol contents,
+    preserving transforms and styles so the final visual layout is unchanged.
     """
-    t0 = max(0, t - dt)
-    t1 = min(1, t + dt)
-    pt0 = path_obj.point(t0)
-    pt1 = path_obj.point(t1)
-    if t1 - t0 == 0:
-        return complex(0, 0)
-    return (pt1 - pt0) / (t1 - t0)
+    return serialize_svg_tree(flatten_svg_tree(parse_svg_string(svg_content)))
+
+
+_GROUP_TAG = f"{{{SVG_NS}}}g"
+_PATH_TAG = f"{{{SVG_NS}}}path"
+# Elements whose own transform Blender's importer applies to their geometry,
+# so an enclosing transform can move onto them.
+_TRANSFORMABLE_TAGS = {
+    f"{{{SVG_NS}}}{name}"
+    for name in (
+        "g",
+        "path",
+        "rect",
+        "circle",
+        "ellipse",
+        "line",
+        "polyline",
+        "polygon",
+    )
+}
+# Containers in which unwrapping a group keeps the rendering unchanged.
+_UNWRAP_PARENT_TAGS = {f"{{{SVG_NS}}}svg", _GROUP_TAG}
+
+
+def _element_matrix(element):
+    return parse_transform(element.get("transform", ""))
+
+
+def _set_element_matrix(element, matrix):
+    if all(
+        math.isclose(actual, expected, abs_tol=1e-12)
+        for actual, expected in zip(matrix, MAT_IDENTITY)
+    ):
+        element.attrib.pop("transform", None)
+    else:
+        element.set(
+            "transform", f"matrix({' '.join(_number(value) for value in matrix)})"
+        )
 
 
-def stroke_to_path(d_attr, stroke_width, num_samples=STROKE_OUTLINE_SAMPLES):
+def _only_transform(element):
+    return all(name == "transform" for name in element.keys())
+
+
+def _transformed_path_data(d_attr, matrix):
     """
-    Given a path data string (d_attr) and a stroke width, compute an outline
-    representing the painted stroke.
+    Return ``d_attr`` with ``matrix`` applied to its points, or None when the
+    path has arcs, whose radii and rotation do not map point by point.
+    """
+    try:
+        path_data = parse_path_data(d_attr)
+    except ValueError:
+        return None
+    commands = path_data["commands"].decode("ascii")
+    if not commands or "A" in commands:
+        return None
+    # Without arcs every argument is part of a coordinate pair.
+    a, b, c, d, e, f = matrix
+    points = path_data["coords"].reshape(-1, 2) @ np.array([[a, b], [c, d]])
+    return path_data_string(
+        {"commands": path_data["commands"], "coords": (points + (e, f)).ravel()}
+    )
 
-    This function samples points along the path, calculates a normal at each point
-    (using a finite difference derivative), and builds a closed polygon that follows
-    the left side (offset positively) and the right side (offset negatively) of the path.
-    """
-    path_obj = parse_path(d_attr)
-    offset = stroke_width / 2.0
-
-    left_points = []
-    right_points = []
-
-    # Sample along the path.
-    for i in range(num_samples + 1):
-        t = i / num_samples
-        pt = path_obj.point(t)
-        dpt = get_derivative(path_obj, t)
-        dx, dy = dpt.real, dpt.imag
-        length = math.hypot(dx, dy)
-        if length == 0:
-            # Use previous normal as a crude fallback.
-            normal = (
-                (
-                    (left_points[-1][0] - pt.real) / offset,
-                    (left_points[-1][1] - pt.imag) / offset,
-                )
-                if left_points
-                else (0, 0)
+
+def _bakeable_path(path_elem):
+    """
+    Return whether a path's transform can move into its coordinates: strokes
+    are converted later in the path's own space, and paint servers resolve
+    in user space, so both keep their transform.
+    """
+    stroke = path_elem.get("stroke")
+    if stroke is not None and stroke.strip().lower() != "none":
+        return False
+    return not any("url(" in value for value in path_elem.values())
+
+
+def collapse_transform_chains(root):
+    """
+    Shorten the chains of wrapper groups that flattening leaves around every
+    <use> instance.  The tree is modified in place and returned.
+
+    A group absorbs a single child group that carries nothing but a
+    transform, multiplying both into one ``matrix(...)``.  A group that
+    carries nothing but a transform hands it to its only child, and a group
+    without attributes is replaced by its children.  Finally, the transform
+    of an unstroked path without arcs or paint servers is baked into its
+    coordinates.  None of this changes the rendering.
+    """
+    for group in list(root.iter(_GROUP_TAG)):
+        parent = group.getparent()
+        if parent is None:
+            continue
+        while (
+            len(group) == 1
+            and group[0].tag == _GROUP_TAG
+            and _only_transform(group[0])
+        ):
+            child = group[0]
+            _set_element_matrix(
+                group, mat_mul(_element_matrix(group), _element_matrix(child))
             )
-        else:
-            nx, ny = -dy / length, dx / length
-            normal = (nx, ny)
-        left_pt = (pt.real + normal[0] * offset, pt.imag + normal[1] * offset)
-        right_pt = (pt.real - normal[0] * offset, pt.imag - normal[1] * offset)
-        left_points.append(left_pt)
-        right_points.append(right_pt)
+            group.remove(child)
+            group.extend(list(child))
+        if parent.tag not in _UNWRAP_PARENT_TAGS or not _only_transform(group):
+            continue
+        if "transform" in group.attrib:
+            if len(group) != 1 or group[0].tag not in _TRANSFORMABLE_TAGS:
+                continue
+            _set_element_matrix(
+                group[0], mat_mul(_element_matrix(group), _element_matrix(group[0]))
+            )
+        index = parent.index(group)
+        parent[index : index + 1] = list(group)
+
+    for path_elem in root.iter(_PATH_TAG):
+        if "transform" not in path_elem.attrib or not _bakeable_path(path_elem):
+            continue
+        d_attr = _transformed_path_data(
+            path_elem.get("d", ""), _element_matrix(path_elem)
+        )
+        if d_attr is not None:
+            path_elem.set("d", d_attr)
+            del path_elem.attrib["transform"]
+    return root
+
 
-    # Construct the outline path data.
-    d_parts = ["M {} {}".format(*left_points[0])]
-    d_parts.extend("L {} {}".format(*pt) for pt in left_points[1:])
-    d_parts.extend("L {} {}".format(*pt) for pt in reversed(right_points))
-    d_parts.append("Z")
-    return " ".join(d_parts)
+def _stroke_join(attrib):
+    """Return the ``(linejoin, miterlimit)`` of a stroked path element."""
+    linejoin = attrib.get("stroke-linejoin", "miter").strip().lower()
+    try:
+        miterlimit = float(attrib.get("stroke-miterlimit", "4"))
+    except ValueError:
+        miterlimit = 4.0
+    return linejoin, (miterlimit if miterlimit >= 1.0 else 4.0)
 
 
-def stroke_to_filled_path(svg_content):
+class _WorkerImport:
     """
-    Parses the SVG content (as a string), finds any <path> elements that use a stroke,
-    converts each stroke to a filled outline path, and returns the modified SVG as a string.
+    A module of this package, or one of its attributes, that pickles as an
+    import of the module by its top-level name.
+
+    Pool workers add this package's directory to ``sys.path`` and import
+    the module on its own: importing it through the package would run the
+    package's ``__init__``, which needs bpy.
+    """
+
+    def __init__(self, module, attribute=None):
+        self.module = module
+        self.attribute = attribute
+
+    def __reduce__(self):
+        if self.attribute is None:
+            return importlib.import_module, (self.module,)
+        return getattr, (_WorkerImport(self.module), self.attribute)
+
+
+_POOL_OUTLINE_JOB = _WorkerImport("stroke_engine", "outline_job")
+
+
+def _pool_outline_jobs(jobs, workers):
+    """
+    Run outline jobs in a pool of fresh Python processes.
+
+    Workers are spawned rather than forked, so they never copy Blender's
+    threads, and they only import stroke_engine.
+    """
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=site.addsitedir,
+        initargs=(str(Path(__file__).parent),),
+    ) as executor:
+        return list(executor.map(_POOL_OUTLINE_JOB, jobs, chunksize=chunksize))
+
+
+def _outline_jobs(jobs, parallel_threshold):
+    """
+    Return the outline path data of every ``(packed, width, counts,
+    decimals, curves)`` job.
+
+    With at least ``parallel_threshold`` jobs the work is spread over a
+    process pool in chunks; results keep the job order either way, so the
+    output is identical to serial conversion.  A pool that cannot start its
+    workers, or cannot send them the jobs, falls back to converting serially.
+    """
+    workers = os.cpu_count() or 1
+    if parallel_threshold is None or len(jobs) < parallel_threshold or workers < 2:
+        return [outline_job(job) for job in jobs]
+    try:
+        return _pool_outline_jobs(jobs, workers)
+    except (BrokenProcessPool, OSError, pickle.PicklingError):
+        return [outline_job(job) for job in jobs]
+
+
+def stroke_to_path(d_attr, stroke_width, tolerance=STROKE_TOLERANCE):
     """
-    root = parse_svg_string(svg_content)
+    Given a path data string (d_attr) and a stroke width, compute an outline
+    representing the painted stroke.
+
+    The path is packed into coefficient arrays once (see stroke_engine).  Each
+    segment is sampled just densely enough to keep the outline within
+    ``tolerance`` of the exact stroke edge: straight segments contribute only
+    their endpoints.  Every subpath becomes a closed polygon that follows the
+    left side (offset positively) and the right side (offset negatively) of
+    the path.
+    """
+    packed = pack_path(parse_path_data(d_attr))
+    counts = segment_sample_counts(packed, stroke_width / 2.0, tolerance)
+    return outline_path_data(outline_polygons(packed, stroke_width, counts))
+
+
+def _stroked_path(path_elem):
+    """Return ``(d, stroke_width, stroke)`` of a convertible stroked path."""
+    attrib = path_elem.attrib
+    stroke = attrib.get("stroke")
+    if stroke is None or stroke.strip().lower() == "none":
+        return None
+    if "stroke-width" not in attrib:
+        return None
+    d_attr = attrib.get("d")
+    if not d_attr:
+        return None
+    try:
+        stroke_width = float(attrib.get("stroke-width"))
+    except ValueError:
+        return None
+    if stroke_width <= 0:
+        return None
+    return d_attr, stroke_width, stroke
+
+
+def _stroke_fill_path(path_elem, d_attr, stroke):
+    """Return a new <path> that fills ``d_attr`` with the stroke colour."""
+    new_path = etree.Element(f"{{{SVG_NS}}}path")
+    new_path.set("d", d_attr)
+    new_path.set("fill", stroke)
+    new_path.set("fill-rule", "nonzero")
+    if "transform" in path_elem.attrib:
+        new_path.set("transform", path_elem.get("transform"))
+    return new_path
+
+
+def _replace_stroke(path_elem, new_path):
+    """Put ``new_path`` in place of the stroke of ``path_elem``."""
+    attrib = path_elem.attrib
+    parent = path_elem.getparent()
+    if parent is None:
+        return
+
+    fill = attrib.get("fill")
+    if fill is not None and fill.strip().lower() == "none":
+        # Stroke-only path: the new path fully replaces it.
+        parent.replace(path_elem, new_path)
+    else:
+        # The path also has a visible fill (explicit, or the SVG default
+        # black when no fill attribute is set): keep the filled path and
+        # paint the stroke on top of it.
+        for stroke_attr in (
+            "stroke",
+            "stroke-width",
+            "stroke-linecap",
+            "stroke-linejoin",
+            "stroke-opacity",
+            "stroke-dasharray",
+            "stroke-dashoffset",
+            "stroke-miterlimit",
+        ):
+            attrib.pop(stroke_attr, None)
+        parent.insert(parent.index(path_elem) + 1, new_path)
 
+
+def native_stroke_tree(root):
+    """
+    Prepare the stroked paths of an SVG element tree for strokes rendered by
+    Blender instead of outlined in Python.
+
+    Each stroke is replaced by a centerline path with the stroke's ``d``,
+    filled with the stroke colour so Blender's importer gives it a material,
+    and named by a unique id.  The tree is modified in place.  Returns a dict
+    mapping each centerline id to its stroke width in user units; the import
+    step turns fill off on those curves and bevels them to that width.
+    """
+    widths = {}
+    existing_ids = {value for value in root.xpath("//@id")}
+    prefix = f"__ESVG_STROKE_{uuid.uuid4().hex[:12]}_"
+    while any(value.startswith(prefix) for value in existing_ids):
+        prefix = f"_{prefix}"
+    for path_elem in root.xpath(".//svg:path", namespaces=NS_MAP):
+        stroked = _stroked_path(path_elem)
+        if stroked is None or path_elem.getparent() is None:
+            continue
+        d_attr, stroke_width, stroke = stroked
+        centerline = _stroke_fill_path(path_elem, d_attr, stroke)
+        stroke_id = f"{prefix}{len(widths):06d}"
+        centerline.set("id", stroke_id)
+        widths[stroke_id] = stroke_width
+        _replace_stroke(path_elem, centerline)
+    return widths
+
+
+def stroke_to_filled_path_tree(
+    root,
+    tolerance=STROKE_TOLERANCE,
+    parallel_threshold=None,
+    decimals=None,
+    bezier=False,
+):
+    """
+    Finds any <path> elements in an SVG element tree that use a stroke and
+    converts each stroke to a filled outline path within ``tolerance`` user
+    units of the exact stroke.  The tree is modified in place and returned.
+
+    Documents with at least ``parallel_threshold`` distinct outlines have
+    them computed in a process pool; None always converts serially.  With
+    ``decimals``, outlines are written compactly as relative commands rounded
+    to that many decimal places.  With ``bezier``, each outline is built from
+    offset cubic Béziers with the path's stroke-linejoin instead of a dense
+    polygon.
+    """
     # Find all <path> elements (using XPath with our namespace map), then
     # preflight the aggregate sampling work before constructing any large
     # outline strings.  A branching <use> graph can clone many stroked paths
-    # while still remaining below the general XML node limit.
+    # while still remaining below the general XML node limit.  Flattened
+    # clones repeat the same geometry many times, so candidates are grouped
+    # by (d, stroke-width) and each distinct outline is sampled, counted
+    # toward the limit and built only once.
     path_elems = root.xpath(".//svg:path", namespaces=NS_MAP)
     candidates = []
+    outlines = {}
+    sample_points = 0
     for path_elem in path_elems:
-        attrib = path_elem.attrib
-        stroke = attrib.get("stroke")
-        if stroke is None or stroke.strip().lower() == "none":
+        stroked = _stroked_path(path_elem)
+        if stroked is None:
             continue
-        if "stroke-width" not in attrib:
-            continue
-        d_attr = attrib.get("d")
-        if not d_attr:
-            continue
-        try:
-            stroke_width = float(attrib.get("stroke-width"))
-        except ValueError:
-            continue
-        if stroke_width <= 0:
+        d_attr, stroke_width, stroke = stroked
+        attrib = path_elem.attrib
+
+        key = (d_attr, stroke_width, _stroke_join(attrib) if bezier else None)
+        if key not in outlines:
+            packed = pack_path(parse_path_data(d_attr))
+            counts = segment_sample_counts(packed, stroke_width / 2.0, tolerance)
+            sample_points += int(counts.sum()) + len(counts)
+            if sample_points > MAX_STROKE_SAMPLE_POINTS:
+                raise ValueError("SVG exceeds the stroke conversion work limit")
+            outlines[key] = (packed, counts)
+        candidates.append((path_elem, key, stroke))
+
+    # Convert every distinct stroke to a filled outline once.
+    jobs = [
+        (
+            packed,
+            key[1],
+            counts,
+            decimals,
+            (tolerance, *key[2]) if bezier else None,
+        )
+        for key, (packed, counts) in outlines.items()
+    ]
+    outlines = dict(zip(outlines, _outline_jobs(jobs, parallel_threshold)))
+    outline_chars = 0
+    for _path_elem, key, _stroke in candidates:
+        outline_chars += len(outlines[key] or "")
+        if outline_chars > MAX_STROKE_OUTLINE_CHARS:
+            raise ValueError("SVG exceeds the stroke conversion work limit")
+
+    for path_elem, key, stroke in candidates:
+        new_d = outlines[key]
+        if new_d is None:
             continue
 
-        candidates.append((path_elem, d_attr, stroke_width, stroke))
+        # Create a new <path> element with the computed outline.
+        _replace_stroke(path_elem, _stroke_fill_path(path_elem, new_d, stroke))
 
-    if len(candidates) * (STROKE_OUTLINE_SAMPLES + 1) > MAX_STROKE_SAMPLE_POINTS:
-        raise ValueError("SVG exceeds the stroke conversion work limit")
+    return root
 
-    for path_elem, d_attr, stroke_width, stroke in candidates:
-        attrib = path_elem.attrib
-        # Convert the stroke to a filled outline.
-        new_d = stroke_to_path(
-            d_attr, stroke_width, num_samples=STROKE_OUTLINE_SAMPLES
-        )
 
-        # Create a new <path> element with the computed outline.
-        new_path = etree.Element(f"{{{SVG_NS}}}path")
-        new_path.set("d", new_d)
-        new_path.set("fill", stroke)
-        new_path.set("fill-rule", "nonzero")
-        if "transform" in attrib:
-            new_path.set("transform", attrib.get("transform"))
-
-        parent = path_elem.getparent()
-        if parent is None:
-            continue
+def stroke_to_filled_path(svg_content, tolerance=STROKE_TOLERANCE):
+    """
+    Parses the SVG content (as a string), finds any <path> elements that use a stroke,
+    converts each stroke to a filled outline path, and returns the modified SVG as a string.
+    """
+    return serialize_svg_tree(
+        stroke_to_filled_path_tree(parse_svg_string(svg_content), tolerance)
+    )
 
-        fill = attrib.get("fill")
-        if fill is not None and fill.strip().lower() == "none":
-            # Stroke-only path: the outline fully replaces it.
-            parent.replace(path_elem, new_path)
-        else:
-            # The path also has a visible fill (explicit, or the SVG default
-            # black when no fill attribute is set): keep the filled path and
-            # paint the stroke outline on top of it.
-            for stroke_attr in (
-                "stroke",
-                "stroke-width",
-                "stroke-linecap",
-                "stroke-linejoin",
-                "stroke-opacity",
-                "stroke-dasharray",
-                "stroke-dashoffset",
-                "stroke-miterlimit",
-            ):
-                attrib.pop(stroke_attr, None)
-            parent.insert(parent.index(path_elem) + 1, new_path)
-
-    return etree.tostring(root, encoding="unicode", pretty_print=True)
+
+def _largest_scale(matrix):
+    """Return the largest factor by which ``matrix`` stretches a length."""
+    a, b, c, d = matrix[:4]
+    squares = a * a + b * b + c * c + d * d
+    determinant = a * d - b * c
+    return math.sqrt(
+        (squares + math.sqrt(max(squares * squares - 4.0 * determinant**2, 0.0)))
+        / 2.0
+    )
+
+
+def simplify_path_tree(root, tolerance, scene_scale_length=1.0, decimals=None):
+    """
+    Drops path vertices that Blender would place within ``tolerance`` Blender
+    units of the simplified outline (see path_data.simplify_path_data).  The
+    tree is modified in place.
+
+    Each path's tolerance is taken back through its transformation matrix,
+    measured with the viewport conventions and ``BLENDER_SCALE`` of Blender's
+    importer.  Instanced prototypes are measured at their own placement.
+    Only simplified paths are rewritten, as absolute commands rounded to
+    ``decimals`` places when given.  Returns a Counter with the number of
+    rewritten ``paths`` and removed ``points``.
+    """
+    # image_import imports this module.
+    from .image_import import BLENDER_SCALE, _SKIP_TAGS, _svg_viewport_matrix
+
+    simplified = Counter()
+    root_matrix, root_rect = _svg_viewport_matrix(
+        root,
+        (0.0, 0.0),
+        nested=False,
+        scene_scale_length=scene_scale_length,
+    )
+    stack = [(child, root_matrix, root_rect) for child in reversed(root)]
+    while stack:
+        el, ctm, viewport = stack.pop()
+        if not isinstance(el.tag, str):
+            continue
+        qname = etree.QName(el.tag)
+        if qname.namespace not in (None, SVG_NS) or qname.localname in _SKIP_TAGS:
+            continue
+        transform = el.get("transform")
+        if transform:
+            ctm = mat_mul(ctm, parse_transform(transform))
+        if qname.localname == "svg":
+            viewport_matrix, viewport = _svg_viewport_matrix(
+                el,
+                viewport,
+                nested=True,
+                scene_scale_length=scene_scale_length,
+            )
+            ctm = mat_mul(ctm, viewport_matrix)
+        if qname.localname in {"svg", "g", "a"}:
+            stack.extend((child, ctm, viewport) for child in reversed(el))
+            continue
+        if qname.localname != "path":
+            continue
+        scale = _largest_scale(ctm) * BLENDER_SCALE
+        if scale <= 0.0:
+            continue
+        try:
+            path_data = parse_path_data(el.get("d", ""))
+        except ValueError:
+            continue
+        path_data, removed = simplify_path_data(path_data, tolerance / scale)
+        if removed:
+            el.set("d", path_data_string(path_data, decimals))
+            simplified["paths"] += 1
+            simplified["points"] += removed
+    return simplified
 
 
 # def convert_text_to_paths(svg_content):
@@ -576,16 +1334,80 @@ def stroke_to_filled_path(svg_content):
 #     return convert_text_to_paths_in_svg(svg_content)
 
 
-def preprocess_svg(svg_content):
+def preprocess_svg_tree(
+    root,
+    stroke_tolerance=STROKE_TOLERANCE,
+    instances=None,
+    parallel_threshold=None,
+    decimals=None,
+    bezier=False,
+    native_strokes=None,
+    pruned=None,
+    culled=None,
+    simplify_tolerance=None,
+    simplified=None,
+    scene_scale_length=1.0,
+):
+    """
+    Performs a six-step preprocessing on a parsed SVG element tree:
+      1. Flattens the SVG by inlining symbols (via flatten_svg_tree).
+      2. Collapses the wrapper groups left by flattening (via
+         collapse_transform_chains).
+      3. Removes elements that never render, when a ``pruned`` Counter is
+         passed (via pruning.prune_invisible), and adds them to it.
+      4. Converts text elements to path elements (via convert_text_to_paths).
+      5. Converts stroked paths into filled outline paths (via
+         stroke_to_filled_path_tree).
+      6. Simplifies path vertices within ``simplify_tolerance`` Blender
+         units, when given (via simplify_path_tree).
+
+    Every stage works on the same tree, so a document is parsed once and only
+    serialized when a caller needs text again.  ``stroke_tolerance`` is the
+    largest outline error allowed in step 5, in SVG user units.  Passing an
+    ``instances`` list enables instanced <use> placements (see
+    flatten_svg_tree).  ``parallel_threshold`` enables process-pool stroke
+    conversion for large documents, ``decimals`` writes compact stroke
+    outlines and ``bezier`` builds them from offset Béziers (see
+    stroke_to_filled_path_tree).  Passing a ``native_strokes`` dict replaces
+    step 5 with native_stroke_tree and fills the dict with its stroke widths.
+    Passing a ``culled`` Counter removes content outside the root viewport
+    after step 3 (see pruning.cull_outside_viewport) and adds the removed
+    shapes to it.  Step 6 measures Blender units with
+    ``scene_scale_length`` and adds its counts to a ``simplified`` Counter
+    when one is passed.
+    Returns the processed tree.
     """
-    Performs a three-step preprocessing on the SVG content:
-      1. Flattens the SVG by inlining symbols (via flatten_svg).
-      2. Converts text elements to path elements (via convert_text_to_paths).
-      3. Converts stroked paths into filled outline paths (via stroke_to_filled_path).
+    root = flatten_svg_tree(root, instances)
+    root = collapse_transform_chains(root)
+    # pruning resolves styles and viewports like image_import, which imports
+    # this module.
+    from .pruning import cull_outside_viewport, prune_invisible
+
+    if pruned is not None:
+        pruned.update(prune_invisible(root, instances or ()))
+    if culled is not None:
+        culled.update(cull_outside_viewport(root, instances or ()))
+    # root = convert_text_to_paths(root) # not yet ready for use
+    if native_strokes is not None:
+        native_strokes.update(native_stroke_tree(root))
+    else:
+        root = stroke_to_filled_path_tree(
+            root, stroke_tolerance, parallel_threshold, decimals, bezier
+        )
+    if simplify_tolerance:
+        counts = simplify_path_tree(
+            root, simplify_tolerance, scene_scale_length, decimals
+        )
+        if simplified is not None:
+            simplified.update(counts)
+    return root
 
-    Returns the fully processed SVG content as a string.
+
+def preprocess_svg(svg_content, stroke_tolerance=STROKE_TOLERANCE):
+    """
+    Performs the preprocessing of preprocess_svg_tree on SVG content given as
+    a string and returns the fully processed SVG content as a string.
     """
-    svg_processed = flatten_svg(svg_content)
-    # svg_processed = convert_text_to_paths(svg_processed) # not yet ready for use
-    svg_processed = stroke_to_filled_path(svg_processed)
-    return svg_processed
+    return serialize_svg_tree(
+        preprocess_svg_tree(parse_svg_string(svg_content), stroke_tolerance)
+    )
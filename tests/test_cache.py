@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from enhanced_svg import cache as cache_module
+from enhanced_svg.cache import (
+    cache_key,
+    file_cache_key,
+    load_cached_import,
+    prune_cache,
+    store_cached_import,
+)
+
+
+def _result(image_data=b"png-bytes"):
+    return {
+        "processed_svg": "<svg/>",
+        "images": [
+            {
+                "name": "Image1",
+                "data": image_data,
+                "ext": ".png",
+                "rect": (0.0, 0.0, 2.0, 1.0),
+                "matrix": (1.0, 0.0, 0.0, 1.0, 0.0, 0.0),
+                "corners": [(0.0, 0.0), (2.0, 0.0), (2.0, 1.0), (0.0, 1.0)],
+                "preserve_aspect_ratio": "xMidYMid meet",
+                "opacity": 1.0,
+                "marker_id": "m",
+            }
+        ],
+        "warnings": ["note"],
+        "marker_ids": ["m"],
+        "instances": [
+            {
+                "start": "s",
+                "end": "e",
+                "instances": ["i"],
+                "matrices": {"s": (1, 0, 0, 1, 0, 0), "i": (1, 0, 0, 1, 5, 0)},
+            }
+        ],
+        "native_strokes": {"s": 0.25},
+    }
+
+
+class ImportCacheTests(unittest.TestCase):
+    def test_key_depends_on_bytes_and_options(self):
+        key = cache_key(b"<svg/>", {"stroke_tolerance": 0.1})
+        self.assertEqual(key, cache_key(b"<svg/>", {"stroke_tolerance": 0.1}))
+        self.assertNotEqual(key, cache_key(b"<svg />", {"stroke_tolerance": 0.1}))
+        self.assertNotEqual(key, cache_key(b"<svg/>", {"stroke_tolerance": 0.2}))
+
+    def test_key_depends_on_preprocessing_code(self):
+        key = cache_key(b"<svg/>", {})
+        with mock.patch.object(
+            cache_module, "preprocessing_fingerprint", return_value="edited"
+        ):
+            self.assertNotEqual(key, cache_key(b"<svg/>", {}))
+
+    def test_file_key_matches_byte_key(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "drawing.svg"
+            path.write_bytes(b"<svg/>" * 500_000)
+            self.assertEqual(
+                file_cache_key(path, {"instance_uses": True}),
+                cache_key(path.read_bytes(), {"instance_uses": True}),
+            )
+
+    def test_stored_result_round_trips(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.assertIsNone(load_cached_import(cache_dir, "missing"))
+            store_cached_import(cache_dir, "key", _result())
+            self.assertEqual(load_cached_import(cache_dir, "key"), _result())
+
+    def test_changed_dependency_is_a_miss(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            image = Path(cache_dir) / "image.png"
+            image.write_bytes(b"one")
+            store_cached_import(cache_dir, "key", _result(), {image})
+            self.assertIsNotNone(load_cached_import(cache_dir, "key"))
+            image.write_bytes(b"longer")
+            self.assertIsNone(load_cached_import(cache_dir, "key"))
+
+    def test_prune_evicts_least_recently_used_entries(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            store_cached_import(cache_dir, "old", _result(b"a" * 100))
+            store_cached_import(cache_dir, "new", _result(b"b" * 100))
+            entries = Path(cache_dir) / "entries"
+            os.utime(entries / "old.json", ns=(1, 1))
+            prune_cache(cache_dir, os.path.getsize(entries / "new.json") + 100)
+            self.assertIsNone(load_cached_import(cache_dir, "old"))
+            self.assertIsNotNone(load_cached_import(cache_dir, "new"))
+            self.assertEqual(len(list((Path(cache_dir) / "blobs").iterdir())), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
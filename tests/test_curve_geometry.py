@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+
+from enhanced_svg.curve_geometry import collect_curve_shapes, curve_splines
+from enhanced_svg.image_import import BLENDER_SCALE
+from enhanced_svg.path_data import parse_path_data
+from enhanced_svg.svg_preprocessing import parse_svg_string
+
+SVG_NS = "http://www.w3.org/2000/svg"
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+
+def _bezier_points(spline, samples=9):
+    """Sample every segment of a Bézier spline in Blender space."""
+    co, left, right = spline["co"], spline["handle_left"], spline["handle_right"]
+    count = len(co) if spline["cyclic"] else len(co) - 1
+    t = np.linspace(0.0, 1.0, samples)[:, None]
+    points = []
+    for index in range(count):
+        following = (index + 1) % len(co)
+        p0, p1, p2, p3 = co[index], right[index], left[following], co[following]
+        points.append(
+            (1 - t) ** 3 * p0
+            + 3 * (1 - t) ** 2 * t * p1
+            + 3 * (1 - t) * t**2 * p2
+            + t**3 * p3
+        )
+    return np.concatenate(points)
+
+
+class CurveSplineTests(unittest.TestCase):
+    def test_straight_subpaths_become_poly_splines(self):
+        (closed, open_) = curve_splines(
+            parse_path_data("M0 0 L10 0 L10 10 Z M20 0 L30 0"), IDENTITY
+        )
+        self.assertEqual((closed["type"], closed["cyclic"]), ("POLY", True))
+        np.testing.assert_allclose(
+            closed["co"] / BLENDER_SCALE, [[0, 0], [10, 0], [10, -10]]
+        )
+        self.assertEqual((open_["type"], open_["cyclic"]), ("POLY", False))
+        self.assertEqual(len(open_["co"]), 2)
+
+    def test_returning_closepath_adds_no_point(self):
+        (spline,) = curve_splines(
+            parse_path_data("M0 0 C 5 5 10 5 10 0 L0 0 Z"), IDENTITY
+        )
+        self.assertEqual(spline["type"], "BEZIER")
+        self.assertEqual(len(spline["co"]), 2)
+
+    def test_arcs_stay_on_the_ellipse(self):
+        (spline,) = curve_splines(
+            parse_path_data("M10 0 A 10 5 0 1 1 -10 0 A 10 5 0 1 1 10 0 Z"),
+            IDENTITY,
+        )
+        points = _bezier_points(spline) / BLENDER_SCALE
+        radii = np.hypot(points[:, 0] / 10.0, points[:, 1] / 5.0)
+        np.testing.assert_allclose(radii, 1.0, atol=1e-3)
+
+
+class CollectCurveShapesTests(unittest.TestCase):
+    def test_shapes_keep_paint_order_fill_and_transform(self):
+        shapes = collect_curve_shapes(
+            parse_svg_string(
+                f'<svg xmlns="{SVG_NS}" fill="#123456">'
+                '<rect id="box" width="4" height="2" transform="translate(1 1)"/>'
+                '<g fill="red"><circle r="2" style="fill:none"/>'
+                '<line id="marker" x1="0" y1="0" x2="0" y2="0"/></g>'
+                "<text>skipped</text></svg>"
+            )
+        )
+        self.assertEqual(
+            [(shape["name"], shape["fill"]) for shape in shapes],
+            [("box", "#123456"), (None, None), ("marker", "red")],
+        )
+        (box,) = shapes[0]["splines"]
+        np.testing.assert_allclose(
+            box["co"] / BLENDER_SCALE, [[1, -1], [5, -1], [5, -3], [1, -3]]
+        )
+        (circle,) = shapes[1]["splines"]
+        self.assertEqual(circle["type"], "BEZIER")
+        self.assertTrue(circle["cyclic"])
+        points = _bezier_points(circle) / BLENDER_SCALE
+        np.testing.assert_allclose(np.hypot(*points.T), 2.0, atol=2e-3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 import base64
+import functools
 from pathlib import Path
 import struct
 import tempfile
@@ -13,16 +14,28 @@ from enhanced_svg.image_import import (
     BLENDER_SCALE,
     PAINT_ORDER_Z_STEP,
     _placement_geometry,
+    collect_element_matrices,
     create_image_planes,
     extract_svg_images,
     finalize_paint_order,
+    prepare_svg_image_tree,
     prepare_svg_images,
+    streamed_image_sink,
 )
 from enhanced_svg.imports import (
+    _rollback_import_state,
     _select_import_collection,
     deduplicate_materials,
 )
-from enhanced_svg.svg_preprocessing import preprocess_svg
+from enhanced_svg.ownership import IMPORT_TRANSACTION_KEY, begin_import_state, claim
+from enhanced_svg.svg_preprocessing import (
+    STREAMED_IMAGE_MIN_CHARS,
+    parse_svg_string,
+    preprocess_svg,
+    preprocess_svg_tree,
+    read_svg_file,
+    serialize_svg_tree,
+)
 
 
 SVG_NS = "http://www.w3.org/2000/svg"
@@ -105,6 +118,19 @@ class ExtractionTests(unittest.TestCase):
             [(32.5, 17.5), (57.5, 17.5), (57.5, 30.0), (32.5, 30.0)],
         )
 
+    def test_element_matrices_match_image_placement_matrices(self):
+        svg = f'''<svg xmlns="{SVG_NS}" width="200" height="200">
+          <g transform="rotate(15)">
+            <svg x="20" y="30" width="100" height="50" viewBox="0 0 10 10">
+              <line id="probe" x1="0" y1="0" x2="0" y2="0"/>
+              <image width="10" height="10" href="{TINY_DATA_URI}"/>
+            </svg>
+          </g>
+        </svg>'''
+        images, _warnings = extract_svg_images(svg)
+        matrices = collect_element_matrices(parse_svg_string(svg), ["probe"])
+        self.assertEqual(matrices, {"probe": images[0]["matrix"]})
+
     def test_zero_width_viewbox_keeps_blender_origin_convention(self):
         svg = f'''<svg xmlns="{SVG_NS}" width="200" height="100"
           viewBox="0 0 0 50">
@@ -332,24 +358,29 @@ class ExtractionTests(unittest.TestCase):
                 self.assertAlmostEqual(min(ys), bounds[2])
                 self.assertAlmostEqual(max(ys), bounds[3])
 
-    def test_recursive_use_expansion_is_bounded(self):
+    def test_recursive_use_references_are_rejected(self):
         raw = f'''<svg xmlns="{SVG_NS}" width="10" height="10">
           <defs><g id="loop">
             <use href="#loop"/><use href="#loop"/><use href="#loop"/>
           </g></defs>
           <use href="#loop"/>
         </svg>'''
-        with self.assertRaisesRegex(ValueError, "expansion limit"):
+        with self.assertRaisesRegex(ValueError, "circular"):
             preprocess_svg(raw)
 
     def test_cloned_stroke_conversion_work_is_bounded(self):
+        levels = "".join(
+            f'<g id="level{index + 1}"><use href="#level{index}"/>'
+            f'<use href="#level{index}"/></g>'
+            for index in range(9)
+        )
         raw = f'''<svg xmlns="{SVG_NS}" width="10" height="10">
-          <defs><g id="loop">
-            <path d="M0 0 L1 1" fill="none" stroke="#000"
-              stroke-width="1"/>
-            <use href="#loop"/><use href="#loop"/>
-          </g></defs>
-          <use href="#loop"/>
+          <defs>
+            <path id="level0" d="M0 0 C 0 10000 10000 10000 10000 0"
+              fill="none" stroke="#000" stroke-width="1"/>
+            {levels}
+          </defs>
+          <use href="#level9"/>
         </svg>'''
         with self.assertRaisesRegex(ValueError, "stroke conversion work limit"):
             preprocess_svg(raw)
@@ -384,6 +415,63 @@ class ExtractionTests(unittest.TestCase):
         self.assertEqual(len(images), 1)
         self.assertEqual(len(marker_ids), 1)
 
+    def test_tree_pipeline_matches_string_pipeline(self):
+        raw = f'''<svg xmlns="{SVG_NS}" width="100" height="100">
+          <defs><g id="asset">
+            <path d="M0 0 L10 0" fill="none" stroke="#000" stroke-width="2"/>
+            <image width="10" height="10" href="{TINY_DATA_URI}"/>
+          </g></defs>
+          <use href="#asset" x="10"/>
+        </svg>'''
+        root = preprocess_svg_tree(parse_svg_string(raw))
+        self.assertEqual(serialize_svg_tree(root), preprocess_svg(raw))
+
+        images, warnings, marker_ids = prepare_svg_image_tree(root)
+        expected_images, expected_warnings, marked_svg, expected_ids = (
+            prepare_svg_images(preprocess_svg(raw))
+        )
+        self.assertEqual(warnings, expected_warnings)
+        self.assertEqual(
+            [image["corners"] for image in images],
+            [image["corners"] for image in expected_images],
+        )
+        self.assertEqual(len(marker_ids), len(expected_ids))
+        self.assertIn(marker_ids[0], serialize_svg_tree(root))
+        self.assertNotIn("<image", serialize_svg_tree(root))
+        self.assertNotIn("<image", marked_svg)
+
+    def test_streamed_images_match_inline_decoding(self):
+        # Trailing bytes after IEND keep the payload from compressing away.
+        payload = _png_bytes() + bytes(range(256)) * 256
+        data_uri = "data:image/png;base64," + base64.b64encode(payload).decode()
+        self.assertGreaterEqual(len(data_uri), STREAMED_IMAGE_MIN_CHARS)
+        raw = f'''<svg xmlns="{SVG_NS}" width="100" height="100">
+          <defs><image id="asset" width="10" height="10" href="{data_uri}"/></defs>
+          <use href="#asset" x="10"/><use href="#asset" x="30"/>
+        </svg>'''
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "drawing.svg"
+            path.write_text(raw, encoding="utf-8")
+            streamed, stream_warnings = {}, []
+            root = preprocess_svg_tree(
+                read_svg_file(path, streamed_image_sink(streamed, stream_warnings))
+            )
+        self.assertNotIn(data_uri, serialize_svg_tree(root))
+        self.assertEqual(len(streamed), 1)
+
+        images, warnings, _marker_ids = prepare_svg_image_tree(
+            root, streamed_images=streamed
+        )
+        expected, _warnings, _marked_svg, _ids = prepare_svg_images(
+            preprocess_svg(raw)
+        )
+        self.assertEqual(stream_warnings + warnings, [])
+        self.assertEqual([image["data"] for image in images], [payload, payload])
+        self.assertEqual(
+            [image["corners"] for image in images],
+            [image["corners"] for image in expected],
+        )
+
     def test_repeated_placements_share_decoded_payload(self):
         raw = f'''<svg xmlns="{SVG_NS}" width="100" height="100">
           <defs><image id="asset" width="10" height="10" href="{TINY_DATA_URI}"/></defs>
@@ -608,6 +696,171 @@ class BlenderIntegrationTests(unittest.TestCase):
         finally:
             _restore_blender_data(before)
 
+    def test_instanced_uses_share_curve_data_and_match_clones(self):
+        svg = f'''<svg xmlns="{SVG_NS}" width="100" height="100">
+          <defs><symbol id="pin" viewBox="0 0 10 10">
+            <rect width="4" height="8" fill="#ff0000"/>
+          </symbol></defs>
+          <rect id="background" width="100" height="100" fill="#00ff00"/>
+          <use href="#pin" width="10" height="10"/>
+          <use href="#pin" x="30" y="10" width="20" height="20"/>
+          <use href="#pin" x="60" transform="rotate(30)" width="10" height="10"/>
+        </svg>'''
+
+        def world_points(collection):
+            return [
+                sorted(
+                    tuple(round(value, 7) for value in obj.matrix_world @ point.co)
+                    for spline in obj.data.splines
+                    for point in spline.bezier_points
+                )
+                for obj in collection.objects
+            ]
+
+        points = {}
+        for instance_uses in (False, True):
+            before, collection = self._import_svg(
+                svg,
+                functools.partial(
+                    bpy.ops.import_scene.import_svg, instance_uses=instance_uses
+                ),
+            )
+            try:
+                points[instance_uses] = world_points(collection)
+                self.assertFalse(
+                    any(obj.name.startswith("__ESVG_") for obj in bpy.data.objects)
+                )
+                if instance_uses:
+                    pins = list(collection.objects)[1:]
+                    self.assertEqual(len(pins), 3)
+                    self.assertEqual(len({obj.data.as_pointer() for obj in pins}), 1)
+                    self.assertEqual(
+                        [obj.get("svg_paint_index") for obj in collection.objects],
+                        [0, 1, 2, 3],
+                    )
+            finally:
+                _restore_blender_data(before)
+        self.assertEqual(points[True], points[False])
+
+    def test_direct_curve_builder_matches_blender_importer(self):
+        uri = _data_uri(1, 1)
+        svg = f'''<svg xmlns="{SVG_NS}" width="100" height="100">
+          <rect id="background" width="100" height="100" fill="#00ff00"/>
+          <image id="picture" width="10" height="10" href="{uri}"/>
+          <path id="wave" d="M10 10 C 20 0 30 20 40 10 L40 40 Z" fill="#0000ff"/>
+          <circle id="dot" cx="70" cy="70" r="5" transform="scale(1 0.5)"/>
+        </svg>'''
+
+        def summary(collection):
+            return [
+                (
+                    obj.name,
+                    obj.type,
+                    tuple(round(value, 6) for value in obj.dimensions),
+                    tuple(
+                        round(value, 4)
+                        for value in obj.data.materials[0].diffuse_color
+                    )
+                    if obj.type == "CURVE"
+                    else None,
+                )
+                for obj in collection.objects
+            ]
+
+        summaries = {}
+        for direct_curves in (False, True):
+            before, collection = self._import_svg(
+                svg,
+                functools.partial(
+                    bpy.ops.import_scene.import_svg, direct_curves=direct_curves
+                ),
+            )
+            try:
+                summaries[direct_curves] = summary(collection)
+            finally:
+                _restore_blender_data(before)
+        self.assertEqual(summaries[True], summaries[False])
+
+    def test_merge_by_material_joins_consecutive_shapes(self):
+        svg = f'''<svg xmlns="{SVG_NS}" width="100" height="100">
+          <rect id="a" width="10" height="10" fill="#ff0000"/>
+          <rect id="b" x="20" width="10" height="10" fill="#ff0000"/>
+          <rect id="c" x="40" width="10" height="10" fill="#0000ff"/>
+          <rect id="d" x="60" width="10" height="10" fill="#ff0000"/>
+        </svg>'''
+        before, collection = self._import_svg(
+            svg,
+            functools.partial(
+                bpy.ops.import_scene.import_svg_emission, merge_materials=True
+            ),
+        )
+        try:
+            objects = list(collection.objects)
+            self.assertEqual(
+                [obj.type for obj in objects], ["MESH", "CURVE", "CURVE"]
+            )
+            self.assertEqual(objects[0]["svg_merged_shapes"], 2)
+            self.assertEqual(
+                [obj.get("svg_paint_index") for obj in objects], [0, 1, 2]
+            )
+            self.assertIs(objects[0].data.materials[0], objects[2].data.materials[0])
+            xs = [vertex.co.x for vertex in objects[0].data.vertices]
+            self.assertAlmostEqual(max(xs) - min(xs), 30 * BLENDER_SCALE, delta=2e-6)
+            zs = sorted({round(vertex.co.z, 7) for vertex in objects[0].data.vertices})
+            self.assertEqual(len(zs), 2)
+            self.assertLess(zs[1] - zs[0], PAINT_ORDER_Z_STEP)
+        finally:
+            _restore_blender_data(before)
+
+    def test_baked_meshes_keep_properties_and_shared_data(self):
+        svg = f'''<svg xmlns="{SVG_NS}" width="100" height="100">
+          <defs><symbol id="pin" viewBox="0 0 10 10">
+            <rect width="4" height="8" fill="#ff0000"/>
+          </symbol></defs>
+          <rect id="background" width="100" height="100" fill="#00ff00"/>
+          <use href="#pin" width="10" height="10"/>
+          <use href="#pin" x="30" width="10" height="10"/>
+        </svg>'''
+        before, collection = self._import_svg(
+            svg,
+            functools.partial(
+                bpy.ops.import_scene.import_svg_emission,
+                instance_uses=True,
+                bake_meshes=True,
+            ),
+        )
+        try:
+            objects = list(collection.objects)
+            self.assertEqual([obj.type for obj in objects], ["MESH"] * 3)
+            self.assertEqual(objects[0].name, "background")
+            self.assertEqual(
+                [obj.get("svg_paint_index") for obj in objects], [0, 1, 2]
+            )
+            self.assertEqual([obj["opacity"] for obj in objects], [1.0] * 3)
+            self.assertIs(objects[1].data, objects[2].data)
+            self.assertEqual(len(objects[1].data.materials), 1)
+            self.assertGreater(len(objects[0].data.polygons), 0)
+        finally:
+            _restore_blender_data(before)
+
+    def test_baked_open_curves_keep_their_edges(self):
+        svg = f'''<svg xmlns="{SVG_NS}" width="100" height="100">
+          <polyline points="0 0 50 50 100 0" fill="none"/>
+        </svg>'''
+        before, collection = self._import_svg(
+            svg,
+            functools.partial(
+                bpy.ops.import_scene.import_svg_emission, bake_meshes=True
+            ),
+        )
+        try:
+            (obj,) = collection.objects
+            self.assertEqual(obj.type, "MESH")
+            self.assertEqual(len(obj.data.polygons), 0)
+            self.assertGreater(len(obj.data.edges), 0)
+        finally:
+            _restore_blender_data(before)
+
     def test_graphics_use_dimensions_keep_vector_image_alignment(self):
         uri = _data_uri(1, 1)
         svg = f'''<svg xmlns="{SVG_NS}" width="100" height="100">
@@ -940,6 +1193,63 @@ class BlenderIntegrationTests(unittest.TestCase):
         finally:
             _restore_blender_data(before)
 
+    def test_in_memory_blender_import_needs_no_temporary_file(self):
+        before = _snapshot_blender_data()
+        import_state = begin_import_state()
+        svg = f'''<svg xmlns="{SVG_NS}" width="10" height="10">
+          <rect id="red" width="10" height="10" fill="#ff0000"/>
+        </svg>'''
+        original_temporary_file = imports_module.tempfile.NamedTemporaryFile
+
+        def fail_on_temporary_file(*args, **kwargs):
+            raise AssertionError("temporary file created")
+
+        imports_module.tempfile.NamedTemporaryFile = fail_on_temporary_file
+        try:
+            collection = imports_module._import_curve_svg(
+                bpy.context, svg, import_state
+            )
+            self.assertEqual(import_state["owned_collections"], {collection})
+            self.assertEqual([obj.name for obj in collection.objects], ["red"])
+            material = collection.objects[0].data.materials[0]
+            self.assertTrue(material["enhanced_svg_blender_material"])
+            self.assertIn(material, import_state["created"])
+            self.assertEqual(
+                material[IMPORT_TRANSACTION_KEY], import_state["transaction"]
+            )
+        finally:
+            imports_module.tempfile.NamedTemporaryFile = original_temporary_file
+            _restore_blender_data(before)
+
+    def test_rollback_removes_only_data_claimed_by_its_import(self):
+        before = _snapshot_blender_data()
+        import_state = begin_import_state()
+        other_state = begin_import_state()
+        try:
+            collection = claim(import_state, bpy.data.collections.new("owned"))
+            bpy.context.scene.collection.children.link(collection)
+            import_state["owned_collections"].add(collection)
+            curve = bpy.data.curves.new("imported", "CURVE")
+            imported = bpy.data.objects.new("imported", curve)
+            collection.objects.link(imported)
+            claim(import_state, bpy.data.materials.new("orphan"))
+            other = claim(other_state, bpy.data.materials.new("other"))
+            unrelated = bpy.data.materials.new("unrelated")
+
+            _rollback_import_state(import_state)
+
+            for name, data in (
+                ("owned", bpy.data.collections),
+                ("imported", bpy.data.objects),
+                ("imported", bpy.data.curves),
+                ("orphan", bpy.data.materials),
+            ):
+                self.assertNotIn(name, data)
+            self.assertIn(other, tuple(bpy.data.materials))
+            self.assertIn(unrelated, tuple(bpy.data.materials))
+        finally:
+            _restore_blender_data(before)
+
     def test_import_collection_selection_ignores_companion_collection(self):
         before = _snapshot_blender_data()
         imported = bpy.data.collections.new("temporary.svg")
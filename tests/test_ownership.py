@@ -0,0 +1,59 @@
+import unittest
+
+from enhanced_svg.ownership import (
+    IMPORT_TRANSACTION_KEY,
+    begin_import_state,
+    claim,
+    claimed_by,
+    is_removed,
+    leave_unclaimed,
+    unclaimed_or_claimed_by,
+)
+
+
+class _DataBlock(dict):
+    """Stand-in for a Blender ID with custom properties."""
+
+    removed = False
+
+    @property
+    def name(self):
+        if self.removed:
+            raise ReferenceError("StructRNA of type ID has been removed")
+        return "block"
+
+    __hash__ = object.__hash__
+
+
+class OwnershipTests(unittest.TestCase):
+    def test_claim_tags_and_records_datablock(self):
+        import_state = begin_import_state()
+        block = _DataBlock()
+        self.assertIs(claim(import_state, block), block)
+        self.assertEqual(block[IMPORT_TRANSACTION_KEY], import_state["transaction"])
+        self.assertEqual(import_state["created"], {block})
+        self.assertTrue(claimed_by(import_state, block))
+
+    def test_other_imports_own_their_own_datablocks(self):
+        import_state = begin_import_state()
+        other = claim(begin_import_state(), _DataBlock())
+        untagged = _DataBlock()
+        self.assertFalse(claimed_by(import_state, other))
+        self.assertFalse(unclaimed_or_claimed_by(import_state, other))
+        self.assertFalse(claimed_by(import_state, untagged))
+        self.assertTrue(unclaimed_or_claimed_by(import_state, untagged))
+
+    def test_leave_unclaimed_keeps_datablocks_untagged(self):
+        block = _DataBlock()
+        self.assertIs(leave_unclaimed(block), block)
+        self.assertNotIn(IMPORT_TRANSACTION_KEY, block)
+
+    def test_removed_datablocks_are_detected(self):
+        block = _DataBlock()
+        self.assertFalse(is_removed(block))
+        block.removed = True
+        self.assertTrue(is_removed(block))
+
+
+if __name__ == "__main__":
+    unittest.main()
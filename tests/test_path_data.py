@@ -0,0 +1,106 @@
+import unittest
+
+import numpy as np
+from svg.path import parse_path
+
+from enhanced_svg.path_data import (
+    parse_path_data,
+    path_data_string,
+    simplify_path_data,
+    to_svg_path,
+)
+
+
+class PathDataTests(unittest.TestCase):
+    def test_segments_match_svg_path(self):
+        for d_attr in (
+            "M0 0 L10 0 Q 20 0 20 10 C 20 20 30 30 40 20 A 10 5 30 0 1 60 20 Z",
+            "m1 2 3 4 h5 v-6 H0 V.5 z l1e1-2.5",
+            "M0 0 c1 2 3 4 5 6 s7 8 9 10 S 1 1 2 2 q1 1 2 0 t3 3 T 4 4",
+            "M10 10 a5 5 0 1110 0 A 4 4 0 0 0 1 1",
+        ):
+            with self.subTest(d_attr=d_attr):
+                self.assertEqual(
+                    to_svg_path(parse_path_data(d_attr)), parse_path(d_attr)
+                )
+
+    def test_commands_are_normalized_to_absolute_arrays(self):
+        path_data = parse_path_data("m1 1 h2 s1 1 2 0 z")
+        self.assertEqual(path_data["commands"], b"MLCZ")
+        self.assertEqual(
+            path_data["coords"].tolist(),
+            [1.0, 1.0, 3.0, 1.0, 3.0, 1.0, 4.0, 2.0, 5.0, 1.0],
+        )
+
+    def test_parsing_stops_at_invalid_characters(self):
+        self.assertEqual(parse_path_data("M0 0 L1 1 # L2 2")["commands"], b"ML")
+
+    def test_incomplete_arguments_are_an_error(self):
+        with self.assertRaises(ValueError):
+            parse_path_data("M0 0 Q1 1")
+
+    def test_written_path_data_parses_back(self):
+        d_attr = "M0 0 L10 0 Q 20 0 20 10 C 20 20 30 30 40 20 A 10 5 30 0 1 60 20 Z"
+        path_data = parse_path_data(d_attr)
+        self.assertEqual(
+            parse_path(path_data_string(path_data)), parse_path(d_attr)
+        )
+        self.assertEqual(
+            path_data_string(parse_path_data("M0.1234 -0.0001 L1 1"), 2),
+            "M 0.12,0 L 1,1",
+        )
+
+
+class SimplifyPathDataTests(unittest.TestCase):
+    def test_nearly_straight_runs_drop_inner_vertices(self):
+        path_data, removed = simplify_path_data(
+            parse_path_data("M0 0 L1 0.01 L2 -0.01 L3 0 L3 5 Z"), 0.05
+        )
+        self.assertEqual(removed, 2)
+        self.assertEqual(path_data_string(path_data), "M 0,0 L 3,0 L 3,5 Z")
+
+    def test_curves_and_corners_are_kept(self):
+        path_data = parse_path_data("M0 0 L1 0 Q 2 5 3 0 L4 0 L4 4")
+        simplified, removed = simplify_path_data(path_data, 0.5)
+        self.assertEqual(removed, 0)
+        self.assertIs(simplified, path_data)
+
+    def test_runs_after_close_start_at_the_subpath_start(self):
+        path_data, removed = simplify_path_data(
+            parse_path_data("M0 0 L5 5 Z L1 0.01 L2 -0.01 L3 0"), 0.05
+        )
+        self.assertEqual(removed, 2)
+        self.assertEqual(path_data_string(path_data), "M 0,0 L 5,5 Z L 3,0")
+        path_data, removed = simplify_path_data(
+            parse_path_data("M9 9 L0 0 Z L9 5 L9 0"), 0.05
+        )
+        self.assertEqual(removed, 1)
+        self.assertEqual(path_data_string(path_data), "M 9,9 L 0,0 Z L 9,0")
+
+    def test_leading_runs_keep_their_first_point(self):
+        path_data, removed = simplify_path_data(
+            {
+                "commands": b"LLLLL",
+                "coords": np.array([0.0, 5.0, 0.0, 0.0, 1.0, 0.01, 2.0, 0.0, 3.0, 0.0]),
+            },
+            0.05,
+        )
+        self.assertEqual(removed, 2)
+        self.assertEqual(path_data_string(path_data), "L 0,5 L 0,0 L 3,0")
+
+    def test_dropped_points_stay_within_tolerance(self):
+        x = np.linspace(0.0, 20.0, 400)
+        points = np.column_stack((x, np.sin(x) + 0.01 * np.cos(37.0 * x)))
+        d_attr = "M" + " L".join(f"{px} {py}" for px, py in points.tolist())
+        path_data, removed = simplify_path_data(parse_path_data(d_attr), 0.02)
+        self.assertGreater(removed, 300)
+        kept = path_data["coords"].reshape(-1, 2)
+        for px, py in points:
+            segment = np.searchsorted(kept[:, 0], px).clip(1, len(kept) - 1)
+            (x0, y0), (x1, y1) = kept[segment - 1], kept[segment]
+            cross = (x1 - x0) * (py - y0) - (y1 - y0) * (px - x0)
+            self.assertLessEqual(abs(cross) / np.hypot(x1 - x0, y1 - y0), 0.02 + 1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+from collections import Counter
+
+from enhanced_svg.pruning import cull_outside_viewport, prune_invisible
+from enhanced_svg.svg_preprocessing import (
+    NS_MAP,
+    flatten_svg_tree,
+    parse_svg_string,
+    preprocess_svg_tree,
+)
+
+SVG_NS = "http://www.w3.org/2000/svg"
+
+
+def _ids(root):
+    return [element.get("id") for element in root.iter() if element.get("id")]
+
+
+class ViewportCullingTests(unittest.TestCase):
+    def test_shapes_outside_the_viewbox_are_removed(self):
+        root = parse_svg_string(
+            f'<svg xmlns="{SVG_NS}" width="100" height="100" viewBox="0 0 10 10">'
+            '<rect id="inside" x="2" y="2" width="2" height="2"/>'
+            '<g transform="translate(100 0)"><rect id="moved" width="2" height="2"/>'
+            '<circle id="back" cx="-95" cy="5" r="1"/></g>'
+            '<path id="curve" d="M20 0 C 0 30 30 30 20 20"/>'
+            '<line id="stroke" x1="12" y1="0" x2="12" y2="5" stroke="red" '
+            'stroke-width="4"/>'
+            '<image id="image" x="-50" width="5" height="5" href="a.png"/>'
+            '<text id="text" x="-50">?</text></svg>'
+        )
+        culled = cull_outside_viewport(root)
+        self.assertEqual(_ids(root), ["inside", "back", "curve", "stroke", "text"])
+        self.assertEqual(culled, {"rect": 1, "image": 1})
+
+    def test_letterbox_margins_stay_visible(self):
+        root = parse_svg_string(
+            f'<svg xmlns="{SVG_NS}" width="200" height="100" viewBox="0 0 10 10">'
+            '<rect id="margin" x="-4" width="2" height="2"/>'
+            '<rect id="outside" x="-8" width="2" height="2"/></svg>'
+        )
+        cull_outside_viewport(root)
+        self.assertEqual(_ids(root), ["margin"])
+
+    def test_instanced_prototypes_are_kept(self):
+        instances = []
+        root = flatten_svg_tree(
+            parse_svg_string(
+                f'<svg xmlns="{SVG_NS}" width="10" height="10">'
+                '<defs><rect id="box" width="1" height="1"/></defs>'
+                '<use href="#box" x="50"/><use href="#box" x="5"/>'
+                '<use href="#box" x="60"/></svg>'
+            ),
+            instances,
+        )
+        cull_outside_viewport(root, instances)
+        self.assertEqual(len(root.xpath("//svg:rect", namespaces=NS_MAP)), 1)
+        self.assertEqual(len(root.xpath("//svg:line", namespaces=NS_MAP)), 4)
+
+    def test_preprocessing_reports_culled_shapes(self):
+        culled = {}
+        root = preprocess_svg_tree(
+            parse_svg_string(
+                f'<svg xmlns="{SVG_NS}" width="10" height="10">'
+                '<path d="M20 20 L30 30" stroke="red" stroke-width="1" fill="none"/>'
+                '<path d="M2 2 L3 3" stroke="red" stroke-width="1" fill="none"/></svg>'
+            ),
+            culled=culled,
+        )
+        self.assertEqual(culled, {"path": 1})
+        self.assertEqual(len(root.xpath("//svg:path", namespaces=NS_MAP)), 1)
+
+    def test_inherited_and_styled_stroke_widths_are_included(self):
+        root = parse_svg_string(
+            f'<svg xmlns="{SVG_NS}" width="10" height="10">'
+            '<g stroke="red" stroke-width="8" stroke-miterlimit="1">'
+            '<line id="inherited" x1="13" y1="0" x2="13" y2="5"/></g>'
+            '<line id="styled" x1="13" y1="0" x2="13" y2="5" stroke="red" '
+            'style="stroke-width: 0.5in; stroke-miterlimit: 1"/>'
+            '<line id="percent" x1="13" y1="0" x2="13" y2="5" stroke="red" '
+            'stroke-width="80%" stroke-miterlimit="1"/>'
+            '<g style="stroke: none" stroke="red" stroke-width="8">'
+            '<line id="unstroked" x1="13" y1="0" x2="13" y2="5"/></g></svg>'
+        )
+        culled = cull_outside_viewport(root)
+        self.assertEqual(_ids(root), ["inherited", "styled", "percent"])
+        self.assertEqual(culled, {"line": 1})
+
+
+class InvisiblePruningTests(unittest.TestCase):
+    def test_non_rendering_elements_are_removed(self):
+        root = parse_svg_string(
+            f'<svg xmlns="{SVG_NS}">'
+            '<g id="none" display="none"><rect id="a" width="1"/></g>'
+            '<g opacity="0.5"><path id="faded" d="M0 0" opacity="0"/>'
+            '<path id="half" d="M0 0"/></g>'
+            '<g visibility="hidden"><rect id="hidden" width="1"/>'
+            '<rect id="shown" width="1" style="visibility: visible"/></g>'
+            '<g><circle id="styled" r="1" style="display: none !important"/></g>'
+            "</svg>"
+        )
+        pruned = prune_invisible(root)
+        self.assertEqual(_ids(root), ["half", "shown"])
+        self.assertEqual(pruned, {"g": 1, "path": 1, "rect": 1, "circle": 1})
+        self.assertEqual(len(root), 2)
+
+    def test_preprocessing_prunes_hidden_strokes_on_request(self):
+        svg = (
+            f'<svg xmlns="{SVG_NS}"><path d="M0 0 L1 1" stroke="red" '
+            'stroke-width="1" fill="none" visibility="hidden"/></svg>'
+        )
+        self.assertEqual(len(preprocess_svg_tree(parse_svg_string(svg))), 1)
+        pruned = Counter()
+        root = preprocess_svg_tree(parse_svg_string(svg), pruned=pruned)
+        self.assertEqual(len(root), 0)
+        self.assertEqual(pruned, {"path": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
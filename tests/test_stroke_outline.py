@@ -0,0 +1,269 @@
+import math
+import pickle
+import unittest
+
+import numpy as np
+from svg.path import parse_path
+
+from enhanced_svg.path_data import parse_path_data
+from enhanced_svg.stroke_engine import (
+    _evaluate_segments,
+    offset_outline_path_data,
+    outline_job,
+    outline_polygons,
+    pack_path,
+    segment_sample_counts,
+)
+from enhanced_svg.svg_preprocessing import (
+    _POOL_OUTLINE_JOB,
+    _pool_outline_jobs,
+    MAX_STROKE_OUTLINE_CHARS,
+    MAX_STROKE_SAMPLE_POINTS,
+    STROKE_TOLERANCE,
+    native_stroke_tree,
+    parse_svg_string,
+    serialize_svg_tree,
+    stroke_to_filled_path,
+    stroke_to_filled_path_tree,
+    stroke_to_path,
+)
+
+
+MIXED_PATH = (
+    "M0 0 L10 0 Q 20 0 20 10 C 20 20 30 30 40 20 "
+    "A 10 5 30 0 1 60 20 Z"
+)
+
+
+class StrokeEngineTests(unittest.TestCase):
+    def test_packed_evaluation_matches_svg_path(self):
+        path_obj = parse_path(MIXED_PATH)
+        segments = [segment for segment in path_obj if segment.length() > 0]
+        packed = pack_path(parse_path_data(MIXED_PATH))
+        samples = np.linspace(0.0, 1.0, 9)
+        for index, segment in enumerate(segments):
+            points, _tangents = _evaluate_segments(
+                packed, np.full(len(samples), index), samples
+            )
+            for (x, y), t in zip(points, samples):
+                expected = segment.point(t)
+                self.assertAlmostEqual(x, expected.real, places=9)
+                self.assertAlmostEqual(y, expected.imag, places=9)
+
+    def test_tangents_are_analytic_derivatives(self):
+        packed = pack_path(parse_path_data("M0 0 C 0 10 10 10 10 0"))
+        _points, tangents = _evaluate_segments(
+            packed, np.zeros(3, dtype=int), np.array([0.0, 0.5, 1.0])
+        )
+        np.testing.assert_allclose(
+            tangents, [[0.0, 30.0], [15.0, 0.0], [0.0, -30.0]], atol=1e-12
+        )
+
+    def test_straight_segments_keep_only_their_endpoints(self):
+        packed = pack_path(parse_path_data("M0 0 L10 0 L10 10"))
+        counts = segment_sample_counts(packed, 1.0, 0.05)
+        self.assertEqual(counts.tolist(), [1, 1])
+        (polygon,) = outline_polygons(packed, 2.0, counts)
+        # Both sides keep the corner sample of each segment.
+        self.assertEqual(len(polygon), 8)
+        np.testing.assert_allclose(polygon[:2, 1], 1.0)
+        np.testing.assert_allclose(polygon[-2:, 1], -1.0)
+
+    def test_curve_outline_stays_within_tolerance(self):
+        for tolerance in (0.5, 0.05, 0.005):
+            packed = pack_path(parse_path_data("M 0 0 A 10 10 0 0 1 20 0"))
+            counts = segment_sample_counts(packed, 2.0, tolerance)
+            (polygon,) = outline_polygons(packed, 4.0, counts)
+            # The sides lie on circles of radius 8 and 12; the midpoints of
+            # their chords must not sag further than the tolerance.
+            half = len(polygon) // 2
+            for side in (polygon[:half], polygon[half:]):
+                radius = np.hypot(side[0, 0] - 10.0, side[0, 1])
+                middles = (side[1:] + side[:-1]) / 2.0
+                sag = radius - np.hypot(middles[:, 0] - 10.0, middles[:, 1])
+                self.assertLessEqual(sag.max(), tolerance)
+
+    def test_sample_counts_follow_tolerance(self):
+        packed = pack_path(parse_path_data("M0 0 C 0 10 10 10 10 0"))
+        coarse = segment_sample_counts(packed, 1.0, 0.5)[0]
+        fine = segment_sample_counts(packed, 1.0, 0.005)[0]
+        self.assertGreater(fine, coarse * 5)
+        with self.assertRaisesRegex(ValueError, "tolerance"):
+            segment_sample_counts(packed, 1.0, 0.0)
+
+    def test_each_subpath_gets_its_own_outline(self):
+        outline = stroke_to_path("M0 0 L10 0 M0 10 L10 10", 2.0)
+        self.assertEqual(outline.count("M "), 2)
+        self.assertEqual(outline.count(" Z"), 2)
+
+    def test_stroke_to_path_keeps_outline_path_data_format(self):
+        outline = stroke_to_path("M0 0 L1 1", 1.0)
+        self.assertTrue(outline.startswith("M "))
+        self.assertTrue(outline.endswith(" Z"))
+        self.assertEqual(outline.count(" L "), 3)
+        first_x, first_y = (float(value) for value in outline.split()[1:3])
+        self.assertAlmostEqual(first_x, -0.5 / math.sqrt(2))
+        self.assertAlmostEqual(first_y, 0.5 / math.sqrt(2))
+
+    def test_straight_strokes_do_not_trip_the_work_limit(self):
+        count = MAX_STROKE_SAMPLE_POINTS // 200
+        lines = "".join(
+            f'<path d="M0 {index} L100 {index}" stroke="black" '
+            'stroke-width="0.5" fill="none"/>'
+            for index in range(count)
+        )
+        svg = f'<svg xmlns="http://www.w3.org/2000/svg">{lines}</svg>'
+        self.assertEqual(stroke_to_filled_path(svg).count(" Z"), count)
+
+    def test_repeated_strokes_share_one_outline_and_budget(self):
+        d_attr = "M0 0 C 0 10 10 10 10 0"
+        counts = segment_sample_counts(pack_path(parse_path_data(d_attr)), 0.5, 0.05)
+        count = MAX_STROKE_SAMPLE_POINTS // (int(counts.sum()) + len(counts)) + 1
+        paths = "".join(
+            f'<path d="{d_attr}" stroke="black" stroke-width="1" fill="none"/>'
+            for _ in range(count)
+        )
+        svg = f'<svg xmlns="http://www.w3.org/2000/svg">{paths}</svg>'
+        root = stroke_to_filled_path_tree(parse_svg_string(svg), decimals=3)
+        outlines = {path.get("d") for path in root}
+        self.assertEqual(len(root), count)
+        self.assertEqual(len(outlines), 1)
+        self.assertNotEqual(outlines, {d_attr})
+
+    def test_cloned_outline_text_is_bounded(self):
+        d_attr = "M0 0 C 0 10000 10000 10000 10000 0"
+        path = f'<path d="{d_attr}" stroke="black" stroke-width="1" fill="none"/>'
+        outline = stroke_to_path(d_attr, 1.0)
+        count = MAX_STROKE_OUTLINE_CHARS // len(outline) + 1
+        svg = f'<svg xmlns="http://www.w3.org/2000/svg">{path * count}</svg>'
+        with self.assertRaisesRegex(ValueError, "stroke conversion work limit"):
+            stroke_to_filled_path(svg)
+
+    def test_parallel_conversion_matches_serial_output(self):
+        paths = "".join(
+            f'<path d="M{index} 0 C {index} 10 10 10 10 {index}" '
+            'stroke="red" stroke-width="1.5"/>'
+            for index in range(12)
+        )
+        svg = f'<svg xmlns="http://www.w3.org/2000/svg">{paths}</svg>'
+        serial = serialize_svg_tree(stroke_to_filled_path_tree(parse_svg_string(svg)))
+        parallel = serialize_svg_tree(
+            stroke_to_filled_path_tree(parse_svg_string(svg), parallel_threshold=1)
+        )
+        self.assertEqual(parallel, serial)
+
+    def test_pool_workers_import_only_the_stroke_engine(self):
+        # The add-on package imports bpy, which pool workers do not have.
+        self.assertNotIn(b"enhanced_svg", pickle.dumps(_POOL_OUTLINE_JOB))
+        packed = pack_path(parse_path_data(MIXED_PATH))
+        counts = segment_sample_counts(packed, 0.75, STROKE_TOLERANCE)
+        jobs = [
+            (packed, 1.5, counts, None, None),
+            (packed, 1.5, counts, 3, (STROKE_TOLERANCE, "round", 4.0)),
+        ]
+        self.assertEqual(
+            _pool_outline_jobs(jobs, 2), [outline_job(job) for job in jobs]
+        )
+
+    def test_compact_outline_matches_full_precision_vertices(self):
+        full = stroke_to_path(MIXED_PATH, 2.0)
+        svg = (
+            f'<svg xmlns="http://www.w3.org/2000/svg"><path d="{MIXED_PATH}" '
+            'stroke="black" stroke-width="2" fill="none"/></svg>'
+        )
+        root = stroke_to_filled_path_tree(parse_svg_string(svg), decimals=3)
+        compact_svg = serialize_svg_tree(root, compact=True)
+        self.assertNotIn("\n", compact_svg.strip())
+        compact = root[0].get("d")
+        self.assertLess(len(compact) * 2, len(full))
+
+        expected = [segment.end for segment in parse_path(full)]
+        actual = [segment.end for segment in parse_path(compact)]
+        self.assertEqual(len(actual), len(expected))
+        for point, reference in zip(actual, expected):
+            self.assertLessEqual(abs(point - reference), 0.001)
+
+
+def _path_points(d_attr, samples=16):
+    """Return points sampled along every drawing segment of path data."""
+    return [
+        segment.point(index / samples)
+        for segment in parse_path(d_attr)
+        if segment.length() > 0
+        for index in range(samples + 1)
+    ]
+
+
+class OffsetOutlineTests(unittest.TestCase):
+    def test_arc_offsets_stay_within_tolerance(self):
+        for tolerance in (0.5, 0.05, 0.005):
+            outline = offset_outline_path_data(
+                pack_path(parse_path_data("M 0 0 A 10 10 0 0 1 20 0")), 2.0, tolerance
+            )
+            for point in _path_points(outline):
+                radius = abs(point - complex(10, 0))
+                if point.imag < -1e-9:
+                    self.assertLessEqual(
+                        min(abs(radius - 9.0), abs(radius - 11.0)), tolerance
+                    )
+
+    def test_curves_need_few_control_points(self):
+        packed = pack_path(parse_path_data(MIXED_PATH))
+        outline = offset_outline_path_data(packed, 2.0, STROKE_TOLERANCE)
+        polygon = stroke_to_path(MIXED_PATH, 2.0, STROKE_TOLERANCE)
+        self.assertLess(outline.count(" C ") * 3, polygon.count(" L ") / 2)
+
+    def test_line_joins_follow_the_outside_of_the_turn(self):
+        packed = pack_path(parse_path_data("M0 0 L10 0 L10 10"))
+        miter = offset_outline_path_data(packed, 2.0, 0.05, "miter")
+        self.assertIn("L 11.0 -1.0", miter)
+        bevel = offset_outline_path_data(packed, 2.0, 0.05, "bevel")
+        self.assertNotIn("11.0 -1.0", bevel)
+        limited = offset_outline_path_data(packed, 2.0, 0.05, "miter", 1.2)
+        self.assertEqual(limited, bevel)
+        rounded = offset_outline_path_data(packed, 2.0, 0.05, "round")
+        corner = [point for point in _path_points(rounded) if point.real > 10.01]
+        for point in corner:
+            if point.imag < -0.01:
+                self.assertAlmostEqual(abs(point - complex(10, 0)), 1.0, places=3)
+
+    def test_closed_subpaths_become_two_contours(self):
+        outline = offset_outline_path_data(
+            pack_path(parse_path_data("M0 0 L10 0 L10 10 Z")), 2.0, 0.05, "bevel"
+        )
+        self.assertEqual(outline.count("M "), 2)
+
+    def test_tree_conversion_uses_stroke_linejoin(self):
+        svg = (
+            '<svg xmlns="http://www.w3.org/2000/svg">'
+            '<path d="M0 0 L10 0 L10 10" stroke="red" stroke-width="2" '
+            'stroke-linejoin="round" fill="none"/></svg>'
+        )
+        root = stroke_to_filled_path_tree(parse_svg_string(svg), bezier=True)
+        self.assertIn(" C ", root[0].get("d"))
+        self.assertEqual(root[0].get("fill"), "red")
+
+
+class NativeStrokeTests(unittest.TestCase):
+    def test_strokes_become_named_centerlines(self):
+        svg = (
+            '<svg xmlns="http://www.w3.org/2000/svg">'
+            '<path d="M0 0 L10 0" stroke="red" stroke-width="2" fill="none"/>'
+            '<path d="M0 0 L5 5 Z" stroke="blue" stroke-width="1" fill="green"/></svg>'
+        )
+        root = parse_svg_string(svg)
+        widths = native_stroke_tree(root)
+        self.assertEqual(len(root), 3)
+        self.assertEqual(root[0].get("d"), "M0 0 L10 0")
+        self.assertEqual(root[0].get("fill"), "red")
+        self.assertEqual(root[1].get("fill"), "green")
+        self.assertIsNone(root[1].get("stroke"))
+        self.assertEqual(root[2].get("d"), "M0 0 L5 5 Z")
+        self.assertEqual(root[2].get("fill"), "blue")
+        self.assertEqual(
+            widths, {root[0].get("id"): 2.0, root[2].get("id"): 1.0}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,339 @@
+import tempfile
+import unittest
+from unittest import mock
+
+from lxml import etree
+from svg.path import parse_path
+
+from enhanced_svg import image_import
+from enhanced_svg.affine import mat_apply
+from enhanced_svg.image_import import (
+    BLENDER_SCALE,
+    collect_element_matrices,
+    mark_svg_image_tree,
+    prepare_svg_image_tree,
+    streamed_image_sink,
+)
+from enhanced_svg.svg_preprocessing import (
+    NS_MAP,
+    STREAMED_IMAGE_MIN_CHARS,
+    collapse_transform_chains,
+    flatten_svg_tree,
+    parse_svg_string,
+    read_svg_file,
+    serialize_svg_tree,
+    simplify_path_tree,
+)
+
+SVG_NS = "http://www.w3.org/2000/svg"
+
+
+def _branching_defs(levels, copies=2):
+    uses = "".join(f'<use href="#level{{index}}"/>' for _ in range(copies))
+    return "".join(
+        f'<g id="level{index + 1}">' + uses.format(index=index) + "</g>"
+        for index in range(levels)
+    )
+
+
+class FlattenTests(unittest.TestCase):
+    def test_deeply_nested_uses_are_fully_expanded(self):
+        levels = "".join(
+            f'<g id="level{index + 1}"><use href="#level{index}"/></g>'
+            for index in range(25)
+        )
+        root = flatten_svg_tree(
+            parse_svg_string(
+                f'<svg xmlns="{SVG_NS}"><defs><rect id="level0" width="1"/>'
+                f'{levels}</defs><use href="#level25"/></svg>'
+            )
+        )
+        self.assertEqual(root.xpath("//svg:use", namespaces=NS_MAP), [])
+        self.assertEqual(len(root.xpath("//svg:rect", namespaces=NS_MAP)), 1)
+
+    def test_shared_templates_expand_every_instance(self):
+        root = flatten_svg_tree(
+            parse_svg_string(
+                f'<svg xmlns="{SVG_NS}"><defs><rect id="level0" width="1"/>'
+                f"{_branching_defs(6)}</defs>"
+                '<use href="#level6"/><use href="#level3"/></svg>'
+            )
+        )
+        self.assertEqual(root.xpath("//svg:use", namespaces=NS_MAP), [])
+        self.assertEqual(len(root.xpath("//svg:rect", namespaces=NS_MAP)), 2**6 + 2**3)
+
+    def test_nested_percentages_follow_the_instance_viewport(self):
+        root = flatten_svg_tree(
+            parse_svg_string(f"""<svg xmlns="{SVG_NS}" width="100" height="100">
+                  <defs>
+                    <symbol id="dot" width="50%" height="50%">
+                      <rect width="1" height="1"/>
+                    </symbol>
+                    <g id="pair"><use href="#dot"/></g>
+                    <symbol id="box" viewBox="0 0 10 10">
+                      <use href="#pair"/>
+                    </symbol>
+                  </defs>
+                  <use href="#pair"/>
+                  <use href="#box" width="20" height="20"/>
+                </svg>""")
+        )
+        # The same <g> template is instanced in the document viewport and in
+        # the 10x10 symbol viewport, so its nested symbol gets two sizes.
+        widths = [
+            rect.xpath("ancestor::svg:svg[1]", namespaces=NS_MAP)[0].get("width")
+            for rect in root.xpath("//svg:rect", namespaces=NS_MAP)
+        ]
+        self.assertEqual(widths, ["50", "5"])
+
+    def test_nested_viewports_resolve_in_document_order(self):
+        root = flatten_svg_tree(
+            parse_svg_string(f"""<svg xmlns="{SVG_NS}" width="200" height="100">
+                  <defs><symbol id="dot"><rect width="1" height="1"/></symbol></defs>
+                  <svg width="50%" height="50%">
+                    <svg width="50%"><use href="#dot" height="10%"/></svg>
+                    <svg viewBox="0 0 8 4"><use href="#dot"/></svg>
+                  </svg>
+                </svg>""")
+        )
+        sizes = [
+            tuple(
+                rect.xpath("ancestor::svg:svg[1]", namespaces=NS_MAP)[0].get(name)
+                for name in ("width", "height")
+            )
+            for rect in root.xpath("//svg:rect", namespaces=NS_MAP)
+        ]
+        self.assertEqual(sizes, [("50", "5"), ("8", "4")])
+
+    def test_repeated_uses_are_instanced_around_one_prototype(self):
+        instances = []
+        root = flatten_svg_tree(
+            parse_svg_string(f"""<svg xmlns="{SVG_NS}" width="100" height="100">
+                  <defs>
+                    <symbol id="pin" viewBox="0 0 10 10">
+                      <circle id="head" r="4"/><path d="M0 0 L0 9"/>
+                    </symbol>
+                  </defs>
+                  <use href="#pin" width="10" height="10"/>
+                  <use href="#pin" x="20" width="10" height="10"/>
+                  <use href="#pin" x="40" width="20" height="20"/>
+                  <use href="#pin" x="60" fill="red" width="10" height="10"/>
+                </svg>"""),
+            instances,
+        )
+        self.assertEqual(len(instances), 1)
+        (group,) = instances
+        self.assertEqual(len(group["instances"]), 2)
+        # The prototype content sits between its start and end markers; the
+        # differently styled placement is cloned on its own.
+        ids = [element.get("id") for element in root.iter() if element.get("id")]
+        self.assertEqual(
+            ids,
+            [group["start"], "head", group["end"], *group["instances"], "head"],
+        )
+        self.assertEqual(len(root.xpath("//svg:path", namespaces=NS_MAP)), 2)
+
+    def test_templates_with_images_are_not_instanced(self):
+        instances = []
+        root = flatten_svg_tree(
+            parse_svg_string(f"""<svg xmlns="{SVG_NS}">
+                  <defs><g id="badge">
+                    <image width="1" height="1" href="data:image/png;base64,AA=="/>
+                  </g></defs>
+                  <use href="#badge"/><use href="#badge" x="5"/>
+                </svg>"""),
+            instances,
+        )
+        self.assertEqual(instances, [])
+        self.assertEqual(len(root.xpath("//svg:image", namespaces=NS_MAP)), 2)
+
+    def test_exponential_use_graph_hits_the_expansion_limit(self):
+        raw = (
+            f'<svg xmlns="{SVG_NS}"><defs><rect id="level0" width="1"/>'
+            f'{_branching_defs(30)}</defs><use href="#level30"/></svg>'
+        )
+        with self.assertRaisesRegex(ValueError, "expansion limit"):
+            flatten_svg_tree(parse_svg_string(raw))
+
+
+class CollapseTransformTests(unittest.TestCase):
+    SVG = (
+        f'<svg xmlns="{SVG_NS}" width="200" height="100">'
+        '<defs><symbol id="icon" viewBox="0 0 10 20" '
+        'preserveAspectRatio="xMinYMax meet">'
+        '<rect id="box" width="4" height="4" transform="rotate(30)"/>'
+        '<path id="shape" d="M1 2 L5 2 Q 6 8 1 9 Z" transform="scale(2 1)"/>'
+        "</symbol></defs>"
+        '<g transform="translate(5 5)"><use href="#icon" x="10" y="20" '
+        'width="40" height="30" transform="scale(1.5)"/></g></svg>'
+    )
+
+    def _flattened(self):
+        return flatten_svg_tree(parse_svg_string(self.SVG))
+
+    def test_rendered_placement_is_unchanged(self):
+        before = collect_element_matrices(self._flattened(), {"box", "shape"})
+        root = collapse_transform_chains(self._flattened())
+        after = collect_element_matrices(root, {"box", "shape"})
+        for value, expected in zip(after["box"], before["box"]):
+            self.assertAlmostEqual(value, expected)
+        shape = root.xpath("//svg:path", namespaces=NS_MAP)[0]
+        self.assertIsNone(shape.get("transform"))
+        baked = parse_path(shape.get("d"))
+        for segment, point in zip(baked, [(1, 2), (5, 2), (1, 9), (1, 2)]):
+            end = mat_apply(after["shape"], (segment.end.real, segment.end.imag))
+            for value, expected in zip(end, mat_apply(before["shape"], point)):
+                self.assertAlmostEqual(value, expected)
+
+    def test_wrapper_groups_are_merged(self):
+        flattened = self._flattened()
+        root = collapse_transform_chains(self._flattened())
+        groups = root.xpath("//svg:g", namespaces=NS_MAP)
+        self.assertLess(
+            len(groups), len(flattened.xpath("//svg:g", namespaces=NS_MAP))
+        )
+        self.assertTrue(groups[0].get("transform").startswith("matrix("))
+
+    def test_strokes_keep_their_transform(self):
+        root = collapse_transform_chains(
+            parse_svg_string(
+                f'<svg xmlns="{SVG_NS}">'
+                '<path d="M0 0 L1 1" stroke="red" stroke-width="1" '
+                'transform="scale(2)"/>'
+                '<path d="M0 0 A 1 1 0 0 1 2 0" fill="red" '
+                'transform="scale(2)"/></svg>'
+            )
+        )
+        for path in root.xpath("//svg:path", namespaces=NS_MAP):
+            self.assertEqual(path.get("transform"), "scale(2)")
+
+
+class SimplifyPathTreeTests(unittest.TestCase):
+    def test_tolerance_is_measured_in_blender_units(self):
+        root = parse_svg_string(
+            f'<svg xmlns="{SVG_NS}">'
+            '<path id="plain" d="M0 0 L50 1 L100 0"/>'
+            '<g transform="scale(4)"><path id="scaled" d="M0 0 L50 1 L100 0"/></g>'
+            "</svg>"
+        )
+        simplified = simplify_path_tree(root, 2.0 * BLENDER_SCALE)
+        self.assertEqual(simplified, {"paths": 1, "points": 1})
+        paths = {
+            path.get("id"): path.get("d")
+            for path in root.xpath("//svg:path", namespaces=NS_MAP)
+        }
+        self.assertEqual(paths["plain"], "M 0,0 L 100,0")
+        self.assertEqual(paths["scaled"], "M0 0 L50 1 L100 0")
+
+
+class ParseSvgTests(unittest.TestCase):
+    def test_bytes_use_the_declared_encoding(self):
+        root = parse_svg_string(
+            '<?xml version="1.0" encoding="ISO-8859-1"?>'
+            f'<svg xmlns="{SVG_NS}"><text>caf\xe9</text></svg>'.encode("latin-1")
+        )
+        self.assertEqual(root[0].text, "caf\xe9")
+
+    def test_text_ignores_the_declared_encoding(self):
+        root = parse_svg_string(
+            '<?xml version="1.0" encoding="ISO-8859-1"?>'
+            f'<svg xmlns="{SVG_NS}"><text>\u2713</text></svg>'
+        )
+        self.assertEqual(root[0].text, "\u2713")
+
+    def test_preamble_before_the_svg_root_is_skipped(self):
+        root = parse_svg_string(
+            f'<!-- exported --><meta/><svg xmlns="{SVG_NS}"><rect/></svg>'
+        )
+        self.assertEqual(root.tag, f"{{{SVG_NS}}}svg")
+        self.assertEqual(len(root), 1)
+
+    def test_entities_are_not_loaded(self):
+        root = parse_svg_string(
+            '<!DOCTYPE svg [<!ENTITY secret SYSTEM "file:///etc/passwd">]>'
+            f'<svg xmlns="{SVG_NS}"><text>&secret;</text></svg>'
+        )
+        self.assertNotIn("root:", etree.tostring(root, encoding="unicode"))
+
+
+class ReadSvgFileTests(unittest.TestCase):
+    def _read(self, content, image_sink=None):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = f"{temp_dir}/drawing.svg"
+            with open(path, "wb") as handle:
+                handle.write(content)
+            return read_svg_file(path, image_sink)
+
+    def test_streamed_file_matches_parsed_string(self):
+        content = (
+            '<?xml version="1.0" encoding="ISO-8859-1"?>'
+            f'<svg xmlns="{SVG_NS}"><text>caf\xe9</text><rect width="1"/></svg>'
+        ).encode("latin-1")
+        self.assertEqual(
+            serialize_svg_tree(self._read(content)),
+            serialize_svg_tree(parse_svg_string(content.decode("latin-1"))),
+        )
+
+    def test_large_inline_images_are_handed_to_the_sink(self):
+        large = "data:image/png;base64," + "A" * STREAMED_IMAGE_MIN_CHARS
+        small = "data:image/png;base64,AA=="
+        received = []
+
+        def sink(href):
+            received.append(href)
+            return "stream:0"
+
+        root = self._read(
+            f'<svg xmlns="{SVG_NS}"><image href="{large}"/>'
+            f'<image href="{small}"/></svg>'.encode("utf-8"),
+            sink,
+        )
+        self.assertEqual(received, [large])
+        hrefs = [
+            image.get("href")
+            for image in root.xpath("//svg:image", namespaces=NS_MAP)
+        ]
+        self.assertEqual(hrefs, ["stream:0", small])
+
+    def test_streamed_images_stop_at_the_total_size_limit(self):
+        streamed = {}
+        warnings = []
+        sink = streamed_image_sink(streamed, warnings)
+        with mock.patch.object(image_import, "MAX_TOTAL_IMAGE_BYTES", 5):
+            references = [
+                sink(f"data:image/png;base64,{data}")
+                for data in ("AAAA", "AAAB", "AA==", "AAAA", "AQ==", "Ag==")
+            ]
+        self.assertEqual(references[0], references[3])
+        self.assertEqual(
+            [len(streamed[reference][0] or b"") for reference in references],
+            [3, 0, 1, 3, 1, 0],
+        )
+        self.assertEqual(
+            warnings, ["Skipped images after reaching the total image size limit"]
+        )
+
+
+class MarkImageTreeTests(unittest.TestCase):
+    def test_cached_markers_rebuild_the_marked_tree(self):
+        uri = "data:image/png;base64,AA=="
+        processed = f'''<svg xmlns="{SVG_NS}" width="10" height="10">
+          <defs><image id="unused" href="{uri}"/></defs>
+          <image id="hidden" visibility="hidden" href="{uri}"/>
+          <g><image id="shown" width="2" height="2" href="{uri}"/></g>
+          <image id="missing" href="missing.png"/>
+        </svg>'''
+        root = parse_svg_string(processed)
+        _images, _warnings, marker_ids = prepare_svg_image_tree(root)
+        self.assertEqual(len(marker_ids), 3)
+
+        cached = parse_svg_string(processed)
+        self.assertTrue(mark_svg_image_tree(cached, marker_ids))
+        self.assertEqual(serialize_svg_tree(cached), serialize_svg_tree(root))
+        self.assertFalse(
+            mark_svg_image_tree(parse_svg_string(processed), marker_ids[:2])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()